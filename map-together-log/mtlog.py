@@ -0,0 +1,315 @@
+from __future__ import annotations
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+from array import array
+from typing import Optional, Dict, Callable, Iterable, List, Set, TextIO, Tuple
+
+from mtlog_decode import MT_TYPES, MTRecord, MTLogFile, iter_mt_records, filter_mt_records, read_mt_table, payload_hex
+from mtlog_export import export_merged_records, export_records, record_json
+from mtlog_filter import RecordIndexes, parse_type_list
+from mtlog_merge import iter_merged_records
+from mtlog_search import SEARCH_KINDS, SearchIndex
+from mtlog_table import TABLE_COLUMNS, RecordTable
+from mtlog_timeindex import MAX_TIME, records_between
+
+# Same names and order as mtlog_export.record_json(), so CSV and NDJSON exports agree.
+CSV_FIELDS = ("index", "file_offset", "type_id", "type_name", "payload_len", "meta_len", "player_id", "timestamp_ms", "time")
+
+def parse_types(spec: Optional[List[str]]) -> Optional[Set[int]]:
+    if not spec:
+        return None
+    try:
+        return parse_type_list(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def parse_time(spec: Optional[str]) -> Optional[int]:
+    # Accepts epoch milliseconds or an ISO date/time; naive times are UTC like MTRecord.time_iso.
+    if spec is None:
+        return None
+    spec = spec.strip()
+    if spec.isdigit():
+        return int(spec)
+    try:
+        dt = datetime.datetime.fromisoformat(spec.replace("Z", "+00:00"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"bad time {spec!r}; use epoch ms or YYYY-MM-DD[ HH:MM[:SS]]")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+def record_predicate(types: Optional[Set[int]] = None, players: Optional[Set[str]] = None,
+                     since_ms: Optional[int] = None, until_ms: Optional[int] = None) -> Callable[[MTRecord], bool]:
+    def pred(r: MTRecord) -> bool:
+        if types is not None and r.type_id not in types:
+            return False
+        if players is not None and r.player_id not in players:
+            return False
+        if since_ms is not None and r.timestamp_ms < since_ms:
+            return False
+        if until_ms is not None and r.timestamp_ms > until_ms:
+            return False
+        return True
+    return pred
+
+def _merged(args) -> bool:
+    return isinstance(args.log, list) and len(args.log) > 1
+
+def _single(args) -> str:
+    return args.log[0] if isinstance(args.log, list) else args.log
+
+def _filtered(args) -> Iterable[MTRecord]:
+    since, until = parse_time(args.since), parse_time(args.until)
+    types, players = parse_types(args.type), set(args.player) if args.player else None
+    if _merged(args):
+        # Several logs: stream each one and merge on timestamp; the per-log inverted indexes
+        # would need a RecordTable per log in memory.
+        return iter_merged_records(args.log, types, players, since, until)
+    path = _single(args)
+    if types is not None or players is not None:
+        return filter_mt_records(path, types, players, since, until)
+    pred = record_predicate(since_ms=since, until_ms=until)
+    if since is None and until is None:
+        source = iter_mt_records(path)
+    else:
+        # Only parse the blocks of the log the sparse time index says overlap the range.
+        source = records_between(path, since or 0, MAX_TIME if until is None else until)
+    return (r for r in source if pred(r))
+
+def _selected(args) -> Tuple[RecordTable, Optional[array]]:
+    # One log: its table and the ids of the matching records (None for all of them).
+    table = read_mt_table(_single(args))
+    since, until = parse_time(args.since), parse_time(args.until)
+    types, players = parse_types(args.type), set(args.player) if args.player else None
+    if types is None and players is None and since is None and until is None:
+        return table, None
+    indexes = RecordIndexes(table)
+    indexes.update()
+    return table, indexes.query(types, players, since, until)
+
+def _write_json(args, out: TextIO, decode: bool) -> int:
+    # NDJSON in mtlog_export's schema; one log decodes on worker processes.
+    if _merged(args):
+        return export_merged_records(args.log, out, _filtered(args), decode=decode)
+    table, ids = _selected(args)
+    return export_records(_single(args), out, table, ids, decode=decode, workers=args.workers)
+
+def cmd_stats(args) -> int:
+    by_type: Dict[int, Dict[str, int]] = {}
+    players: Dict[str, int] = {}
+    first = last = None
+    paths = args.log if isinstance(args.log, list) else [args.log]
+    size = sum(os.path.getsize(p) for p in paths)
+    n = 0
+    for r in _filtered(args):
+        st = by_type.get(r.type_id)
+        if st is None:
+            st = by_type[r.type_id] = {"count": 0, "payload_bytes": 0, "max_payload": 0}
+        st["count"] += 1
+        st["payload_bytes"] += r.payload_len
+        st["max_payload"] = max(st["max_payload"], r.payload_len)
+        players[r.player_id] = players.get(r.player_id, 0) + 1
+        first = r if first is None else first
+        last = r
+        n += 1
+    doc = {
+        "file": paths if _merged(args) else paths[0],
+        "file_bytes": size,
+        "records": n,
+        "first_time": first.time_iso if first else None,
+        "last_time": last.time_iso if last else None,
+        "types": {f"{MT_TYPES.get(t, f'Unknown({t})')} ({t})": v for t, v in sorted(by_type.items())},
+        "players": dict(sorted(players.items(), key=lambda kv: -kv[1])),
+    }
+    json.dump(doc, sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write("\n")
+    return 0
+
+def cmd_filter(args) -> int:
+    _write_json(args, sys.stdout, args.decode)
+    return 0
+
+def _export_columnar(records: Iterable[MTRecord], out_dir: str, chunk: int = 1 << 16,
+                     sources: Optional[List[str]] = None) -> int:
+    # One raw little-endian file per RecordTable column plus schema.json and players.json. With
+    # `sources` (merged logs) a source_idx column says which of them each offset refers to.
+    os.makedirs(out_dir, exist_ok=True)
+    columns = TABLE_COLUMNS + ((("source_idx", "H"),) if sources else ())
+    files = {name: open(os.path.join(out_dir, f"{name}.bin"), "wb") for name, _ in columns}
+    cols = {name: array(code) for name, code in columns}
+    source_ids = {p: i for i, p in enumerate(sources or ())}
+    player_ids: Dict[str, int] = {}
+    n = 0
+
+    def flush():
+        for name, col in cols.items():
+            if sys.byteorder != "little":
+                col.byteswap()
+            col.tofile(files[name])
+            del col[:]
+
+    try:
+        for r in records:
+            pid = player_ids.get(r.player_id)
+            if pid is None:
+                pid = player_ids[r.player_id] = len(player_ids)
+            cols["offsets"].append(r.record_off)
+            cols["timestamps"].append(r.timestamp_ms)
+            cols["type_ids"].append(r.type_id)
+            cols["payload_lens"].append(r.payload_len)
+            cols["meta_lens"].append(r.meta_len)
+            cols["player_idx"].append(pid)
+            if sources:
+                cols["source_idx"].append(source_ids[r.file_path])
+            n += 1
+            if not n % chunk:
+                flush()
+        flush()
+    finally:
+        for f in files.values():
+            f.close()
+    with open(os.path.join(out_dir, "players.json"), "w", encoding="utf-8") as f:
+        json.dump(list(player_ids), f, ensure_ascii=False)
+    schema = {
+        "rows": n,
+        "byteorder": "little",
+        "columns": [{"name": name, "typecode": code, "itemsize": array(code).itemsize, "file": f"{name}.bin"}
+                    for name, code in columns],
+        "types": {str(k): v for k, v in MT_TYPES.items()},
+    }
+    if sources:
+        schema["sources"] = list(sources)
+    with open(os.path.join(out_dir, "schema.json"), "w", encoding="utf-8") as f:
+        json.dump(schema, f, indent=2)
+    return n
+
+def cmd_export(args) -> int:
+    merged = _merged(args)
+    if args.format == "columnar":
+        if not args.out or args.out == "-":
+            raise SystemExit("columnar export needs an output directory (-o DIR)")
+        n = _export_columnar(_filtered(args), args.out, sources=args.log if merged else None)
+        print(f"Wrote {n} rows to {args.out}", file=sys.stderr)
+        return 0
+    out = sys.stdout if not args.out or args.out == "-" else open(args.out, "w", encoding="utf-8", newline="")
+    try:
+        if args.format == "csv":
+            w = csv.writer(out)
+            w.writerow(CSV_FIELDS + (("file",) if merged else ()))
+            for r in _filtered(args):
+                row = tuple(record_json(r).values())
+                w.writerow(row + (r.file_path,) if merged else row)
+        else:
+            _write_json(args, out, not args.no_decode)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+def cmd_hexdump(args) -> int:
+    pred = record_predicate(parse_types(args.type), set(args.player) if args.player else None,
+                            parse_time(args.since), parse_time(args.until))
+    shown = 0
+    with MTLogFile(args.log) as log:
+        for r in iter_mt_records(args.log):
+            if args.index is not None and r.index != args.index:
+                continue
+            if args.offset is not None and r.record_off != args.offset:
+                continue
+            if not pred(r):
+                continue
+            h = r.header_dict()
+            sys.stdout.write(f"# {h['index']} {h['type']} off={h['file_offset_hex']} len={r.payload_len} player={r.player_id} time={h['time']}\n")
+            window = (args.start, args.length) if args.length is not None or args.start else None
+            if window is not None and window[1] is None:
+                window = (args.start, r.payload_len)
+            sys.stdout.write(payload_hex(r, window, ascii_gutter=not args.no_ascii, log=log))
+            sys.stdout.write("\n")
+            shown += 1
+            if args.index is not None or args.offset is not None or shown >= args.limit:
+                break
+    return 0 if shown else 1
+
+def cmd_search(args) -> int:
+    out = sys.stdout
+    with SearchIndex(args.log) as ix:
+        ix.update(workers=args.workers)
+        hits = ix.search(" ".join(args.query), args.kind, args.limit)
+    table = read_mt_table(args.log)
+    for h in hits:
+        doc = record_json(table[h.record])
+        doc.update(kind=h.kind, entry=h.entry, text=h.text, author=h.author)
+        out.write(json.dumps(doc, ensure_ascii=False, separators=(",", ":")))
+        out.write("\n")
+    return 0 if hits else 1
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="mtlog", description="Headless tools for .map_together_log files.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    def add_common(p: argparse.ArgumentParser, multi: bool = False):
+        if multi:
+            p.add_argument("log", nargs="+", help="one log, or several to merge by timestamp")
+        else:
+            p.add_argument("log")
+        p.add_argument("-t", "--type", action="append", help="type id or name, repeatable or comma separated")
+        p.add_argument("-p", "--player", action="append", help="player id, repeatable")
+        p.add_argument("--since", help="epoch ms or ISO time (UTC)")
+        p.add_argument("--until", help="epoch ms or ISO time (UTC)")
+
+    p = sub.add_parser("stats", help="per-type and per-player counts")
+    add_common(p, multi=True)
+    p.set_defaults(fn=cmd_stats)
+
+    p = sub.add_parser("filter", help="print matching records as NDJSON")
+    add_common(p, multi=True)
+    p.add_argument("-d", "--decode", action="store_true", help="include decoded payloads")
+    p.add_argument("-j", "--workers", type=int, default=None, help="decode processes")
+    p.set_defaults(fn=cmd_filter)
+
+    p = sub.add_parser("export", help="export records as ndjson, csv or columnar binaries")
+    add_common(p, multi=True)
+    p.add_argument("-f", "--format", choices=("ndjson", "csv", "columnar"), default="ndjson")
+    p.add_argument("-o", "--out", help="output file (directory for columnar); default stdout")
+    p.add_argument("--no-decode", action="store_true", help="ndjson: headers only")
+    p.add_argument("-j", "--workers", type=int, default=None, help="ndjson: decode processes")
+    p.set_defaults(fn=cmd_export)
+
+    p = sub.add_parser("hexdump", help="hex dump record payloads")
+    add_common(p)
+    p.add_argument("-i", "--index", type=int, help="record index")
+    p.add_argument("--offset", type=lambda s: int(s, 0), help="record file offset (e.g. 0x1a2b)")
+    p.add_argument("-n", "--limit", type=int, default=1, help="max records to dump")
+    p.add_argument("--start", type=int, default=0, help="payload offset to start at")
+    p.add_argument("--length", type=int, default=None, help="bytes to dump")
+    p.add_argument("--no-ascii", action="store_true")
+    p.set_defaults(fn=cmd_hexdump)
+
+    p = sub.add_parser("search", help="full-text search over chat and block/item names and authors")
+    p.add_argument("log")
+    p.add_argument("query", nargs="+")
+    p.add_argument("-k", "--kind", action="append", choices=SEARCH_KINDS, help="restrict to chat/block/item, repeatable")
+    p.add_argument("-n", "--limit", type=int, default=1000)
+    p.add_argument("-j", "--workers", type=int, default=None, help="decode processes for the index build")
+    p.set_defaults(fn=cmd_search)
+    return ap
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.fn(args)
+    except BrokenPipeError:
+        # Piped into head/less that exited early; silence the flush error at interpreter exit.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 0
+    except argparse.ArgumentTypeError as e:
+        print(f"mtlog: {e}", file=sys.stderr)
+        return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
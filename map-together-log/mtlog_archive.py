@@ -0,0 +1,340 @@
+from __future__ import annotations
+import argparse
+import json
+import lzma
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator, List, Tuple, Callable
+
+# Seekable archive of a log: whole records are grouped into blocks of ~block_bytes that are
+# compressed independently, followed by a block index and a fixed-size footer. Offsets inside the
+# archive are the offsets of the original log, so record tables, sidecars and MTLogFile views work
+# unchanged; a read only decompresses the blocks it touches.
+#
+#   header | block 0 | block 1 | ... | index (one _ENTRY per block) | footer
+ARCHIVE_SUFFIX = ".mtlz"
+ARCHIVE_MAGIC = b"MTLZ"
+ARCHIVE_VERSION = 1
+CODECS = {"zlib": 1, "lzma": 2}
+_CODEC_NAMES = {v: k for k, v in CODECS.items()}
+_FILE_HEADER = struct.Struct("<4sHBB")
+# compressed offset, compressed length, raw length, raw offset, first record index, record count,
+# first / min / max timestamp
+_ENTRY = struct.Struct("<QIIQQIQQQ")
+# index offset, block count, record count, raw size, magic
+_FOOTER = struct.Struct("<QIQQ4s")
+_COLUMNS = (("comp_offs", "Q"), ("comp_lens", "I"), ("raw_lens", "I"), ("raw_offs", "Q"), ("first_index", "Q"),
+            ("n_records", "I"), ("ts_first", "Q"), ("ts_min", "Q"), ("ts_max", "Q"))
+
+def is_archive(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(4) == ARCHIVE_MAGIC
+    except OSError:
+        return False
+
+def _compress(codec: int, data, level: Optional[int]) -> bytes:
+    if codec == CODECS["zlib"]:
+        return zlib.compress(data, 6 if level is None else level)
+    return lzma.compress(data, preset=6 if level is None else level)
+
+def _decompress(codec: int, data) -> bytes:
+    if codec == CODECS["zlib"]:
+        return zlib.decompress(data)
+    return lzma.decompress(data, format=lzma.FORMAT_XZ)
+
+class ArchiveWriter:
+    def __init__(self, path: str, codec: str = "zlib", level: Optional[int] = None):
+        if codec not in CODECS:
+            raise ValueError(f"unknown codec {codec!r}; use {', '.join(CODECS)}")
+        self.path = path
+        self.codec = CODECS[codec]
+        self.level = level
+        self.entries: List[Tuple] = []
+        self.n_records = 0
+        self.raw_size = 0
+        self._f = open(path, "wb")
+        self._f.write(_FILE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, self.codec, 0))
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_block(self, raw, raw_off: int, timestamps) -> None:
+        # `raw` must hold whole records starting at raw_off in the original log, in log order.
+        comp = _compress(self.codec, raw, self.level)
+        self.entries.append((self._f.tell(), len(comp), len(raw), raw_off, self.n_records, len(timestamps),
+                             timestamps[0], min(timestamps), max(timestamps)))
+        self._f.write(comp)
+        self.n_records += len(timestamps)
+        self.raw_size = raw_off + len(raw)
+
+    def close(self):
+        if self._f is None:
+            return
+        index_off = self._f.tell()
+        for e in self.entries:
+            self._f.write(_ENTRY.pack(*e))
+        self._f.write(_FOOTER.pack(index_off, len(self.entries), self.n_records, self.raw_size, ARCHIVE_MAGIC))
+        self._f.close()
+        self._f = None
+
+def write_archive(log_path: str, out_path: Optional[str] = None, codec: str = "zlib", level: Optional[int] = None,
+                  block_bytes: int = 1 << 20, progress: Optional[Callable[[int, int], None]] = None) -> str:
+    # Only complete records are archived; a torn record at the end of a live log is left out.
+    from mtlog_decode import scan_mt_header_batches
+    out_path = out_path or log_path + ARCHIVE_SUFFIX
+    tmp = out_path + ".tmp"
+    with open(log_path, "rb") as f, ArchiveWriter(tmp, codec, level) as w:
+        # An empty log (which mmap cannot map) gives an archive with no blocks.
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                size = mm.size()
+                start = end = 0
+                stamps = array("Q")
+                for batch in scan_mt_header_batches(mm, 0, size, 4096):
+                    for off, _, payload_len, meta_len, _, _, ts in batch:
+                        if end - start >= block_bytes:
+                            w.add_block(mm[start:end], start, stamps)
+                            start = end
+                            stamps = array("Q")
+                        stamps.append(ts)
+                        end = off + 8 + payload_len + 4 + meta_len
+                    if progress:
+                        progress(end, size)
+                if stamps:
+                    w.add_block(mm[start:end], start, stamps)
+    os.replace(tmp, out_path)
+    return out_path
+
+class MTArchive:
+    # Read side. Behaves like a read-only buffer over the original log bytes: len() is the raw size
+    # and slicing returns a memoryview, decompressing (and LRU-caching) only the blocks involved.
+    def __init__(self, path: str, cache_blocks: int = 8):
+        self.path = path
+        self.cache_blocks = cache_blocks
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self.decompressed = 0
+        self._f = open(path, "rb")
+        magic, version, codec, _ = _FILE_HEADER.unpack(self._f.read(_FILE_HEADER.size))
+        if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION or codec not in _CODEC_NAMES:
+            self._f.close()
+            raise ValueError(f"{path}: not a v{ARCHIVE_VERSION} map-together archive")
+        self.codec = codec
+        self._f.seek(-_FOOTER.size, os.SEEK_END)
+        index_off, n_blocks, self.total_records, self.raw_size, magic = _FOOTER.unpack(self._f.read(_FOOTER.size))
+        if magic != ARCHIVE_MAGIC:
+            self._f.close()
+            raise ValueError(f"{path}: archive footer missing (incomplete write?)")
+        self._f.seek(index_off)
+        blob = self._f.read(n_blocks * _ENTRY.size)
+        cols = [array(code) for _, code in _COLUMNS]
+        for entry in _ENTRY.iter_unpack(blob):
+            for col, v in zip(cols, entry):
+                col.append(v)
+        for (name, _), col in zip(_COLUMNS, cols):
+            setattr(self, name, col)
+
+    def __enter__(self) -> "MTArchive":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.raw_size
+
+    @property
+    def codec_name(self) -> str:
+        return _CODEC_NAMES[self.codec]
+
+    @property
+    def n_blocks(self) -> int:
+        return len(self.raw_offs)
+
+    def block(self, j: int) -> bytes:
+        data = self._cache.get(j)
+        if data is not None:
+            self._cache.move_to_end(j)
+            return data
+        self._f.seek(self.comp_offs[j])
+        data = _decompress(self.codec, self._f.read(self.comp_lens[j]))
+        self.decompressed += 1
+        self._cache[j] = data
+        if len(self._cache) > self.cache_blocks:
+            self._cache.popitem(last=False)
+        return data
+
+    def block_at(self, off: int) -> int:
+        return bisect_right(self.raw_offs, off) - 1
+
+    def read(self, off: int, n: int) -> memoryview:
+        end = min(off + n, self.raw_size)
+        if off >= end:
+            return memoryview(b"")
+        j = self.block_at(off)
+        base = self.raw_offs[j]
+        if end <= base + self.raw_lens[j]:
+            return memoryview(self.block(j))[off - base:end - base]
+        # Records never straddle blocks, so this only happens for ranges spanning several records.
+        parts = []
+        while off < end:
+            j = self.block_at(off)
+            base = self.raw_offs[j]
+            stop = min(end, base + self.raw_lens[j])
+            parts.append(memoryview(self.block(j))[off - base:stop - base])
+            off = stop
+        return memoryview(b"".join(parts))
+
+    def __getitem__(self, key) -> memoryview:
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("MTArchive supports contiguous slices only")
+        start, stop, _ = key.indices(self.raw_size)
+        return self.read(start, stop - start)
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def iter_blocks(self, start_off: int = 0) -> Iterator[Tuple[int, bytes]]:
+        # (raw offset, decompressed bytes) from the block holding start_off to the end.
+        for j in range(max(0, self.block_at(start_off)), self.n_blocks):
+            yield self.raw_offs[j], self.block(j)
+
+    def blocks_between(self, t0: int, t1: int) -> Iterator[int]:
+        for j in range(self.n_blocks):
+            if self.ts_max[j] >= t0 and self.ts_min[j] <= t1:
+                yield j
+
+    def extract(self, out, progress: Optional[Callable[[int, int], None]] = None) -> int:
+        # Writes the original log bytes to a binary file object.
+        n = 0
+        for j in range(self.n_blocks):
+            self._f.seek(self.comp_offs[j])
+            data = _decompress(self.codec, self._f.read(self.comp_lens[j]))
+            out.write(data)
+            n += len(data)
+            if progress:
+                progress(n, self.raw_size)
+        return n
+
+    def close(self):
+        self._cache.clear()
+        if self._f:
+            self._f.close()
+            self._f = None
+
+@contextmanager
+def open_log_view(path: str) -> Iterator[Any]:
+    # Sliceable view of a log's raw bytes: a memoryview of the mmap, or the archive itself.
+    if is_archive(path):
+        with MTArchive(path) as archive:
+            yield archive
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+        yield view
+
+def extract_archive(path: str, out_path: str) -> int:
+    tmp = out_path + ".tmp"
+    with MTArchive(path) as archive, open(tmp, "wb") as out:
+        n = archive.extract(out)
+    os.replace(tmp, out_path)
+    return n
+
+def bench_archive(log_path: str, codecs=("zlib", "lzma"), block_kbs=(64, 256, 1024), seeks: int = 300,
+                  seed: int = 1) -> List[Dict[str, Any]]:
+    # Compression ratio against cold random-record latency (one block decompressed per read) and a
+    # full scan, for each codec/block size.
+    from mtlog_decode import MTLogFile, read_mt_table
+    table = read_mt_table(log_path, use_index=False)
+    rng = random.Random(seed)
+    sample = [rng.randrange(len(table)) for _ in range(seeks)] if len(table) else []
+    raw_size = os.path.getsize(log_path)
+    out: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec in codecs:
+            for kb in block_kbs:
+                path = os.path.join(tmp, f"bench_{codec}_{kb}{ARCHIVE_SUFFIX}")
+                t0 = time.perf_counter()
+                write_archive(log_path, path, codec, block_bytes=kb * 1024)
+                pack_s = time.perf_counter() - t0
+                with MTLogFile(path, cache=None) as log:
+                    archive = log.archive
+                    t0 = time.perf_counter()
+                    for i in sample:
+                        archive.clear_cache()
+                        log.payload(table[i])
+                    seek_ms = (time.perf_counter() - t0) * 1000 / max(1, len(sample))
+                    t0 = time.perf_counter()
+                    for j in range(archive.n_blocks):
+                        archive.block(j)
+                    scan_s = time.perf_counter() - t0
+                size = os.path.getsize(path)
+                out.append({"codec": codec, "block_kb": kb, "bytes": size, "ratio": raw_size / max(1, size),
+                            "pack_seconds": pack_s, "cold_seek_ms": seek_ms, "full_scan_seconds": scan_s,
+                            "scan_mb_per_sec": raw_size / (1024 * 1024) / max(scan_s, 1e-9)})
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Seekable compressed archives of .map_together_log files.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("pack", help="log -> archive")
+    p.add_argument("log")
+    p.add_argument("-o", "--out", help=f"archive path (default: <log>{ARCHIVE_SUFFIX})")
+    p.add_argument("-c", "--codec", choices=tuple(CODECS), default="zlib")
+    p.add_argument("-l", "--level", type=int, default=None)
+    p.add_argument("-b", "--block-kb", type=int, default=1024)
+    p = sub.add_parser("unpack", help="archive -> log")
+    p.add_argument("archive")
+    p.add_argument("-o", "--out", help="log path (default: archive name without the suffix)")
+    p = sub.add_parser("info", help="archive summary")
+    p.add_argument("archive")
+    p = sub.add_parser("bench", help="compression ratio vs seek latency per codec and block size")
+    p.add_argument("log")
+    p.add_argument("-c", "--codec", action="append", choices=tuple(CODECS))
+    p.add_argument("-b", "--block-kb", type=int, action="append")
+    p.add_argument("-n", "--seeks", type=int, default=300)
+    p.add_argument("--json", help="also write the results to this file")
+    args = ap.parse_args()
+
+    if args.cmd == "pack":
+        t0 = time.perf_counter()
+        out = write_archive(args.log, args.out, args.codec, args.level, args.block_kb * 1024)
+        raw, packed = os.path.getsize(args.log), os.path.getsize(out)
+        print(f"{out}: {raw} -> {packed} bytes (x{raw / max(1, packed):.2f}) in {time.perf_counter() - t0:.2f}s")
+    elif args.cmd == "unpack":
+        out = args.out or (args.archive[:-len(ARCHIVE_SUFFIX)] if args.archive.endswith(ARCHIVE_SUFFIX)
+                           else args.archive + ".map_together_log")
+        n = extract_archive(args.archive, out)
+        print(f"{out}: {n} bytes")
+    elif args.cmd == "info":
+        with MTArchive(args.archive) as a:
+            json.dump({"codec": a.codec_name, "blocks": a.n_blocks, "records": a.total_records,
+                       "raw_bytes": a.raw_size, "archive_bytes": os.path.getsize(args.archive),
+                       "first_ts": a.ts_first[0] if a.n_blocks else None,
+                       "last_ts": a.ts_max[-1] if a.n_blocks else None}, sys.stdout, indent=2)
+            sys.stdout.write("\n")
+    else:
+        results = bench_archive(args.log, tuple(args.codec or ("zlib", "lzma")), tuple(args.block_kb or (64, 256, 1024)),
+                                args.seeks)
+        print(f"{'codec':<6} {'block':>7} {'ratio':>7} {'pack s':>8} {'seek ms':>8} {'scan MB/s':>10}")
+        for r in results:
+            print(f"{r['codec']:<6} {r['block_kb']:>5}KB {r['ratio']:>7.2f} {r['pack_seconds']:>8.2f} "
+                  f"{r['cold_seek_ms']:>8.3f} {r['scan_mb_per_sec']:>10.1f}")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
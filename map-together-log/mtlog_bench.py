@@ -0,0 +1,244 @@
+from __future__ import annotations
+import argparse
+import datetime
+import json
+import mmap
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Any, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from mtlog_decode import MTLogFile, iter_mt_records, scan_mt_header_batches, read_mt_table
+from mtlog_export import export_records
+from mtlog_gen import GenConfig, generate_log, synth_macroblock_payload
+from mtlog_payload import decode_place_delete_setskin
+
+# Each case returns {name: result}; result has records, seconds (best of `repeat`), bytes and the
+# derived records_per_sec / mb_per_sec. By default every case runs in a fresh process so its
+# peak RSS is its own and not the high-water mark of the cases before it.
+BENCH_FORMAT = 1
+HEX_DUMP_BYTES = 8 << 20
+
+def _timed(fn: Callable[[], int], repeat: int, nbytes: int = 0) -> Dict[str, Any]:
+    best = None
+    count = 0
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        count = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return {"records": count, "seconds": best, "bytes": nbytes,
+            "records_per_sec": (count / best) if best else 0.0,
+            "mb_per_sec": (nbytes / (1 << 20) / best) if best else 0.0}
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+def bench_header_scan(path: str, repeat: int = 3) -> Dict[str, Dict[str, Any]]:
+    size = os.path.getsize(path)
+
+    def generator() -> int:
+        n = 0
+        for _ in iter_mt_records(path):
+            n += 1
+        return n
+
+    def batches() -> int:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return sum(len(b) for b in scan_mt_header_batches(mm))
+
+    def table() -> int:
+        return len(read_mt_table(path, use_index=False))
+
+    return {
+        "iter_mt_records": _timed(generator, repeat, size),
+        "scan_mt_header_batches": _timed(batches, repeat, size),
+        "read_mt_table": _timed(table, repeat, size),
+    }
+
+def bench_meta_only(path: str, repeat: int = 3) -> Dict[str, Dict[str, Any]]:
+    # The viewer's sequential reader; importing it needs tkinter, so it is skipped without it.
+    try:
+        from mtlog_viewer_tk import MTLogParser
+    except (ImportError, SystemExit):
+        return {}
+
+    def run() -> int:
+        parser = MTLogParser(path)
+        parser.open()
+        try:
+            n = 0
+            while parser.read_next_meta_only() is not None:
+                n += 1
+            return n
+        finally:
+            parser.close()
+
+    return {"read_next_meta_only": _timed(run, repeat, os.path.getsize(path))}
+
+def bench_place_decode(path: str, repeat: int = 3) -> Dict[str, Dict[str, Any]]:
+    table = read_mt_table(path, use_index=False)
+    ids = [i for i, t in enumerate(table.type_ids) if t in (1, 2)]
+    nbytes = sum(table.payload_lens[i] for i in ids)
+    with MTLogFile(path, cache=None) as log:
+        payloads = [(table.type_ids[i], log.payload(table[i])) for i in ids]
+
+        def run() -> int:
+            for type_id, payload in payloads:
+                decode_place_delete_setskin(payload, type_id)
+            return len(payloads)
+
+        res = _timed(run, repeat, nbytes)
+    return {"decode_place_delete_setskin": res}
+
+def bench_macroblock(sizes=(500, 2000, 8000), tail_len: int = 64, repeat: int = 3) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    for n in sizes:
+        payload = synth_macroblock_payload(n, n // 4, tail_len)
+        out[f"place_{n}_blocks"] = _timed(lambda: len(decode_place_delete_setskin(payload, 1)["blocks"]["entries"]),
+                                          repeat, len(payload))
+    return out
+
+def bench_hex_dump(path: str, repeat: int = 3) -> Dict[str, Dict[str, Any]]:
+    # The viewer's hex pane formatting over the first HEX_DUMP_BYTES of the log in 4 KB windows;
+    # "records" are the output lines.
+    try:
+        from mtlog_viewer_tk import hex_dump
+    except (ImportError, SystemExit):
+        return {}
+    with open(path, "rb") as f:
+        data = f.read(HEX_DUMP_BYTES)
+    window = 4096
+
+    def run() -> int:
+        lines = 0
+        for off in range(0, len(data), window):
+            lines += hex_dump(data[off:off+window], off).count("\n") + 1
+        return lines
+
+    return {"hex_dump": _timed(run, repeat, len(data))}
+
+def bench_export(path: str, repeat: int = 3) -> Dict[str, Dict[str, Any]]:
+    table = read_mt_table(path, use_index=False)
+    size = os.path.getsize(path)
+
+    def run(decode: bool) -> Callable[[], int]:
+        def go() -> int:
+            with open(os.devnull, "w", encoding="utf-8") as out:
+                return export_records(path, out, table, decode=decode, workers=1)
+        return go
+
+    return {"export_ndjson": _timed(run(True), repeat, size),
+            "export_ndjson_headers": _timed(run(False), repeat, size)}
+
+BENCH_CASES: Dict[str, Callable[[str, int], Dict[str, Dict[str, Any]]]] = {
+    "scan": bench_header_scan,
+    "meta_only": bench_meta_only,
+    "place_decode": bench_place_decode,
+    "place_synthetic": lambda path, repeat: bench_macroblock(repeat=repeat),
+    "hex_dump": bench_hex_dump,
+    "export": bench_export,
+}
+
+def _run_case(name: str, path: str, repeat: int) -> Tuple[Dict[str, Dict[str, Any]], Optional[float]]:
+    results = BENCH_CASES[name](path, repeat)
+    return results, peak_rss_mb()
+
+def run_benchmarks(path: str, cases=None, repeat: int = 3, isolate: bool = True,
+                   progress: Optional[Callable[[str], None]] = None) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    for name in cases or BENCH_CASES:
+        if progress:
+            progress(name)
+        if isolate:
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                results, rss = pool.submit(_run_case, name, path, repeat).result()
+        else:
+            results, rss = _run_case(name, path, repeat)
+        for key, res in results.items():
+            res["case"] = name
+            res["peak_rss_mb"] = rss
+            out[key] = res
+    return out
+
+def compare_results(current: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+    # records/sec ratio current / baseline for benchmarks present in both; < 1 is a regression.
+    return {name: res["records_per_sec"] / baseline[name]["records_per_sec"]
+            for name, res in current.items()
+            if name in baseline and baseline[name].get("records_per_sec")}
+
+def _print_results(title: str, results: Dict[str, Dict[str, Any]], ratios: Optional[Dict[str, float]] = None):
+    print(title)
+    for name, r in results.items():
+        rss = "" if r.get("peak_rss_mb") is None else f"{r['peak_rss_mb']:8.1f} MB RSS"
+        vs = "" if not ratios or name not in ratios else f"  x{ratios[name]:5.2f} vs baseline"
+        print(f"  {name:<28} {r['records']:>10} rec  {r['seconds']:8.3f}s  {r['records_per_sec']:>12,.0f} rec/s"
+              f"  {r['mb_per_sec']:>9,.1f} MB/s  {rss}{vs}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Decoder and viewer benchmarks for .map_together_log files.")
+    ap.add_argument("log", nargs="?", help="log to benchmark; default a generated one (see --gen-records)")
+    ap.add_argument("-r", "--repeat", type=int, default=3)
+    ap.add_argument("-c", "--case", action="append", choices=tuple(BENCH_CASES), help="run only these, repeatable")
+    ap.add_argument("--gen-records", type=int, default=200000, help="size of the generated log")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--no-isolate", action="store_true", help="run cases in this process (shared peak RSS)")
+    ap.add_argument("--json", help="save results to this file")
+    ap.add_argument("--compare", help="results JSON of an earlier run to compare against")
+    args = ap.parse_args()
+
+    generated = None
+    path = args.log
+    if path is None:
+        cfg = GenConfig(records=args.gen_records, seed=args.seed)
+        fd, path = tempfile.mkstemp(suffix=".map_together_log")
+        os.close(fd)
+        generated = generate_log(path, cfg)
+        print(f"Generated {generated['records']} records ({generated['bytes'] / (1 << 20):.1f} MB) "
+              f"in {generated['seconds']:.2f}s", file=sys.stderr)
+    try:
+        results = run_benchmarks(path, args.case, args.repeat, not args.no_isolate,
+                                 progress=lambda name: print(f"running {name}…", file=sys.stderr))
+    finally:
+        if generated is not None:
+            os.remove(path)
+
+    ratios = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            ratios = compare_results(results, json.load(f)["results"])
+    size_mb = (generated["bytes"] if generated else os.path.getsize(path)) / (1 << 20)
+    _print_results(f"{os.path.basename(args.log) if args.log else 'generated log'} ({size_mb:.1f} MB)", results, ratios)
+    if args.json:
+        doc = {
+            "format": BENCH_FORMAT,
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "log": args.log,
+            "log_bytes": generated["bytes"] if generated else os.path.getsize(path),
+            "generator": generated["config"] if generated else None,
+            "repeat": args.repeat,
+            "results": results,
+        }
+        if ratios is not None:
+            doc["vs_baseline"] = ratios
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(doc, f, indent=2)
+
+if __name__ == "__main__":
+    main()
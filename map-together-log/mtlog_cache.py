@@ -0,0 +1,89 @@
+from __future__ import annotations
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Callable, Hashable
+
+DEFAULT_BUDGET_BYTES = 64 * 1024 * 1024
+
+def approx_size(obj: Any) -> int:
+    # Rough deep size of a decoded document (dicts, lists, strings and numbers only).
+    size = 0
+    stack = [obj]
+    getsize = sys.getsizeof
+    while stack:
+        o = stack.pop()
+        size += getsize(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple)):
+            stack.extend(o)
+    return size
+
+class DecodeCache:
+    # LRU of decoded payload documents keyed by (file path, record offset), bounded by an
+    # approximate byte budget. Safe to share between the UI and worker threads.
+    def __init__(self, max_bytes: int = DEFAULT_BUDGET_BYTES):
+        self.max_bytes = max_bytes
+        # key -> (document, approximate size)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, doc: Dict[str, Any]) -> None:
+        size = approx_size(doc)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._entries[key] = (doc, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, n) = self._entries.popitem(last=False)
+                self.nbytes -= n
+                self.evictions += 1
+
+    def get_or_decode(self, key: Hashable, decode: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        doc = self.get(key)
+        if doc is None:
+            doc = decode()
+            self.put(key, doc)
+        return doc
+
+    def invalidate(self, path: str) -> None:
+        path = os.path.abspath(path)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path]:
+                self.nbytes -= self._entries.pop(key)[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self.nbytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+DECODE_CACHE = DecodeCache()
@@ -1,11 +1,15 @@
 from __future__ import annotations
-import io
-import json
 import mmap
+import os
 import struct
 import datetime
 from dataclasses import dataclass
-from typing import Optional, Dict, Any, Iterable, Tuple, List
+from itertools import repeat
+from typing import Optional, Dict, Any, Iterable, Iterator, Sequence, Tuple, List
+
+from mtlog_archive import MTArchive, is_archive
+from mtlog_cache import DECODE_CACHE, DecodeCache
+from mtlog_payload import PAYLOAD_DECODERS, decode_payload
 
 MT_TYPES: Dict[int, str] = {
     0: "Unknown",
@@ -33,17 +37,18 @@ MT_TYPES: Dict[int, str] = {
     22: "ServerStats",
 }
 
-def _u16(b: bytes, o: int) -> Tuple[int, int]:
-    return struct.unpack_from("<H", b, o)[0], o + 2
-
-def _lpstring(b: bytes, o: int) -> Tuple[str, int]:
-    n, o = _u16(b, o)
-    end = o + n
-    s = b[o:end].decode("utf-8", errors="replace")
-    return s, end
+def format_time_utc(timestamp_ms: int) -> str:
+    try:
+        return datetime.datetime.utcfromtimestamp(timestamp_ms / 1000.0).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    except Exception:
+        return str(timestamp_ms)
 
-@dataclass
+@dataclass(init=False)
 class MTRecord:
+    # Explicit __slots__ rather than dataclass(slots=True), which needs Python 3.10; a slotted
+    # field cannot have a class-level default, so __init__ is written out to keep file_path=None.
+    __slots__ = ("index", "type_id", "type_name", "record_off", "payload_off", "payload_len", "meta_off",
+                 "meta_len", "player_id", "timestamp_ms", "file_path")
     index: int
     type_id: int
     type_name: str
@@ -54,14 +59,25 @@ class MTRecord:
     meta_len: int
     player_id: str
     timestamp_ms: int
-    file_path: Optional[str] = None
+    file_path: Optional[str]
+
+    def __init__(self, index: int, type_id: int, type_name: str, record_off: int, payload_off: int, payload_len: int,
+                 meta_off: int, meta_len: int, player_id: str, timestamp_ms: int, file_path: Optional[str] = None):
+        self.index = index
+        self.type_id = type_id
+        self.type_name = type_name
+        self.record_off = record_off
+        self.payload_off = payload_off
+        self.payload_len = payload_len
+        self.meta_off = meta_off
+        self.meta_len = meta_len
+        self.player_id = player_id
+        self.timestamp_ms = timestamp_ms
+        self.file_path = file_path
 
     @property
     def time_iso(self) -> str:
-        try:
-            return datetime.datetime.utcfromtimestamp(self.timestamp_ms / 1000.0).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-        except Exception:
-            return str(self.timestamp_ms)
+        return format_time_utc(self.timestamp_ms)
 
     def header_dict(self) -> Dict[str, Any]:
         return {
@@ -77,152 +93,277 @@ class MTRecord:
             "time": self.time_iso,
         }
 
-def iter_mt_records(file_path: str) -> Iterable[MTRecord]:
+# Header batch tuple: (record_off, type_id, payload_len, meta_len, player_off, player_len, timestamp_ms).
+# Player ids stay as (offset, length) into the buffer until decode_player_id() is called.
+HeaderBatch = List[Tuple[int, int, int, int, int, int, int]]
+
+_HDR = struct.Struct("<II")
+_META_HEAD = struct.Struct("<IH")
+_meta_structs: Dict[int, struct.Struct] = {}
+
+def _meta_struct(name_len: int) -> struct.Struct:
+    s = _meta_structs.get(name_len)
+    if s is None:
+        s = _meta_structs[name_len] = struct.Struct(f"<IH{name_len}xQ")
+    return s
+
+def decode_player_id(buf, off: int, n: int) -> str:
+    return str(buf[off:off+n], "utf-8", errors="replace")
+
+def scan_mt_header_batches(buf, off: int = 0, size: Optional[int] = None, batch_records: int = 65536) -> Iterator[HeaderBatch]:
+    if size is None:
+        size = len(buf)
+    hdr = _HDR.unpack_from
+    # Player ids almost always share one length, so guess the meta layout and
+    # read meta flag, id length and timestamp with a single unpack.
+    guess = 36
+    meta = _meta_struct(guess).unpack_from
+    batch: HeaderBatch = []
+    add = batch.append
+    while off + 8 <= size:
+        type_id, payload_len = hdr(buf, off)
+        moff = off + 8 + payload_len
+        try:
+            meta_flag, name_len, ts = meta(buf, moff)
+        except struct.error:
+            if moff + 6 > size:
+                break
+            meta_flag, name_len = _META_HEAD.unpack_from(buf, moff)
+            ts = None
+        if name_len != guess or ts is None:
+            guess = name_len
+            meta = _meta_struct(guess).unpack_from
+            try:
+                meta_flag, name_len, ts = meta(buf, moff)
+            except struct.error:
+                break
+        meta_len = meta_flag & 0x7FFF_FFFF
+        end = moff + 4 + meta_len
+        if meta_len < 10 or name_len + 8 > meta_len or end > size:
+            break
+        add((off, type_id, payload_len, meta_len, moff + 6, name_len, ts))
+        off = end
+        if len(batch) >= batch_records:
+            yield batch
+            batch = []
+            add = batch.append
+    if batch:
+        yield batch
+
+def _iter_raw_blocks(file_path: str, start_off: int = 0) -> Iterator[Tuple[int, Any]]:
+    # (file offset, buffer) pieces of a log that together hold its records: the whole mmap for a
+    # plain log, one decompressed block at a time for an archive.
+    if is_archive(file_path):
+        with MTArchive(file_path, cache_blocks=1) as archive:
+            yield from archive.iter_blocks(start_off)
+        return
     with open(file_path, "rb") as f:
         with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
-            size = mm.size()
-            off = 0
-            idx = 0
-            while off + 8 <= size:
-                rec_start = off
-                try:
-                    type_id = struct.unpack_from("<I", mm, off)[0]; off += 4
-                    payload_len = struct.unpack_from("<I", mm, off)[0]; off += 4
-                except Exception:
-                    break
-                if payload_len < 0 or off + payload_len > size:
-                    break
-                payload_off = off
-                off += payload_len
-                if off + 4 > size:
-                    break
-                meta_flag = struct.unpack_from("<I", mm, off)[0]; off += 4
-                meta_len = meta_flag & 0x7FFF_FFFF
-                if meta_len < 10 or off + meta_len > size:
-                    break
-                meta_body_off = off
-                name_len = struct.unpack_from("<H", mm, off)[0]; off += 2
-                if name_len + 8 > meta_len:
-                    break
-                name_bytes = mm[off:off+name_len]; off += name_len
-                try:
-                    player_id = name_bytes.decode("utf-8", errors="replace")
-                except Exception:
-                    player_id = ""
-                timestamp_ms = struct.unpack_from("<Q", mm, off)[0]; off += 8
-                type_name = MT_TYPES.get(type_id, f"Unknown({type_id})")
-                yield MTRecord(
-                    index=idx,
-                    type_id=type_id,
-                    type_name=type_name,
-                    record_off=rec_start,
-                    payload_off=payload_off,
-                    payload_len=payload_len,
-                    meta_off=meta_body_off,
-                    meta_len=meta_len,
-                    player_id=player_id,
-                    timestamp_ms=timestamp_ms,
-                    file_path=file_path,
-                )
-                idx += 1
-
-def read_payload_bytes(rec: MTRecord) -> bytes:
+            yield 0, mm
+
+def _header_batches(buf, batch_records: int, damaged: Optional[list]) -> Iterator[HeaderBatch]:
+    if damaged is None:
+        return scan_mt_header_batches(buf, batch_records=batch_records)
+    from mtlog_recover import recover_mt_header_batches
+    return recover_mt_header_batches(buf, damaged, batch_records=batch_records)
+
+def build_mt_records(start_index: int, offs: Sequence[int], type_ids: Sequence[int], payload_lens: Sequence[int],
+                     meta_lens: Sequence[int], player_ids: Sequence[str], timestamps: Sequence[int],
+                     file_path: Optional[str] = None) -> Iterator[MTRecord]:
+    # MTRecords for a run of header columns; the per-field work is done column-wise and the
+    # objects are built by map(), which is what makes a batch cheaper than a Python loop.
+    names = [MT_TYPES.get(t) or f"Unknown({t})" for t in type_ids]
+    payload_offs = [o + 8 for o in offs]
+    meta_offs = [o + 12 + n for o, n in zip(offs, payload_lens)]
+    return map(MTRecord, range(start_index, start_index + len(offs)), type_ids, names, offs, payload_offs,
+               payload_lens, meta_offs, meta_lens, player_ids, timestamps, repeat(file_path))
+
+def iter_mt_records(file_path: str, use_index: bool = False, batch_records: int = 65536,
+                    recover: bool = False, damaged: Optional[list] = None) -> Iterable[MTRecord]:
+    # recover=True skips past damaged records (see mtlog_recover); skipped spans go to `damaged`.
+    if use_index:
+        from mtlog_index import open_index
+        yield from open_index(file_path, recover=recover, damaged=damaged).iter_records()
+        return
+    if recover and damaged is None:
+        damaged = []
+    players: Dict[bytes, str] = {}
+    idx = 0
+    for base, buf in _iter_raw_blocks(file_path):
+        for batch in _header_batches(buf, batch_records, damaged if recover else None):
+            offs, type_ids, payload_lens, meta_lens, pid_offs, pid_lens, timestamps = zip(*batch)
+            if base:
+                offs = [o + base for o in offs]
+            raws = [buf[o:o+n] for o, n in zip(pid_offs, pid_lens)]
+            pids = [players.get(raw) for raw in raws]
+            if None in pids:
+                for raw in raws:
+                    if raw not in players:
+                        players[raw] = raw.decode("utf-8", errors="replace")
+                pids = [players[raw] for raw in raws]
+            yield from build_mt_records(idx, offs, type_ids, payload_lens, meta_lens, pids, timestamps, file_path)
+            idx += len(batch)
+
+def read_mt_table(file_path: str, use_index: bool = True, recover: bool = False, damaged: Optional[list] = None):
+    if use_index:
+        from mtlog_index import open_index
+        return open_index(file_path, recover=recover, damaged=damaged).table
+    from mtlog_table import RecordTable
+    if recover and damaged is None:
+        damaged = []
+    table = RecordTable(file_path)
+    for base, buf in _iter_raw_blocks(file_path):
+        for batch in _header_batches(buf, 65536, damaged if recover else None):
+            table.extend_headers(batch, buf, base)
+    return table
+
+def filter_mt_records(file_path: str, types: Optional[Iterable[int]] = None, players: Optional[Iterable[str]] = None,
+                      since_ms: Optional[int] = None, until_ms: Optional[int] = None,
+                      use_index: bool = True) -> Iterator[MTRecord]:
+    # Intersects the per-type/per-player inverted indexes instead of testing every record.
+    from mtlog_filter import RecordIndexes
+    table = read_mt_table(file_path, use_index)
+    indexes = RecordIndexes(table)
+    indexes.update()
+    ids = indexes.query(set(types) if types is not None else None, players, since_ms, until_ms)
+    for i in ids:
+        yield table[i].to_mtrecord()
+
+def records_in_region(file_path: str, lo: Tuple[float, float, float], hi: Tuple[float, float, float],
+                      kind: str = "block") -> Iterator[MTRecord]:
+    # Records with a block (by coord_nat3) or item (by pos) inside the box, from the spatial sidecar.
+    from mtlog_spatial import open_spatial_index, parse_kind
+    ix = open_spatial_index(file_path)
+    for i in ix.records_in_box(lo, hi, parse_kind(kind)):
+        yield ix.table[i].to_mtrecord()
+
+def nearest_entries(file_path: str, point: Tuple[float, float, float], k: int = 10,
+                    kind: str = "block") -> List[Dict[str, Any]]:
+    from mtlog_spatial import open_spatial_index, parse_kind
+    ix = open_spatial_index(file_path)
+    return [dict(ix.entry(p), distance=d) for d, p in ix.nearest(point, k, parse_kind(kind))]
+
+class MTLogFile:
+    # Keeps one read-only mmap of a log open and hands out memoryview slices of it, so reading
+    # payloads costs no syscalls or copies. Views stay valid until close(); the mapping is
+    # re-established when a record beyond the current end is requested (growing logs).
+    # Decoded documents go through `cache` (the shared DECODE_CACHE unless None is passed).
+    # Archives (.mtlz) are read through MTArchive instead, which decompresses blocks on demand.
+    def __init__(self, path: str, cache: Optional[DecodeCache] = DECODE_CACHE):
+        self.path = path
+        self.cache = cache
+        self._cache_path = os.path.abspath(path)
+        self._fh = None
+        self._mm: Optional[mmap.mmap] = None
+        self._view = memoryview(b"")
+        self.archive: Optional[MTArchive] = MTArchive(path) if is_archive(path) else None
+        if self.archive is None:
+            self._fh = open(path, "rb")
+            self.refresh()
+
+    def __enter__(self) -> "MTLogFile":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.archive) if self.archive is not None else len(self._view)
+
+    def refresh(self) -> bool:
+        if self.archive is not None:
+            return False
+        size = os.fstat(self._fh.fileno()).st_size
+        if size <= len(self._view):
+            return False
+        # Older views keep the previous mapping alive until they are dropped.
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+        return True
+
+    def view(self, off: int, n: int) -> memoryview:
+        if self.archive is not None:
+            return self.archive.read(off, n)
+        if off + n > len(self._view):
+            self.refresh()
+        return self._view[off:off+n]
+
+    def payload(self, rec) -> memoryview:
+        return self.view(rec.payload_off, rec.payload_len)
+
+    def record_bytes(self, rec) -> memoryview:
+        return self.view(rec.record_off, rec.meta_off + rec.meta_len - rec.record_off)
+
+    def read_payloads(self, records: Iterable) -> Iterator[Tuple[Any, memoryview]]:
+        # Visits records in file order so the page cache reads ahead instead of seeking around.
+        for rec in sorted(records, key=lambda r: r.payload_off):
+            yield rec, self.view(rec.payload_off, rec.payload_len)
+
+    def _decode_uncached(self, rec) -> Dict[str, Any]:
+        if rec.type_id not in PAYLOAD_DECODERS:
+            return {"raw_len": rec.payload_len}
+        return decode_payload(rec.type_id, self.payload(rec))
+
+    def decode(self, rec) -> Dict[str, Any]:
+        if self.cache is None or rec.type_id not in PAYLOAD_DECODERS:
+            return self._decode_uncached(rec)
+        return self.cache.get_or_decode((self._cache_path, rec.record_off), lambda: self._decode_uncached(rec))
+
+    def close(self):
+        self._view.release()
+        self._view = memoryview(b"")
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                pass  # a caller still holds a view; the mapping goes away with it
+            self._mm = None
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+        if self.archive is not None:
+            self.archive.close()
+
+def read_payload_bytes(rec: MTRecord, log: Optional[MTLogFile] = None) -> bytes:
+    if log is not None:
+        return bytes(log.payload(rec))
     if not rec.file_path:
         return b""
-    with open(rec.file_path, "rb") as f:
-        f.seek(rec.payload_off)
-        return f.read(rec.payload_len)
+    with MTLogFile(rec.file_path) as log:
+        return bytes(log.payload(rec))
 
-def payload_hex(rec: MTRecord, window: tuple[int, int] | None = None, ascii_gutter: bool = False) -> str:
-    data = read_payload_bytes(rec)
+# bytes.translate table for hex dump gutters: printable ASCII as-is, everything else as '.'.
+ASCII_GUTTER = bytes(b if 32 <= b < 127 else 0x2E for b in range(256))
+
+def payload_hex(rec: MTRecord, window: tuple[int, int] | None = None, ascii_gutter: bool = False,
+                log: Optional[MTLogFile] = None) -> str:
+    data = log.payload(rec) if log is not None else read_payload_bytes(rec)
     start = 0
     if window is not None:
         start = max(0, min(window[0], len(data)))
         end = start + max(0, min(window[1], len(data) - start))
         data = data[start:end]
-    lines = []
-    for i in range(0, len(data), 16):
-        chunk = data[i:i+16]
-        hex_part = " ".join(f"{b:02x}" for b in chunk)
-        if ascii_gutter:
-            ascii_part = "".join(chr(b) if 32 <= b < 127 else "." for b in chunk)
-            lines.append(f"{start+i:08x}: {hex_part:<47}  {ascii_part}")
-        else:
-            lines.append(f"{start+i:08x}: {hex_part}")
-    return "\n".join(lines)
+    # Format the whole window with one hex()/translate() call and slice it per line.
+    hx = data.hex(" ")
+    if not ascii_gutter:
+        return "\n".join(f"{start+i:08x}: {hx[i*3:i*3+47]}" for i in range(0, len(data), 16))
+    text = bytes(data).translate(ASCII_GUTTER).decode("ascii")
+    return "\n".join(f"{start+i:08x}: {hx[i*3:i*3+47]:<47}  {text[i:i+16]}" for i in range(0, len(data), 16))
 
+# Kept for callers of the old per-type helpers; the decoders live in mtlog_payload.PAYLOAD_DECODERS.
 def decode_chat_payload(data: bytes) -> Dict[str, Any]:
-    o = 0
-    if len(data) < 3:
-        return {"error": "truncated"}
-    msg_ty = data[o]; o += 1
-    try:
-        msg, o = _lpstring(data, o)
-    except Exception as e:
-        return {"msg_type": msg_ty, "error": f"{type(e).__name__}: {e}"}
-    return {"msg_type": msg_ty, "message": msg}
+    return decode_payload(20, data)
 
 def decode_admin_action_limit_payload(data: bytes) -> Dict[str, Any]:
-    if len(data) < 4:
-        return {"error": "truncated"}
-    limit_ms = struct.unpack_from("<I", data, 0)[0]
-    hz = (1000.0 / limit_ms) if limit_ms else None
-    return {"limit_per_action_ms": limit_ms, "limit_hz": hz}
-
-def _find_tag(data: bytes, tag: bytes) -> int | None:
-    p = data.find(tag)
-    return p if p >= 0 else None
+    return decode_payload(16, data)
 
 def decode_macroblock_sections(data: bytes) -> Dict[str, Any]:
-    out: Dict[str, Any] = {"sections": {}, "notes": []}
-    if len(data) >= 8:
-        ver, size_field = struct.unpack_from("<II", data, 0)
-        out["maybe_version"] = ver
-        out["maybe_size_field"] = size_field
-    for tag in (b"BLKs", b"SKNs", b"ITMs"):
-        p = _find_tag(data, tag)
-        if p is not None and p + 6 <= len(data):
-            count = struct.unpack_from("<H", data, p + 4)[0]
-            out["sections"][tag.decode()] = {"offset": p, "count": count}
-        else:
-            out["sections"][tag.decode()] = None
-    itms = out["sections"].get("ITMs")
-    items: List[Dict[str, Any]] = []
-    if itms and itms["count"] > 0:
-        o = itms["offset"] + 4 + 2
-        for _ in range(itms["count"]):
-            entry: Dict[str, Any] = {"offset": o}
-            try:
-                model, o = _lpstring(data, o)
-                entry["model"] = model
-                if o + 2 <= len(data):
-                    col_len = struct.unpack_from("<H", data, o)[0]
-                    if o + 2 + col_len <= len(data):
-                        collection, o2 = _lpstring(data, o)
-                        entry["collection"] = collection
-                        o = o2
-                    else:
-                        entry["collection"] = None
-                tail_take = min(80, max(0, len(data) - o))
-                entry["raw_tail_hex"] = " ".join(f"{b:02x}" for b in data[o:o+tail_take])
-                o += tail_take
-            except Exception as e:
-                entry["error"] = f"{type(e).__name__}: {e}"
-            items.append(entry)
-    out["items"] = items
-    out["blocks"] = {"count": (out["sections"].get("BLKs") or {}).get("count", 0)}
-    out["skins"] = {"count": (out["sections"].get("SKNs") or {}).get("count", 0)}
-    return out
-
-def decode_record_details(rec: MTRecord) -> Dict[str, Any]:
-    data = read_payload_bytes(rec)
-    ty = rec.type_id
-    if ty == 20:
-        return decode_chat_payload(data)
-    if ty == 16:
-        return decode_admin_action_limit_payload(data)
-    if ty in (1, 2):
-        return decode_macroblock_sections(data)
-    if ty == 4:
-        return {"raw_len": len(data), "note": "SetSkin decoding pending writer/reader functions."}
-    return {"raw_len": len(data)}
+    return decode_payload(1, data)
+
+def decode_record_details(rec: MTRecord, log: Optional[MTLogFile] = None) -> Dict[str, Any]:
+    if log is not None:
+        return log.decode(rec)
+    if not rec.file_path:
+        return {"raw_len": 0}
+    with MTLogFile(rec.file_path) as log:
+        return log.decode(rec)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+import argparse
+import json
+import sys
+import time
+from typing import Optional, Dict, Any, Callable, Iterable, Iterator, Sequence, TextIO, Union
+
+from mtlog_decode import MTRecord, format_time_utc, read_mt_table
+from mtlog_merge import MergedLogFiles
+from mtlog_parallel import iter_decoded_parallel
+from mtlog_table import RecordTable, RecordRow
+
+EXPORT_FORMATS = ("ndjson", "json")
+
+def record_json(r: Union[RecordRow, MTRecord], decoded: Optional[Dict[str, Any]] = None,
+                time_fmt: Callable[[int], str] = format_time_utc) -> Dict[str, Any]:
+    doc = {
+        "index": r.index,
+        "file_offset": r.record_off,
+        "type_id": r.type_id,
+        "type_name": r.type_name,
+        "payload_len": r.payload_len,
+        "meta_len": r.meta_len,
+        "player_id": r.player_id,
+        "timestamp_ms": r.timestamp_ms,
+        "time": time_fmt(r.timestamp_ms),
+    }
+    if decoded is not None:
+        doc["decoded"] = decoded
+    return doc
+
+def write_docs(out: TextIO, docs: Iterable[Dict[str, Any]], fmt: str = "ndjson", total: Optional[int] = None,
+               progress: Optional[Callable[[int, int], None]] = None,
+               cancel: Optional[Callable[[], bool]] = None) -> int:
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}")
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    write = out.write
+    n = 0
+    if fmt == "json":
+        write("[")
+    for doc in docs:
+        if fmt == "json":
+            write(",\n" if n else "\n")
+            write(dumps(doc))
+        else:
+            write(dumps(doc))
+            write("\n")
+        n += 1
+        if not n & 0x3FFF:
+            if progress:
+                progress(n, total if total is not None else n)
+            if cancel and cancel():
+                break
+    if fmt == "json":
+        write("\n]\n")
+    if progress:
+        progress(n, total if total is not None else n)
+    return n
+
+def export_records(path: str, out: TextIO, table: Optional[RecordTable] = None, ids: Optional[Sequence[int]] = None,
+                   fmt: str = "ndjson", decode: bool = True, workers: Optional[int] = None,
+                   progress: Optional[Callable[[int, int], None]] = None,
+                   time_fmt: Callable[[int], str] = format_time_utc,
+                   cancel: Optional[Callable[[], bool]] = None) -> int:
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}")
+    if table is None:
+        table = read_mt_table(path)
+    total = len(table) if ids is None else len(ids)
+    if decode:
+        rows = ((table[i], doc) for i, doc in iter_decoded_parallel(path, table, ids, workers=workers))
+    else:
+        rows = ((table[i], None) for i in (range(total) if ids is None else ids))
+    return write_docs(out, (record_json(r, doc, time_fmt) for r, doc in rows), fmt, total, progress, cancel)
+
+def export_merged_records(paths: Sequence[str], out: TextIO, records: Iterable[MTRecord], fmt: str = "ndjson",
+                          decode: bool = True, progress: Optional[Callable[[int, int], None]] = None,
+                          time_fmt: Callable[[int], str] = format_time_utc,
+                          cancel: Optional[Callable[[], bool]] = None) -> int:
+    # Records from several logs (mtlog_merge.iter_merged_records): export_records() documents
+    # plus the source "file"; `index` stays the record's index within that log.
+    with MergedLogFiles(paths, cache=None) as logs:
+        def docs() -> Iterator[Dict[str, Any]]:
+            for r in records:
+                doc = record_json(r, logs.decode(r) if decode else None, time_fmt)
+                doc["file"] = r.file_path
+                yield doc
+        return write_docs(out, docs(), fmt, None, progress, cancel)
+
+def main():
+    ap = argparse.ArgumentParser(description="Stream a .map_together_log to NDJSON or a compact JSON array.")
+    ap.add_argument("log")
+    ap.add_argument("out", help="output path, or - for stdout")
+    ap.add_argument("-f", "--format", choices=EXPORT_FORMATS, default="ndjson")
+    ap.add_argument("--no-decode", action="store_true", help="only write record headers")
+    ap.add_argument("-t", "--types", default="", help="comma separated type ids to export")
+    ap.add_argument("-j", "--workers", type=int, default=None)
+    ap.add_argument("-q", "--quiet", action="store_true")
+    args = ap.parse_args()
+
+    table = read_mt_table(args.log)
+    ids = None
+    if args.types:
+        wanted = {int(t) for t in args.types.split(",") if t.strip()}
+        ids = [i for i, t in enumerate(table.type_ids) if t in wanted]
+
+    t0 = time.perf_counter()
+    def progress(done: int, total: int):
+        if not args.quiet:
+            dt = max(1e-6, time.perf_counter() - t0)
+            print(f"\r{done}/{total} records ({done / dt:,.0f} rec/s)", end="", file=sys.stderr, flush=True)
+
+    if args.out == "-":
+        n = export_records(args.log, sys.stdout, table, ids, args.format, not args.no_decode, args.workers, progress)
+    else:
+        with open(args.out, "w", encoding="utf-8", newline="\n") as f:
+            n = export_records(args.log, f, table, ids, args.format, not args.no_decode, args.workers, progress)
+    if not args.quiet:
+        print(f"\nWrote {n} records in {time.perf_counter() - t0:.2f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from typing import Optional, Dict, Iterable, Set, Union
+
+from mtlog_decode import MT_TYPES
+from mtlog_table import RecordTable
+
+_TYPE_IDS = {name.lower(): tid for tid, name in MT_TYPES.items()}
+
+def parse_type_list(spec: Union[str, Iterable[str]]) -> Set[int]:
+    # "Place,delete,20" -> {1, 2, 20}; raises ValueError on unknown names.
+    parts = spec.split(",") if isinstance(spec, str) else ",".join(spec).split(",")
+    out: Set[int] = set()
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+        if part.isdigit():
+            out.add(int(part))
+        elif part.lower() in _TYPE_IDS:
+            out.add(_TYPE_IDS[part.lower()])
+        else:
+            raise ValueError(f"unknown record type {part!r}")
+    return out
+
+class RecordIndexes:
+    # Inverted indexes over a RecordTable: type id -> record ids and player index -> record ids,
+    # each a sorted array('I'). update() catches up with rows appended since the last call, so
+    # it can run after every load/follow slice.
+    def __init__(self, table: RecordTable):
+        self.table = table
+        self.clear()
+
+    def clear(self):
+        self.by_type: Dict[int, array] = {}
+        self.by_player: Dict[int, array] = {}
+        self.n = 0
+        # False once any indexed timestamp is lower than the one before it.
+        self.time_ordered = True
+
+    def _extend(self, postings: Dict[int, array], col: array, start: int, stop: int):
+        keys = col[start:stop]
+        for k in set(keys):
+            if k not in postings:
+                postings[k] = array("I")
+        appends = {k: p.append for k, p in postings.items()}
+        for i, k in enumerate(keys, start):
+            appends[k](i)
+
+    def update(self, stop: Optional[int] = None) -> int:
+        start = self.n
+        stop = len(self.table) if stop is None else stop
+        if stop <= start:
+            return 0
+        self._extend(self.by_type, self.table.type_ids, start, stop)
+        self._extend(self.by_player, self.table.player_idx, start, stop)
+        if self.time_ordered:
+            ts = self.table.timestamps[max(0, start - 1):stop]
+            self.time_ordered = all(a <= b for a, b in zip(ts, ts[1:]))
+        self.n = stop
+        return stop - start
+
+    def player_keys(self, players: Iterable[str]) -> Set[int]:
+        wanted = set(players)
+        return {i for i, p in enumerate(self.table.players) if p in wanted}
+
+    @staticmethod
+    def _union(postings: Dict[int, array], keys: Set[int]) -> array:
+        lists = [postings[k] for k in keys if k in postings]
+        if len(lists) == 1:
+            return array("I", lists[0])
+        # Each posting is already sorted, so this is a run merge rather than a full sort.
+        return array("I", sorted(chain.from_iterable(lists)))
+
+    def query(self, types: Optional[Set[int]] = None, players: Optional[Iterable[str]] = None,
+              since_ms: Optional[int] = None, until_ms: Optional[int] = None) -> array:
+        # Covers the first `n` rows indexed so far; call update() first to include newer rows.
+        t = self.table
+        dims = []
+        if types is not None:
+            dims.append((sum(len(self.by_type.get(k, ())) for k in types), self.by_type, set(types), t.type_ids))
+        if players is not None:
+            keys = self.player_keys(players)
+            dims.append((sum(len(self.by_player.get(k, ())) for k in keys), self.by_player, keys, t.player_idx))
+        if dims:
+            # Materialize the most selective dimension and check the others against their columns.
+            dims.sort(key=lambda d: d[0])
+            _, postings, keys, _ = dims[0]
+            ids = self._union(postings, keys)
+            for _, _, keys, col in dims[1:]:
+                ids = array("I", (i for i in ids if col[i] in keys))
+        else:
+            ids = array("I", range(self.n))
+        if since_ms is None and until_ms is None:
+            return ids
+        ts = t.timestamps
+        lo_ms = since_ms if since_ms is not None else 0
+        hi_ms = until_ms if until_ms is not None else (1 << 64) - 1
+        if not self.time_ordered:
+            return array("I", (i for i in ids if lo_ms <= ts[i] <= hi_ms))
+        # Time ordered, so the time range is a slice of record ids; check the edges exactly.
+        lo = bisect_left(ts, since_ms, 0, self.n) if since_ms is not None else 0
+        hi = bisect_right(ts, until_ms, 0, self.n) if until_ms is not None else self.n
+        sub = ids[bisect_left(ids, lo):bisect_left(ids, hi)]
+        return array("I", (i for i in sub if lo_ms <= ts[i] <= hi_ms))
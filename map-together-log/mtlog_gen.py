@@ -0,0 +1,215 @@
+from __future__ import annotations
+import argparse
+import random
+import struct
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from typing import Optional, Dict, Any, Callable, Iterator, List, Tuple
+
+from mtlog_decode import MT_TYPES
+from mtlog_filter import parse_type_list
+
+# Deterministic synthetic logs for benchmarks: the same GenConfig always writes the same bytes.
+# Payload layouts follow what the decoders in mtlog_payload read (BLKs/SKNs/ITMs sections,
+# length-prefixed chat, float32 positions); Ping carries no payload.
+DEFAULT_MIX: Dict[int, float] = {15: 40, 14: 30, 21: 10, 1: 8, 2: 4, 20: 6, 16: 2}
+GENERATED_TYPES = frozenset(DEFAULT_MIX)
+_SIZE_UNITS = {"": 1, "B": 1, "KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30, "TB": 1 << 40}
+_WORDS = ("gg", "nice", "where", "is", "the", "start", "block", "anyone", "test", "this", "map", "loop",
+          "wall", "ride", "ok", "brb", "lol", "fix", "ramp", "finish", "checkpoint", "turbo", "héllo", "😀")
+# Cursor coordinates stay inside the map (with room for the +-3 block spread) and above ground.
+_CAM_BOUNDS = ((3, 252), (8, 40), (3, 252))
+
+def _lp(s: bytes) -> bytes:
+    return struct.pack("<H", len(s)) + s
+
+def synth_block(i: int, tail_len: int = 2) -> bytes:
+    return (_lp(f"RoadTechStraight{i % 7}".encode()) + struct.pack("<I", 26) + _lp(b"Nadeo")
+            + struct.pack("<3IH6f", i % 48, 10 + i % 5, i // 48, i % 4, i * 32.0, 80.0, 3.0, 0.0, 1.57, 0.0)
+            + bytes((200 + k) % 256 for k in range(tail_len)))
+
+def synth_item(i: int) -> bytes:
+    return (_lp(f"Items/Tree{i % 3}.Item.Gbx".encode()) + struct.pack("<I", 26) + _lp(b"someone")
+            + b"\x00\x00" + struct.pack("<H6f", i % 4, i * 3.0, 90.0, 7.0, 0.1, 0.2, 0.0))
+
+def synth_macroblock_payload(n_blocks: int, n_items: int = 0, tail_len: int = 2) -> bytes:
+    return macroblock_payload([synth_block(i, tail_len) for i in range(n_blocks)],
+                              [synth_item(i) for i in range(n_items)])
+
+def macroblock_payload(blocks: List[bytes], items: List[bytes]) -> bytes:
+    return (struct.pack("<II", 1, 0)
+            + b"BLKs" + struct.pack("<H", len(blocks)) + b"".join(blocks)
+            + b"SKNs" + struct.pack("<H", 0)
+            + b"ITMs" + struct.pack("<H", len(items)) + b"".join(items))
+
+def record_bytes(type_id: int, payload: bytes, player: bytes, timestamp_ms: int) -> bytes:
+    meta = _lp(player) + struct.pack("<Q", timestamp_ms)
+    return struct.pack("<II", type_id, len(payload)) + payload + struct.pack("<I", len(meta) | 0x8000_0000) + meta
+
+@dataclass
+class GenConfig:
+    records: Optional[int] = None      # stop after this many records
+    size_bytes: Optional[int] = None   # or once the log reaches this size
+    players: int = 8
+    blocks: Tuple[int, int] = (1, 8)   # blocks per Place/Delete, inclusive range
+    items: Tuple[int, int] = (0, 2)
+    mix: Dict[int, float] = field(default_factory=lambda: dict(DEFAULT_MIX))
+    seed: int = 1
+    start_ms: int = 1_700_000_000_000
+    mean_gap_ms: float = 5.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        doc = asdict(self)
+        doc["mix"] = {MT_TYPES.get(t, str(t)): w for t, w in self.mix.items()}
+        return doc
+
+class _Player:
+    __slots__ = ("id", "pos", "cam")
+
+    def __init__(self, rng: random.Random):
+        self.id = str(uuid.UUID(int=rng.getrandbits(128))).encode()
+        self.pos = [rng.uniform(0, 1536), rng.uniform(8, 200), rng.uniform(0, 1536)]
+        self.cam = [rng.randrange(3, 51), rng.randrange(8, 40), rng.randrange(3, 51)]
+
+def iter_generated_records(cfg: GenConfig) -> Iterator[Tuple[int, bytes]]:
+    # (type_id, record bytes) forever; the caller decides when to stop.
+    unknown = set(cfg.mix) - GENERATED_TYPES
+    if unknown:
+        raise ValueError(f"no generator for record types {sorted(unknown)}")
+    rng = random.Random(cfg.seed)
+    players = [_Player(rng) for _ in range(max(1, cfg.players))]
+    types = [t for t, w in cfg.mix.items() if w > 0]
+    weights = [cfg.mix[t] for t in types]
+    live: List[bytes] = []   # placed block entries that a Delete can remove, capped
+    ts = cfg.start_ms
+    gap = 1.0 / max(cfg.mean_gap_ms, 1e-3)
+    pack3f = struct.Struct("<3f").pack
+    while True:
+        ts += int(rng.expovariate(gap))
+        p = rng.choice(players)
+        t = rng.choices(types, weights)[0]
+        if t == 15:
+            pos = p.pos
+            for k in range(3):
+                pos[k] += rng.uniform(-4.0, 4.0)
+            payload = pack3f(*pos) + struct.pack("<5f", rng.uniform(-1, 1), rng.uniform(-1, 1), 0.0,
+                                                 rng.uniform(0, 300), 0.0)
+        elif t == 14:
+            payload = pack3f(*(float(c) for c in p.cam)) + struct.pack("<I", rng.getrandbits(8))
+            k = rng.randrange(3)
+            lo, hi = _CAM_BOUNDS[k]
+            p.cam[k] = min(hi, max(lo, p.cam[k] + rng.choice((-1, 1))))
+        elif t == 21:
+            payload = b""
+        elif t == 1:
+            blocks = []
+            for _ in range(rng.randint(*cfg.blocks)):
+                x, y, z = p.cam[0] + rng.randrange(-3, 4), p.cam[1], p.cam[2] + rng.randrange(-3, 4)
+                b = (_lp(f"RoadTech{rng.choice(('Straight', 'Curve1', 'Ramp', 'Checkpoint'))}".encode())
+                     + struct.pack("<I", 26) + _lp(b"Nadeo")
+                     + struct.pack("<3IH6f", x, y, z, rng.randrange(4),
+                                   x * 32.0, y * 8.0, z * 32.0, 0.0, 0.0, 0.0)
+                     + b"\x00\x01")
+                blocks.append(b)
+                if len(live) < 4096:
+                    live.append(b)
+                else:
+                    live[rng.randrange(len(live))] = b
+            items = [synth_item(rng.randrange(1 << 16)) for _ in range(rng.randint(*cfg.items))]
+            payload = macroblock_payload(blocks, items)
+        elif t == 2:
+            k = min(len(live), rng.randint(*cfg.blocks))
+            blocks = [live.pop(rng.randrange(len(live))) for _ in range(k)]
+            payload = macroblock_payload(blocks, [])
+        elif t == 20:
+            msg = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 12))).encode()
+            payload = bytes([0]) + _lp(msg)
+        else:  # 16, Admin_SetActionLimit
+            payload = struct.pack("<I", rng.choice((0, 20, 50, 100, 250)))
+        yield t, record_bytes(t, payload, p.id, ts)
+
+def generate_log(path: str, cfg: GenConfig, progress: Optional[Callable[[int, int], None]] = None,
+                 flush_bytes: int = 1 << 22) -> Dict[str, Any]:
+    if cfg.records is None and cfg.size_bytes is None:
+        raise ValueError("set records or size_bytes")
+    max_records = cfg.records if cfg.records is not None else 1 << 62
+    max_bytes = cfg.size_bytes if cfg.size_bytes is not None else 1 << 62
+    counts: Dict[int, int] = {}
+    n = size = pending_size = 0
+    pending: List[bytes] = []
+    t0 = time.perf_counter()
+    with open(path, "wb") as f:
+        for t, rec in iter_generated_records(cfg):
+            if n >= max_records or size >= max_bytes:
+                break
+            pending.append(rec)
+            pending_size += len(rec)
+            counts[t] = counts.get(t, 0) + 1
+            n += 1
+            size += len(rec)
+            if pending_size >= flush_bytes:
+                f.write(b"".join(pending))
+                pending.clear()
+                pending_size = 0
+                if progress:
+                    progress(n, size)
+        f.write(b"".join(pending))
+    if progress:
+        progress(n, size)
+    return {"path": path, "records": n, "bytes": size, "seconds": time.perf_counter() - t0,
+            "types": {MT_TYPES.get(t, str(t)): c for t, c in sorted(counts.items())}, "config": cfg.to_dict()}
+
+def parse_size(spec: str) -> int:
+    # "512MB", "20GB", "1.5 gb", "1000000"
+    s = spec.strip().upper().replace(" ", "")
+    num = s.rstrip("KMGTB")
+    unit = s[len(num):]
+    if unit not in _SIZE_UNITS or not num:
+        raise ValueError(f"bad size {spec!r}; use e.g. 200MB or 20GB")
+    return int(float(num) * _SIZE_UNITS[unit])
+
+def parse_mix(spec: str) -> Dict[int, float]:
+    # "VehiclePos=40,Place=8,chatmsg=5": type names or ids with relative weights.
+    mix: Dict[int, float] = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        for t in parse_type_list(name):
+            mix[t] = float(weight) if weight else 1.0
+    return mix
+
+def parse_range(spec: str) -> Tuple[int, int]:
+    lo, _, hi = spec.partition("-")
+    return int(lo), int(hi or lo)
+
+def main():
+    ap = argparse.ArgumentParser(description="Write a deterministic synthetic .map_together_log.")
+    ap.add_argument("out")
+    g = ap.add_mutually_exclusive_group(required=True)
+    g.add_argument("-n", "--records", type=int)
+    g.add_argument("-s", "--size", type=parse_size, help="target size, e.g. 200MB or 20GB")
+    ap.add_argument("-p", "--players", type=int, default=8)
+    ap.add_argument("--blocks", type=parse_range, default=(1, 8), help="blocks per Place/Delete, N or MIN-MAX")
+    ap.add_argument("--items", type=parse_range, default=(0, 2), help="items per Place, N or MIN-MAX")
+    ap.add_argument("--mix", type=parse_mix, help="type weights, e.g. VehiclePos=40,Place=8,Delete=4,ChatMsg=6,Ping=10")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--gap-ms", type=float, default=5.0, help="mean time between records")
+    args = ap.parse_args()
+    cfg = GenConfig(records=args.records, size_bytes=args.size, players=args.players, blocks=args.blocks,
+                    items=args.items, seed=args.seed, mean_gap_ms=args.gap_ms)
+    if args.mix:
+        cfg.mix = args.mix
+    try:
+        doc = generate_log(args.out, cfg, progress=lambda n, size: print(
+            f"\r{n} records, {size / (1 << 20):.1f} MB", end="", file=sys.stderr))
+    except ValueError as e:
+        ap.error(str(e))
+    print(file=sys.stderr)
+    print(f"Wrote {doc['records']} records ({doc['bytes'] / (1 << 20):.1f} MB) to {args.out} in {doc['seconds']:.2f}s; "
+          f"{doc['types']}")
+
+if __name__ == "__main__":
+    main()
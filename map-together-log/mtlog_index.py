@@ -0,0 +1,262 @@
+from __future__ import annotations
+import os
+import mmap
+import struct
+from array import array
+from typing import Optional, Iterable, Callable, List, Tuple
+
+from mtlog_archive import MTArchive, is_archive
+from mtlog_decode import MTRecord, HeaderBatch, scan_mt_header_batches
+from mtlog_table import Fingerprint, RecordTable, TABLE_COLUMNS, to_little_endian
+
+# progress(bytes_scanned, bytes_total, records_indexed)
+ProgressFn = Callable[[int, int, int], None]
+
+class LogSidecar:
+    # Base of the sidecars that cover a prefix of a log and extend themselves as it grows
+    # (MTLogIndex, mtlog_timeindex.TimeIndex). The header starts with magic, version, log size,
+    # log mtime and scanned_end; subclasses add HEADER fields after those, their body, and
+    # _add_batch. The covered prefix is trusted only while the last covered record is unchanged.
+    MAGIC = b""
+    VERSION = 0
+    HEADER = struct.Struct("<4sHHQqQ")
+
+    def __init__(self, log_path: Optional[str], index_path: Optional[str]):
+        self.log_path = log_path
+        self.index_path = index_path
+
+    def reset(self):
+        self.log_size = 0
+        self.log_mtime_ns = 0
+        self.scanned_end = 0
+
+    @property
+    def n_records(self) -> int:
+        raise NotImplementedError
+
+    @property
+    def last_record(self) -> Optional[Fingerprint]:
+        raise NotImplementedError
+
+    def _header_fields(self) -> Tuple:
+        return ()
+
+    def _load_body(self, view: memoryview, o: int, fields: Tuple) -> bool:
+        raise NotImplementedError
+
+    def _write_body(self, f):
+        raise NotImplementedError
+
+    def _add_batch(self, batch: HeaderBatch, buf, base: int = 0):
+        raise NotImplementedError
+
+    def load(self) -> bool:
+        if not self.index_path:
+            return False
+        try:
+            with open(self.index_path, "rb") as f:
+                blob = f.read()
+        except OSError:
+            return False
+        if len(blob) < self.HEADER.size:
+            return False
+        fields = self.HEADER.unpack_from(blob, 0)
+        if fields[0] != self.MAGIC or fields[1] != self.VERSION:
+            return False
+        self.reset()
+        try:
+            ok = self._load_body(memoryview(blob), self.HEADER.size, fields[6:])
+        except Exception:
+            ok = False
+        if not ok:
+            self.reset()
+            return False
+        self.log_size, self.log_mtime_ns, self.scanned_end = fields[3:6]
+        return True
+
+    def save(self) -> bool:
+        if not self.index_path:
+            return False
+        tmp = self.index_path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.VERSION, 0, self.log_size, self.log_mtime_ns,
+                                         self.scanned_end, *self._header_fields()))
+                self._write_body(f)
+            os.replace(tmp, self.index_path)
+            return True
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return False
+
+    def _prefix_still_matches(self, buf, size: int) -> bool:
+        # Logs are append-only; the last covered record must still parse to the same fingerprint.
+        if self.scanned_end > size:
+            return False
+        last = self.last_record
+        if last is None:
+            return True
+        rec = bytes(buf[last[0]:self.scanned_end])
+        for batch in scan_mt_header_batches(rec, 0, len(rec), 1):
+            off, type_id, payload_len, meta_len, _, _, ts = batch[0]
+            return off + 8 + payload_len + 4 + meta_len == len(rec) and (last[0], type_id, payload_len, ts) == last
+        return False
+
+    def _is_current(self, st: os.stat_result) -> bool:
+        return st.st_size == self.log_size and st.st_mtime_ns == self.log_mtime_ns
+
+    def _scan(self, buf, size: int, batch_records: int) -> Iterable[HeaderBatch]:
+        return scan_mt_header_batches(buf, self.scanned_end, size, batch_records)
+
+    def update(self, progress: Optional[ProgressFn] = None, cancel: Optional[Callable[[], bool]] = None,
+               batch_records: int = 65536) -> int:
+        st = os.stat(self.log_path)
+        if st.st_size < self.log_size or (st.st_size == self.log_size and st.st_mtime_ns != self.log_mtime_ns):
+            self.reset()
+        if self._is_current(st):
+            return 0
+        if is_archive(self.log_path):
+            return self._update_archive(st, progress, cancel, batch_records)
+        added = 0
+        size = st.st_size
+        if size > 0:
+            with open(self.log_path, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    size = mm.size()
+                    if not self._prefix_still_matches(mm, size):
+                        self.reset()
+                    for batch in self._scan(mm, size, batch_records):
+                        self._add_batch(batch, mm)
+                        added += len(batch)
+                        if progress:
+                            progress(self.scanned_end, size, self.n_records)
+                        if cancel and cancel():
+                            # Leave log_size/mtime stale so the next update resumes from scanned_end.
+                            return added
+        self.log_size = size
+        self.log_mtime_ns = st.st_mtime_ns
+        return added
+
+    def _update_archive(self, st: os.stat_result, progress: Optional[ProgressFn], cancel: Optional[Callable[[], bool]],
+                        batch_records: int) -> int:
+        # Archives are immutable, so only a cancelled scan or a replaced file leaves anything to do.
+        added = 0
+        with MTArchive(self.log_path, cache_blocks=1) as archive:
+            if not self._prefix_still_matches(archive, len(archive)):
+                self.reset()
+            for base, block in archive.iter_blocks(self.scanned_end):
+                for batch in scan_mt_header_batches(block, max(0, self.scanned_end - base), len(block), batch_records):
+                    self._add_batch(batch, block, base)
+                    added += len(batch)
+                    if progress:
+                        progress(self.scanned_end, len(archive), self.n_records)
+                    if cancel and cancel():
+                        return added
+        self.log_size = st.st_size
+        self.log_mtime_ns = st.st_mtime_ns
+        return added
+
+    def open(self, persist: bool = True, progress: Optional[ProgressFn] = None,
+             cancel: Optional[Callable[[], bool]] = None):
+        loaded = self.load()
+        before = (self.log_size, self.log_mtime_ns, self.n_records)
+        self.update(progress, cancel)
+        if cancel and cancel():
+            return self
+        if persist and (not loaded or before != (self.log_size, self.log_mtime_ns, self.n_records)):
+            self.save()
+        return self
+
+# Sidecar layout: LogSidecar header, then one contiguous little-endian column per
+# RecordTable field, then the player table (u16 length + utf-8 bytes per player).
+INDEX_SUFFIX = ".mtidx"
+INDEX_MAGIC = b"MTIX"
+INDEX_VERSION = 1
+
+def index_path_for(log_path: str) -> str:
+    return log_path + INDEX_SUFFIX
+
+class MTLogIndex(LogSidecar):
+    # recover=True indexes past damaged records (mtlog_recover); the spans skipped by this
+    # instance's scans are collected in `damaged`.
+    MAGIC = INDEX_MAGIC
+    VERSION = INDEX_VERSION
+    HEADER = struct.Struct("<4sHHQqQQI")
+
+    def __init__(self, log_path: str, recover: bool = False):
+        super().__init__(log_path, index_path_for(log_path))
+        self.table = RecordTable(log_path)
+        self.recover = recover
+        self.damaged: List = []
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self.table.clear()
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    @property
+    def n_records(self) -> int:
+        return len(self.table)
+
+    @property
+    def last_record(self) -> Optional[Fingerprint]:
+        return self.table.fingerprint(-1) if len(self.table) else None
+
+    def record(self, i: int) -> MTRecord:
+        return self.table[i].to_mtrecord()
+
+    def iter_records(self, start: int = 0) -> Iterable[MTRecord]:
+        return self.table.iter_mtrecords(start)
+
+    def _header_fields(self) -> Tuple:
+        return len(self.table), len(self.table.player_raw())
+
+    def _load_body(self, view: memoryview, o: int, fields: Tuple) -> bool:
+        count, n_players = fields
+        for name, code in TABLE_COLUMNS:
+            col = array(code)
+            n = count * col.itemsize
+            col.frombytes(view[o:o+n])
+            o += n
+            if len(col) != count:
+                return False
+            setattr(self.table, name, to_little_endian(col))
+        for _ in range(n_players):
+            ln = struct.unpack_from("<H", view, o)[0]; o += 2
+            self.table.intern_player(bytes(view[o:o+ln])); o += ln
+        return True
+
+    def _write_body(self, f):
+        for _, col in self.table.columns():
+            to_little_endian(col).tofile(f)
+        for raw in self.table.player_raw():
+            f.write(struct.pack("<H", len(raw)))
+            f.write(raw)
+
+    def _add_batch(self, batch: HeaderBatch, buf, base: int = 0):
+        self.table.extend_headers(batch, buf, base)
+        self.scanned_end = self.table.end_offset()
+
+    def _is_current(self, st: os.stat_result) -> bool:
+        # A strict scan that stopped at damage leaves scanned_end short of the size; recovery resumes there.
+        return super()._is_current(st) and not (self.recover and self.scanned_end < st.st_size)
+
+    def _scan(self, buf, size: int, batch_records: int) -> Iterable[HeaderBatch]:
+        if not self.recover:
+            return super()._scan(buf, size, batch_records)
+        from mtlog_recover import recover_mt_header_batches
+        return recover_mt_header_batches(buf, self.damaged, self.scanned_end, size, batch_records)
+
+def open_index(log_path: str, persist: bool = True, progress: Optional[ProgressFn] = None,
+               cancel: Optional[Callable[[], bool]] = None, recover: bool = False,
+               damaged: Optional[List] = None) -> MTLogIndex:
+    index = MTLogIndex(log_path, recover)
+    if damaged is not None:
+        index.damaged = damaged
+    return index.open(persist, progress, cancel)
@@ -0,0 +1,219 @@
+from __future__ import annotations
+import argparse
+import json
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Optional, Dict, Any, Iterable, List, Tuple, Callable
+
+from mtlog_decode import MTLogFile, format_time_utc, read_mt_table
+from mtlog_parallel import iter_decoded_parallel
+from mtlog_payload import decode_place_delete_setskin, find_sections
+from mtlog_table import RecordTable
+
+# Map state replay: Place/Delete records become add/remove ops on dicts keyed by block
+# coordinate and item position; the ops are kept in memory and the state is snapshotted every
+# `snapshot_every` edit records, so any point in the log is one snapshot restore plus a short
+# replay instead of a replay from the start.
+PLACE_TYPE, DELETE_TYPE, RESYNC_TYPE = 1, 2, 3
+
+# Blocks: (x, y, z, name, dir); items: (name, pos x, y, z). Values are the id of the placing record.
+BlockKey = Tuple[int, int, int, str, int]
+ItemKey = Tuple[str, float, float, float]
+
+ADD_BLOCK, REMOVE_BLOCK, ADD_ITEM, REMOVE_ITEM, CLEAR = range(5)
+Op = Tuple[int, Any]
+
+def block_key(e: Dict[str, Any]) -> BlockKey:
+    c = e["coord_nat3"]
+    return (c["x"], c["y"], c["z"], e["name"], e["dir"])
+
+def item_key(e: Dict[str, Any]) -> Optional[ItemKey]:
+    pos = e.get("pos")
+    return (e["name"], pos["x"], pos["y"], pos["z"]) if pos else None
+
+def record_ops(type_id: int, doc: Dict[str, Any]) -> Tuple[Op, ...]:
+    if type_id not in (PLACE_TYPE, DELETE_TYPE, RESYNC_TYPE):
+        return ()
+    add = type_id != DELETE_TYPE
+    ops: List[Op] = [(CLEAR, None)] if type_id == RESYNC_TYPE else []
+    for e in doc.get("blocks", {}).get("entries", ()):
+        if "name" in e:
+            ops.append((ADD_BLOCK if add else REMOVE_BLOCK, block_key(e)))
+    for e in doc.get("items", {}).get("entries", ()):
+        key = item_key(e) if "name" in e else None
+        if key is not None:
+            ops.append((ADD_ITEM if add else REMOVE_ITEM, key))
+    return tuple(ops)
+
+def decode_resync(payload) -> Optional[Dict[str, Any]]:
+    # The Resync layout is not known; if it carries the same BLKs/ITMs sections as Place it is read
+    # as the full map, otherwise None and the replay just snapshots at it.
+    secs = find_sections(payload)
+    if secs["BLKs"]["offset"] < 0 and secs["ITMs"]["offset"] < 0:
+        return None
+    return decode_place_delete_setskin(payload, type_id=RESYNC_TYPE)
+
+class MapState:
+    def __init__(self, blocks: Optional[Dict[BlockKey, int]] = None, items: Optional[Dict[ItemKey, int]] = None,
+                 stop: int = 0):
+        self.blocks: Dict[BlockKey, int] = blocks if blocks is not None else {}
+        self.items: Dict[ItemKey, int] = items if items is not None else {}
+        self.stop = stop
+        self.unmatched_deletes = 0
+
+    def apply(self, rid: int, ops: Iterable[Op]):
+        blocks, items = self.blocks, self.items
+        for op, key in ops:
+            if op == ADD_BLOCK:
+                blocks[key] = rid
+            elif op == REMOVE_BLOCK:
+                if blocks.pop(key, None) is None:
+                    self.unmatched_deletes += 1
+            elif op == ADD_ITEM:
+                items[key] = rid
+            elif op == REMOVE_ITEM:
+                if items.pop(key, None) is None:
+                    self.unmatched_deletes += 1
+            elif op == CLEAR:
+                blocks.clear()
+                items.clear()
+
+    def blocks_at(self, x: int, y: int, z: int) -> List[BlockKey]:
+        return [k for k in self.blocks if k[0] == x and k[1] == y and k[2] == z]
+
+    def to_dict(self, table: Optional[RecordTable] = None) -> Dict[str, Any]:
+        def placed(rid: int) -> Dict[str, Any]:
+            if table is None:
+                return {"record": rid}
+            return {"record": rid, "player": table.players[table.player_idx[rid]],
+                    "time": format_time_utc(table.timestamps[rid])}
+        return {
+            "stop": self.stop,
+            "blocks": [{"x": x, "y": y, "z": z, "name": name, "dir": d, **placed(rid)}
+                       for (x, y, z, name, d), rid in sorted(self.blocks.items())],
+            "items": [{"name": name, "pos": {"x": px, "y": py, "z": pz}, **placed(rid)}
+                      for (name, px, py, pz), rid in sorted(self.items.items())],
+        }
+
+class _Snapshot:
+    # Keys in one tuple and placing record ids in an array: ~12 bytes per entry on top of the
+    # key tuples, which are shared with the live state rather than copied.
+    __slots__ = ("event", "stop", "block_keys", "block_ids", "item_keys", "item_ids")
+
+    def __init__(self, event: int, state: MapState):
+        self.event = event
+        self.stop = state.stop
+        self.block_keys = tuple(state.blocks)
+        self.block_ids = array("I", state.blocks.values())
+        self.item_keys = tuple(state.items)
+        self.item_ids = array("I", state.items.values())
+
+    def restore(self) -> MapState:
+        return MapState(dict(zip(self.block_keys, self.block_ids)), dict(zip(self.item_keys, self.item_ids)), self.stop)
+
+class MapReplay:
+    def __init__(self, log_path: str, table: Optional[RecordTable] = None, snapshot_every: int = 2048):
+        self.log_path = log_path
+        self.table = table
+        self.snapshot_every = snapshot_every
+        self.event_ids = array("I")
+        self.event_ops: List[Tuple[Op, ...]] = []
+        self.snapshots: List[_Snapshot] = []
+        self._snapshot_stops = array("Q")
+        self.live = MapState()
+
+    def __len__(self) -> int:
+        return len(self.event_ids)
+
+    def _add_event(self, rid: int, ops: Tuple[Op, ...], force_snapshot: bool = False):
+        self.event_ids.append(rid)
+        self.event_ops.append(ops)
+        self.live.apply(rid, ops)
+        self.live.stop = rid + 1
+        if force_snapshot or len(self.event_ids) % self.snapshot_every == 0:
+            self.snapshots.append(_Snapshot(len(self.event_ids), self.live))
+            self._snapshot_stops.append(self.live.stop)
+
+    def update(self, stop: Optional[int] = None, workers: Optional[int] = None,
+               progress: Optional[Callable[[int, int], None]] = None) -> int:
+        # Decodes the edit records appended since the last call and extends ops, snapshots and live state.
+        if self.table is None:
+            self.table = read_mt_table(self.log_path)
+        table = self.table
+        start = self.live.stop
+        stop = len(table) if stop is None else stop
+        if stop <= start:
+            return 0
+        type_ids = table.type_ids
+        ids = [i for i in range(start, stop) if type_ids[i] in (PLACE_TYPE, DELETE_TYPE)]
+        resyncs = [i for i in range(start, stop) if type_ids[i] == RESYNC_TYPE]
+        added = 0
+        with MTLogFile(self.log_path, cache=None) as log:
+            pending = iter(resyncs)
+            nxt = next(pending, None)
+
+            def add_resyncs(before: int):
+                nonlocal nxt, added
+                while nxt is not None and nxt < before:
+                    doc = decode_resync(log.payload(table[nxt]))
+                    self._add_event(nxt, record_ops(RESYNC_TYPE, doc) if doc is not None else (), True)
+                    added += 1
+                    nxt = next(pending, None)
+
+            for rid, doc in iter_decoded_parallel(self.log_path, table, ids, workers=workers, progress=progress):
+                add_resyncs(rid)
+                ops = record_ops(type_ids[rid], doc)
+                if ops:
+                    self._add_event(rid, ops)
+                    added += 1
+            add_resyncs(stop)
+        self.live.stop = stop
+        return added
+
+    def state_at(self, stop: int) -> MapState:
+        # Map after every record with index < stop: nearest snapshot at or before it, then replay.
+        j = bisect_right(self._snapshot_stops, stop) - 1
+        state = self.snapshots[j].restore() if j >= 0 else MapState()
+        first = self.snapshots[j].event if j >= 0 else 0
+        last = bisect_left(self.event_ids, stop, first)
+        ids, ops = self.event_ids, self.event_ops
+        for k in range(first, last):
+            state.apply(ids[k], ops[k])
+        state.stop = max(state.stop, stop)
+        return state
+
+    def state_after(self, index: int) -> MapState:
+        return self.state_at(index + 1)
+
+    def state_at_time(self, timestamp_ms: int) -> MapState:
+        return self.state_at(bisect_right(self.table.timestamps, timestamp_ms))
+
+def main():
+    from mtlog import parse_time
+    ap = argparse.ArgumentParser(description="Reconstruct the map of a .map_together_log at a record or time.")
+    ap.add_argument("log")
+    g = ap.add_mutually_exclusive_group()
+    g.add_argument("-i", "--index", type=int, help="state after this record index")
+    g.add_argument("--time", help="state at this epoch ms or ISO time (UTC)")
+    ap.add_argument("-j", "--workers", type=int, default=None)
+    ap.add_argument("--summary", action="store_true", help="counts only")
+    args = ap.parse_args()
+    replay = MapReplay(args.log)
+    replay.update(workers=args.workers)
+    if args.index is not None:
+        state = replay.state_after(args.index)
+    elif args.time is not None:
+        state = replay.state_at_time(parse_time(args.time))
+    else:
+        state = replay.live
+    if args.summary:
+        doc = {"stop": state.stop, "blocks": len(state.blocks), "items": len(state.items),
+               "edit_records": len(replay), "snapshots": len(replay.snapshots)}
+    else:
+        doc = state.to_dict(replay.table)
+    json.dump(doc, sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
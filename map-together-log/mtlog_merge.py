@@ -0,0 +1,123 @@
+from __future__ import annotations
+import argparse
+import heapq
+import os
+import sys
+import time
+from operator import attrgetter
+from typing import Optional, Dict, Any, Callable, Iterable, Iterator, Sequence, Set
+
+from mtlog_cache import DECODE_CACHE, DecodeCache
+from mtlog_decode import MTRecord, MTLogFile, iter_mt_records
+from mtlog_timeindex import MAX_TIME, records_between
+
+# Lazy k-way merge of several logs (one per room restart) on timestamp_ms. heapq.merge holds one
+# pending record per source, so memory is O(number of logs) however long they are. Records keep
+# their own file_path, index and offsets, so payloads are read from the log they came from.
+_MERGE_KEY = attrgetter("timestamp_ms")
+# Header batch per source: a full 65536-record batch is ~17 MB, too much with dozens of logs open.
+MERGE_BATCH_RECORDS = 1024
+
+def merge_records(sources: Iterable[Iterable[MTRecord]]) -> Iterator[MTRecord]:
+    # Equal timestamps come out in source order, and each source keeps its own order.
+    return heapq.merge(*sources, key=_MERGE_KEY)
+
+def iter_log_records(path: str, types: Optional[Set[int]] = None, players: Optional[Set[str]] = None,
+                     since_ms: Optional[int] = None, until_ms: Optional[int] = None) -> Iterator[MTRecord]:
+    # Streaming filter over one log; a time range only parses the blocks its .mttidx says overlap.
+    if since_ms is None and until_ms is None:
+        source = iter_mt_records(path, batch_records=MERGE_BATCH_RECORDS)
+    else:
+        source = records_between(path, since_ms or 0, MAX_TIME if until_ms is None else until_ms)
+    for r in source:
+        if types is not None and r.type_id not in types:
+            continue
+        if players is not None and r.player_id not in players:
+            continue
+        yield r
+
+def iter_merged_records(paths: Sequence[str], types: Optional[Iterable[int]] = None,
+                        players: Optional[Iterable[str]] = None, since_ms: Optional[int] = None,
+                        until_ms: Optional[int] = None) -> Iterator[MTRecord]:
+    types = set(types) if types is not None else None
+    players = set(players) if players is not None else None
+    return merge_records([iter_log_records(p, types, players, since_ms, until_ms) for p in paths])
+
+class MergedLogFiles:
+    # One MTLogFile per source log, picked by the record's file_path; payload(), record_bytes()
+    # and decode() work like MTLogFile's for records from any of them.
+    def __init__(self, paths: Iterable[str], cache: Optional[DecodeCache] = DECODE_CACHE):
+        self.logs: Dict[str, MTLogFile] = {}
+        try:
+            for p in paths:
+                if p not in self.logs:
+                    self.logs[p] = MTLogFile(p, cache)
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self) -> "MergedLogFiles":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getitem__(self, path: str) -> MTLogFile:
+        return self.logs[path]
+
+    def payload(self, rec) -> memoryview:
+        return self.logs[rec.file_path].payload(rec)
+
+    def record_bytes(self, rec) -> memoryview:
+        return self.logs[rec.file_path].record_bytes(rec)
+
+    def decode(self, rec) -> Dict[str, Any]:
+        return self.logs[rec.file_path].decode(rec)
+
+    def close(self):
+        for log in self.logs.values():
+            log.close()
+        self.logs.clear()
+
+def write_merged_log(paths: Sequence[str], out_path: str, records: Optional[Iterable[MTRecord]] = None,
+                     progress: Optional[Callable[[int], None]] = None) -> int:
+    # Copies the raw records in merged order into one log, which then opens, indexes and filters
+    # like any other. `records` defaults to all records of all paths.
+    if records is None:
+        records = iter_merged_records(paths)
+    tmp = out_path + ".tmp"
+    n = 0
+    with MergedLogFiles(paths, cache=None) as logs, open(tmp, "wb") as out:
+        for r in records:
+            out.write(logs.record_bytes(r))
+            n += 1
+            if progress and not n & 0xFFFF:
+                progress(n)
+    os.replace(tmp, out_path)
+    if progress:
+        progress(n)
+    return n
+
+def main():
+    from mtlog import parse_time, parse_types
+    ap = argparse.ArgumentParser(description="Merge several .map_together_log files into one time-ordered log.")
+    ap.add_argument("logs", nargs="+")
+    ap.add_argument("-o", "--out", required=True, help="merged log path")
+    ap.add_argument("-t", "--type", action="append", help="type id or name, repeatable or comma separated")
+    ap.add_argument("-p", "--player", action="append", help="player id, repeatable")
+    ap.add_argument("--since", help="epoch ms or ISO time (UTC)")
+    ap.add_argument("--until", help="epoch ms or ISO time (UTC)")
+    args = ap.parse_args()
+    if os.path.abspath(args.out) in {os.path.abspath(p) for p in args.logs}:
+        ap.error("the output must not be one of the inputs")
+    records = iter_merged_records(args.logs, parse_types(args.type), args.player,
+                                  parse_time(args.since), parse_time(args.until))
+    t0 = time.perf_counter()
+    n = write_merged_log(args.logs, args.out, records,
+                         progress=lambda done: print(f"\r{done} records", end="", file=sys.stderr))
+    dt = time.perf_counter() - t0
+    print(file=sys.stderr)
+    print(f"Merged {n} records from {len(args.logs)} logs into {args.out} in {dt:.2f}s ({n / max(dt, 1e-9):,.0f} rec/s)")
+
+if __name__ == "__main__":
+    main()
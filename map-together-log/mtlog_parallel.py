@@ -0,0 +1,157 @@
+from __future__ import annotations
+import argparse
+import json
+import mmap
+import os
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any, Iterator, List, Tuple, Callable, Sequence
+
+from mtlog_archive import MTArchive, is_archive, open_log_view
+from mtlog_decode import MT_TYPES, read_mt_table
+from mtlog_payload import PAYLOAD_DECODERS, decode_payload
+from mtlog_table import RecordTable
+
+# Per-process state: each worker maps the log once and only receives offset ranges.
+_worker_path: Optional[str] = None
+_worker_file = None
+_worker_mm: Optional[mmap.mmap] = None
+_worker_view = None
+
+def _worker_init(path: str):
+    global _worker_path, _worker_file, _worker_mm, _worker_view
+    _worker_path = path
+    if is_archive(path):
+        # Each worker keeps its own block cache; chunks are contiguous, so blocks are rarely decompressed twice.
+        _worker_view = MTArchive(path)
+        return
+    _worker_file = open(path, "rb")
+    _worker_mm = mmap.mmap(_worker_file.fileno(), 0, access=mmap.ACCESS_READ)
+    _worker_view = memoryview(_worker_mm)
+
+def _new_stats() -> Dict[str, Any]:
+    return {"count": 0, "payload_bytes": 0, "blocks": 0, "items": 0, "errors": 0}
+
+def _accumulate(stats: Dict[int, Dict[str, Any]], type_id: int, payload_len: int, doc: Dict[str, Any]):
+    st = stats.get(type_id)
+    if st is None:
+        st = stats[type_id] = _new_stats()
+    st["count"] += 1
+    st["payload_bytes"] += payload_len
+    blocks = doc.get("blocks")
+    if blocks:
+        st["blocks"] += blocks.get("count", 0)
+        st["errors"] += sum(1 for e in blocks.get("entries", ()) if "error" in e)
+    items = doc.get("items")
+    if items:
+        st["items"] += items.get("count", 0)
+        st["errors"] += sum(1 for e in items.get("entries", ()) if "error" in e)
+
+def _decode_range(view, start: int, offsets: bytes, type_ids: bytes, payload_lens: bytes,
+                  keep_docs: bool) -> Tuple[int, List[Dict[str, Any]], Dict[int, Dict[str, Any]]]:
+    offs = array("Q"); offs.frombytes(offsets)
+    tids = array("I"); tids.frombytes(type_ids)
+    lens = array("I"); lens.frombytes(payload_lens)
+    docs: List[Dict[str, Any]] = []
+    stats: Dict[int, Dict[str, Any]] = {}
+    for off, tid, n in zip(offs, tids, lens):
+        doc = decode_payload(tid, view[off+8:off+8+n]) if tid in PAYLOAD_DECODERS else {}
+        _accumulate(stats, tid, n, doc)
+        if keep_docs:
+            docs.append(doc)
+    return start, docs, stats
+
+def _worker_decode_range(start: int, offsets: bytes, type_ids: bytes, payload_lens: bytes, keep_docs: bool):
+    return _decode_range(_worker_view, start, offsets, type_ids, payload_lens, keep_docs)
+
+def _merge_stats(into: Dict[int, Dict[str, Any]], part: Dict[int, Dict[str, Any]]):
+    for tid, st in part.items():
+        dst = into.get(tid)
+        if dst is None:
+            into[tid] = dict(st)
+        else:
+            for k, v in st.items():
+                dst[k] += v
+
+def _ranges(table: RecordTable, ids: Optional[Sequence[int]], chunk_records: int) -> Iterator[Tuple[int, bytes, bytes, bytes, array]]:
+    if ids is None:
+        for start in range(0, len(table), chunk_records):
+            stop = min(start + chunk_records, len(table))
+            yield (start, table.offsets[start:stop].tobytes(), table.type_ids[start:stop].tobytes(),
+                   table.payload_lens[start:stop].tobytes(), array("I", range(start, stop)))
+        return
+    for pos in range(0, len(ids), chunk_records):
+        sub = array("I", ids[pos:pos+chunk_records])
+        yield (pos,
+               array("Q", (table.offsets[i] for i in sub)).tobytes(),
+               array("I", (table.type_ids[i] for i in sub)).tobytes(),
+               array("I", (table.payload_lens[i] for i in sub)).tobytes(),
+               sub)
+
+def iter_decoded_parallel(path: str, table: Optional[RecordTable] = None, ids: Optional[Sequence[int]] = None,
+                          workers: Optional[int] = None, chunk_records: int = 4096,
+                          stats: Optional[Dict[int, Dict[str, Any]]] = None,
+                          progress: Optional[Callable[[int, int], None]] = None,
+                          keep_docs: bool = True) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    if table is None:
+        table = read_mt_table(path)
+    total = len(table) if ids is None else len(ids)
+    workers = workers or os.cpu_count() or 1
+    stats = stats if stats is not None else {}
+    done = 0
+
+    def emit(result, id_list):
+        nonlocal done
+        _, docs, part = result
+        _merge_stats(stats, part)
+        done += len(id_list)
+        if progress:
+            progress(done, total)
+        if keep_docs:
+            yield from zip(id_list, docs)
+
+    if workers <= 1 or total <= chunk_records:
+        with open_log_view(path) as view:
+            for start, offs, tids, lens, id_list in _ranges(table, ids, chunk_records):
+                yield from emit(_decode_range(view, start, offs, tids, lens, keep_docs), id_list)
+        return
+
+    # Keep a bounded window of chunks in flight and drain them in submission order,
+    # so output stays in record order and memory does not grow with the log.
+    with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init, initargs=(path,)) as ex:
+        pending: deque = deque()
+        for start, offs, tids, lens, id_list in _ranges(table, ids, chunk_records):
+            pending.append((ex.submit(_worker_decode_range, start, offs, tids, lens, keep_docs), id_list))
+            if len(pending) >= workers * 3:
+                fut, id_list = pending.popleft()
+                yield from emit(fut.result(), id_list)
+        while pending:
+            fut, id_list = pending.popleft()
+            yield from emit(fut.result(), id_list)
+
+def type_stats_parallel(path: str, table: Optional[RecordTable] = None, workers: Optional[int] = None,
+                        chunk_records: int = 16384) -> Dict[int, Dict[str, Any]]:
+    stats: Dict[int, Dict[str, Any]] = {}
+    for _ in iter_decoded_parallel(path, table, workers=workers, chunk_records=chunk_records, stats=stats, keep_docs=False):
+        pass
+    return dict(sorted(stats.items()))
+
+def main():
+    ap = argparse.ArgumentParser(description="Decode all payloads of a .map_together_log across worker processes.")
+    ap.add_argument("log")
+    ap.add_argument("-j", "--workers", type=int, default=None)
+    ap.add_argument("--chunk", type=int, default=16384)
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    table = read_mt_table(args.log)
+    t1 = time.perf_counter()
+    stats = type_stats_parallel(args.log, table, workers=args.workers, chunk_records=args.chunk)
+    t2 = time.perf_counter()
+    out = {MT_TYPES.get(k, f"Unknown({k})"): v for k, v in stats.items()}
+    print(json.dumps(out, indent=2))
+    print(f"{len(table)} records: boundary pass {t1 - t0:.2f}s, decode {t2 - t1:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+from __future__ import annotations
+import math
+import re
+import struct
+from bisect import bisect_left
+from functools import partial
+from typing import Optional, Dict, Any, List, Callable, Tuple, Union
+
+# Decoders take any contiguous buffer; callers pass memoryview slices of the mmapped log
+# so payloads are never copied into intermediate bytes objects.
+Buffer = Union[bytes, bytearray, memoryview]
+PayloadDecoder = Callable[[Buffer], Dict[str, Any]]
+
+def collection_name(idx: int) -> str:
+    return "Nadeo" if idx == 26 else f"#{idx}"
+
+def safe_decode(bs: Buffer) -> str:
+    return str(bs, "utf-8", "replace")
+
+def rd_u16_le(b: Buffer, o: int) -> int:
+    return int.from_bytes(b[o:o+2], "little")
+
+def rd_u32_le(b: Buffer, o: int) -> int:
+    return int.from_bytes(b[o:o+4], "little")
+
+def rd_f32_le(b: Buffer, o: int) -> float:
+    return struct.unpack_from("<f", b, o)[0]
+
+_PRINTABLE_RUN = re.compile(rb"[\t\n\r\x20-\x7e]*")
+# u16 name length in 1..96 followed by a printable first character; zero-width so overlapping hits are kept.
+_NAME_PREFIX = re.compile(rb"(?=[\x01-\x60]\x00[\t\n\r\x20-\x7e])")
+_DIR_POS_PYR = struct.Struct("<H6f")
+
+def is_ascii_printable(bs: Buffer, start: int = 0, end: Optional[int] = None) -> bool:
+    return _PRINTABLE_RUN.fullmatch(bs, start, len(bs) if end is None else end) is not None
+
+def roundf(x: float, n: int = 6) -> float:
+    try:
+        if math.isfinite(x):
+            # Same correctly rounded result as float(f"{x:.{n}f}"), without the string round trip.
+            return round(x, n)
+    except Exception:
+        pass
+    return x
+
+MAGIC_BLKS = b"BLKs"  # 0x734b4c42
+MAGIC_SKNs = b"SKNs"  # 0x734e4b53
+MAGIC_ITMs = b"ITMs"  # 0x734d5449
+# memoryview has no .find(), but re searches any buffer in place.
+_SECTION_TAGS = tuple((re.compile(re.escape(tag)), tag.decode()) for tag in (MAGIC_BLKS, MAGIC_SKNs, MAGIC_ITMs))
+
+def find_sections(payload: Buffer) -> Dict[str, Dict[str, int]]:
+    out = {}
+    for pat, key in _SECTION_TAGS:
+        m = pat.search(payload)
+        if m is None:
+            out[key] = {"offset": -1, "count": 0}
+            continue
+        i = m.start()
+        cnt_off = i + 4
+        cnt = rd_u16_le(payload, cnt_off) if cnt_off + 2 <= len(payload) else 0
+        out[key] = {"offset": i, "count": cnt, "count_offset": cnt_off}
+    return out
+
+def _block_like_at(payload: Buffer, i: int, hard_limit: int) -> bool:
+    nlen = rd_u16_le(payload, i)
+    if not (1 <= nlen <= 96 and i + 2 + nlen + 6 <= hard_limit):
+        return False
+    if not is_ascii_printable(payload, i + 2, i + 2 + nlen):
+        return False
+    j = i + 2 + nlen
+    if rd_u32_le(payload, j) > 500:
+        return False
+    a_len_off = j + 4
+    a_len = rd_u16_le(payload, a_len_off)
+    if a_len > 128 or a_len_off + 2 + a_len > hard_limit:
+        return False
+    return is_ascii_printable(payload, a_len_off + 2, a_len_off + 2 + a_len)
+
+class BlockStartFinder:
+    # Finds every block/item-like start in [search_from, hard_limit) once with a regex prefilter,
+    # so repeated "next start after p" lookups while walking a section are a bisect each.
+    def __init__(self, payload: Buffer, hard_limit: int):
+        self.payload = payload
+        self.hard_limit = min(hard_limit, len(payload))
+        self._from = None
+        self._starts: List[int] = []
+
+    def _scan(self, search_from: int):
+        payload, limit = self.payload, self.hard_limit
+        self._starts = [m.start() for m in _NAME_PREFIX.finditer(payload, search_from, limit)
+                        if _block_like_at(payload, m.start(), limit)]
+        self._from = search_from
+
+    def next(self, search_from: int) -> Optional[int]:
+        search_from = max(0, search_from)
+        if self._from is None or search_from < self._from:
+            self._scan(search_from)
+        k = bisect_left(self._starts, search_from)
+        return self._starts[k] if k < len(self._starts) else None
+
+def next_block_like_start(payload: Buffer, search_from: int, hard_limit: int) -> Optional[int]:
+    limit = min(hard_limit, len(payload))
+    for m in _NAME_PREFIX.finditer(payload, max(0, search_from), limit):
+        if _block_like_at(payload, m.start(), limit):
+            return m.start()
+    return None
+
+def parse_blocks(payload: Buffer, blks_off: int, blks_count: int, section_end: int) -> Dict[str, Any]:
+    result = {"count": blks_count, "entries": []}
+    if blks_off < 0 or blks_count == 0:
+        return result
+    p = blks_off + 4 + 2
+    finder = BlockStartFinder(payload, section_end)
+    for bi in range(blks_count):
+        entry = {}
+        start_here = p
+        try:
+            name_len = rd_u16_le(payload, p); p += 2
+            name_off = p
+            name = safe_decode(payload[p:p+name_len]); p += name_len
+
+            coll_off = p
+            coll_idx = rd_u32_le(payload, p); p += 4
+
+            a_len = rd_u16_le(payload, p); p += 2
+            author_off = p
+            author = safe_decode(payload[p:p+a_len]); p += a_len
+
+            coord_off = p
+            x = rd_u32_le(payload, p); y = rd_u32_le(payload, p+4); z = rd_u32_le(payload, p+8); p += 12
+
+            dir_off = p
+            dir_val = rd_u16_le(payload, p); p += 2
+
+            pos_off = p
+            px = rd_f32_le(payload, p); py = rd_f32_le(payload, p+4); pz = rd_f32_le(payload, p+8); p += 12
+
+            pyr_off = p
+            prx = rd_f32_le(payload, p); pry = rd_f32_le(payload, p+4); prz = rd_f32_le(payload, p+8); p += 12
+
+            if bi < blks_count - 1:
+                nxt = finder.next(p)
+                end_this = nxt if nxt is not None else section_end
+            else:
+                end_this = section_end
+
+            tail = payload[p:end_this] if end_this > p else b""
+            p = end_this
+
+            entry = {
+                "name": name,
+                "name_offset": name_off,
+                "collection_idx": coll_idx,
+                "collection_name": collection_name(coll_idx),
+                "collection_offset": coll_off,
+                "author": author,
+                "author_offset": author_off,
+                "coord_nat3": {"x": x, "y": y, "z": z},
+                "coord_nat3_offset": coord_off,
+                "dir": dir_val,
+                "dir_offset": dir_off,
+                "dir_degrees": int(dir_val % 8) * 45 if dir_val >= 4 else int(dir_val) * 90,
+                "pos": {"x": roundf(px), "y": roundf(py), "z": roundf(pz)},
+                "pos_offset": pos_off,
+                "pyr": {"x": roundf(prx), "y": roundf(pry), "z": roundf(prz)},
+                "pyr_degrees": {"x": roundf(math.degrees(prx)), "y": roundf(math.degrees(pry)), "z": roundf(math.degrees(prz))},
+                "pyr_offset": pyr_off,
+            }
+            if tail:
+                entry["tail_raw"] = {
+                    "offset": end_this - len(tail),
+                    "length": len(tail),
+                    "hex": payload[end_this-len(tail):end_this].hex()
+                }
+        except Exception as ex:
+            entry["error"] = f"block parse error at {start_here}: {ex}"
+            nxt = finder.next(p)
+            p = nxt if nxt is not None else section_end
+        result["entries"].append(entry)
+    return result
+
+def next_item_like_start(payload: Buffer, search_from: int, hard_limit: int) -> Optional[int]:
+    return next_block_like_start(payload, search_from, hard_limit)
+
+def find_dir_pos_pyr_after(payload: Buffer, from_off: int, end_off: int) -> Optional[Dict[str, Any]]:
+    unpack = _DIR_POS_PYR.unpack_from
+    i = from_off
+    while i + 2 + 12 + 12 <= end_off:
+        d, px, py, pz, rx, ry, rz = unpack(payload, i)
+        # NaN/inf fail these comparisons, so no separate isfinite check is needed.
+        if (abs(px) < 1e7 and abs(py) < 1e7 and abs(pz) < 1e7
+                and abs(rx) < 20 and abs(ry) < 20 and abs(rz) < 20):
+            return {
+                "dir": d, "dir_offset": i,
+                "pos": {"x": roundf(px), "y": roundf(py), "z": roundf(pz)},
+                "pos_offset": i+2,
+                "pyr": {"x": roundf(rx), "y": roundf(ry), "z": roundf(rz)},
+                "pyr_degrees": {"x": roundf(math.degrees(rx)), "y": roundf(math.degrees(ry)), "z": roundf(math.degrees(rz))},
+                "pyr_offset": i+14,
+            }
+        i += 2
+    return None
+
+def parse_items(payload: Buffer, itms_off: int, itms_count: int, section_end: int) -> Dict[str, Any]:
+    result = {"count": itms_count, "entries": []}
+    if itms_off < 0 or itms_count == 0:
+        return result
+    p = itms_off + 4 + 2
+    finder = BlockStartFinder(payload, section_end)
+    for ii in range(itms_count):
+        entry = {}
+        start_here = p
+        try:
+            nlen = rd_u16_le(payload, p); p += 2
+            name_off = p
+            name = safe_decode(payload[p:p+nlen]); p += nlen
+
+            u32_after_name_off = p
+            u32_after_name = rd_u32_le(payload, p); p += 4
+
+            alen = rd_u16_le(payload, p); p += 2
+            author_off = p
+            author = safe_decode(payload[p:p+alen]); p += alen
+
+            if ii < itms_count - 1:
+                nxt = finder.next(p)
+                end_this = nxt if nxt is not None else section_end
+            else:
+                end_this = section_end
+
+            trio = find_dir_pos_pyr_after(payload, p, end_this)
+            if trio:
+                p = end_this
+                entry = {
+                    "name": name,
+                    "name_offset": name_off,
+                    "u32_after_name": u32_after_name,
+                    "u32_after_name_offset": u32_after_name_off,
+                    "author": author,
+                    "author_offset": author_off,
+                    "dir": trio["dir"],
+                    "dir_offset": trio["dir_offset"],
+                    "dir_degrees": int(trio["dir"] % 8) * 45 if trio["dir"] >= 4 else int(trio["dir"]) * 90,
+                    "pos": trio["pos"],
+                    "pos_offset": trio["pos_offset"],
+                    "pyr": trio["pyr"],
+                    "pyr_degrees": trio["pyr_degrees"],
+                    "pyr_offset": trio["pyr_offset"],
+                }
+                tstart = trio["pyr_offset"] + 12
+                if end_this > tstart:
+                    entry["tail_raw"] = {
+                        "offset": tstart,
+                        "length": end_this - tstart,
+                        "hex": payload[tstart:end_this].hex()
+                    }
+            else:
+                entry = {
+                    "name": name, "name_offset": name_off,
+                    "u32_after_name": u32_after_name, "u32_after_name_offset": u32_after_name_off,
+                    "author": author, "author_offset": author_off,
+                    "note": "dir/pos/pyr not located within item body"
+                }
+                if end_this > p:
+                    entry["raw_after_author"] = {
+                        "offset": p,
+                        "length": end_this - p,
+                        "hex": payload[p:end_this].hex()
+                    }
+                p = end_this
+        except Exception as ex:
+            entry["error"] = f"item parse error at {start_here}: {ex}"
+            nxt = finder.next(p)
+            p = nxt if nxt is not None else section_end
+        result["entries"].append(entry)
+    return result
+
+def decode_chat(payload: Buffer) -> Dict[str, Any]:
+    info: Dict[str, Any] = {}
+    if len(payload) < 3:
+        info["warning"] = "payload too short for chat"
+        return info
+    msg_ty = payload[0]
+    ln = int.from_bytes(payload[1:3], "little")
+    if 3 + ln <= len(payload):
+        msg = safe_decode(payload[3:3+ln])
+    else:
+        msg = safe_decode(payload[3:])
+        info["warning"] = "truncated chat payload"
+    info["msg_type"] = int(msg_ty)
+    info["message"] = msg
+    return info
+
+def decode_admin_set_action_limit(payload: Buffer) -> Dict[str, Any]:
+    info: Dict[str, Any] = {}
+    if len(payload) < 4:
+        info["warning"] = "payload too short"
+        return info
+    # The wire value is the minimum interval between actions; report it and the rate it implies.
+    limit_ms = int.from_bytes(payload[0:4], "little")
+    info["limit_per_action_ms"] = limit_ms
+    info["limit_hz"] = 1000.0 / limit_ms if limit_ms else None
+    return info
+
+# PlayerCamCursor/VehiclePos layouts are undocumented; the payloads seen so far start with a
+# float32 x, y, z. type id -> (byte offset of x, array typecode "f" or "d"); override per log if needed.
+POSITION_LAYOUTS: Dict[int, Tuple[int, str]] = {14: (0, "f"), 15: (0, "f")}
+_POSITION_STRUCTS = {"f": struct.Struct("<3f"), "d": struct.Struct("<3d")}
+
+def decode_position(payload: Buffer, type_id: int) -> Dict[str, Any]:
+    off, code = POSITION_LAYOUTS[type_id]
+    s = _POSITION_STRUCTS[code]
+    if len(payload) < off + s.size:
+        return {"warning": "payload too short for position", "raw_len": len(payload)}
+    x, y, z = s.unpack_from(payload, off)
+    return {"pos": {"x": roundf(x), "y": roundf(y), "z": roundf(z)}, "raw_len": len(payload)}
+
+def decode_place_delete_setskin(payload: Buffer, type_id: int) -> Dict[str, Any]:
+    doc: Dict[str, Any] = {}
+    secs = find_sections(payload)
+    doc["sections"] = {
+        k: {"offset": v.get("offset", -1), "count": v.get("count", 0)}
+        for k,v in secs.items()
+    }
+    notes: List[str] = []
+
+    blks_off = secs.get("BLKs", {}).get("offset", -1)
+    blks_cnt = secs.get("BLKs", {}).get("count", 0)
+    skns_off = secs.get("SKNs", {}).get("offset", -1)
+    itms_off = secs.get("ITMs", {}).get("offset", -1)
+
+    end_blks = skns_off if (blks_off >= 0 and skns_off >= 0) else (len(payload))
+    end_skns = itms_off if (skns_off >= 0 and itms_off >= 0) else (len(payload))
+    end_itms = len(payload)
+
+    if blks_off >= 0:
+        doc["blocks"] = parse_blocks(payload, blks_off, blks_cnt, end_blks)
+        if doc["blocks"]["count"] == 0:
+            notes.append("BLKs present but count=0.")
+    else:
+        notes.append("No BLKs section found.")
+
+    if skns_off >= 0:
+        cnt = secs["SKNs"]["count"]
+        start = skns_off + 6
+        doc["skins"] = {"count": cnt, "raw_offset": start, "raw_length": max(0, end_skns - start)}
+    else:
+        notes.append("No SKNs section found.")
+
+    if itms_off >= 0:
+        itms_cnt = secs["ITMs"]["count"]
+        doc["items"] = parse_items(payload, itms_off, itms_cnt, end_itms)
+    else:
+        notes.append("No ITMs section found.")
+
+    if notes:
+        doc["notes"] = notes
+    return doc
+
+PAYLOAD_DECODERS: Dict[int, PayloadDecoder] = {
+    1: partial(decode_place_delete_setskin, type_id=1),
+    2: partial(decode_place_delete_setskin, type_id=2),
+    4: partial(decode_place_delete_setskin, type_id=4),
+    14: partial(decode_position, type_id=14),
+    15: partial(decode_position, type_id=15),
+    16: decode_admin_set_action_limit,
+    20: decode_chat,
+}
+
+def register_decoder(type_id: int, fn: PayloadDecoder) -> None:
+    PAYLOAD_DECODERS[type_id] = fn
+
+def decode_payload(type_id: int, payload: Buffer) -> Dict[str, Any]:
+    fn = PAYLOAD_DECODERS.get(type_id)
+    return fn(payload) if fn is not None else {}
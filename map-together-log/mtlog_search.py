@@ -0,0 +1,201 @@
+from __future__ import annotations
+import sqlite3
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple, Callable
+
+from mtlog_decode import read_mt_table
+from mtlog_parallel import iter_decoded_parallel
+from mtlog_table import RecordTable
+
+# Full-text index over chat messages and block/item names and authors, kept in an SQLite
+# FTS5 table next to the log and extended with the records appended since the last update.
+SEARCH_SUFFIX = ".mtfts"
+SEARCH_VERSION = 1
+SEARCH_TYPES = (1, 2, 4, 20)
+SEARCH_KINDS = ("chat", "block", "item")
+
+@dataclass
+class SearchHit:
+    __slots__ = ("record", "kind", "entry", "text", "author")
+    record: int
+    kind: str
+    entry: int
+    text: str
+    author: str
+
+def search_path_for(log_path: str) -> str:
+    return log_path + SEARCH_SUFFIX
+
+def _doc_rows(rid: int, type_id: int, player: str, doc: Dict[str, Any]) -> Iterator[Tuple]:
+    if type_id == 20:
+        if doc.get("message"):
+            yield ("chat", rid, type_id, 0, doc["message"], player)
+        return
+    for kind, key in (("block", "blocks"), ("item", "items")):
+        section = doc.get(key)
+        if not section:
+            continue
+        for k, e in enumerate(section.get("entries", ())):
+            if "name" in e:
+                yield (kind, rid, type_id, k, e["name"], e.get("author", ""))
+
+def _fingerprint_text(table: RecordTable, i: int) -> str:
+    return ":".join(map(str, table.fingerprint(i)))
+
+class SearchIndex:
+    def __init__(self, log_path: str, db_path: Optional[str] = None):
+        self.log_path = log_path
+        self.db_path = db_path or search_path_for(log_path)
+        self.db = sqlite3.connect(self.db_path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        try:
+            self._create()
+        except sqlite3.Error:
+            self.db.close()
+            raise
+
+    def __enter__(self) -> "SearchIndex":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _create(self):
+        db = self.db
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        if self._meta("version", SEARCH_VERSION) != SEARCH_VERSION:
+            db.execute("DROP TABLE IF EXISTS docs")
+            db.execute("DELETE FROM meta")
+        exists = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'docs'").fetchone()
+        if not exists:
+            # trigram gives substring matches inside names like "RoadTechStraight"; older
+            # SQLite builds fall back to word tokens with prefix queries.
+            err = None
+            for tokenizer in ("trigram", "unicode61"):
+                try:
+                    db.execute("CREATE VIRTUAL TABLE docs USING fts5(kind UNINDEXED, record UNINDEXED, "
+                               f"type_id UNINDEXED, entry UNINDEXED, text, author, tokenize='{tokenizer}')")
+                    break
+                except sqlite3.OperationalError as e:
+                    err = e
+            else:
+                raise sqlite3.OperationalError(f"cannot create the search index: this SQLite build "
+                                               f"({sqlite3.sqlite_version}) has no usable FTS5 tokenizer ({err})") from err
+            self._set_meta(version=SEARCH_VERSION, tokenizer=tokenizer, records=0, last_record=None)
+            db.commit()
+        self.tokenizer = self._meta("tokenizer", "unicode61")
+
+    def _meta(self, key: str, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, **values):
+        self.db.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", values.items())
+
+    @property
+    def indexed_records(self) -> int:
+        return self._meta("records", 0)
+
+    def reset(self):
+        self.db.execute("DELETE FROM docs")
+        self._set_meta(records=0, last_record=None)
+        self.db.commit()
+
+    def check(self, table: RecordTable) -> bool:
+        # Drops the documents when the last indexed record is not in `table` any more (the log
+        # was replaced). An index ahead of a table that is still loading is checked later.
+        n = self.indexed_records
+        if n and n <= len(table) and self._meta("last_record") != _fingerprint_text(table, n - 1):
+            self.reset()
+            return False
+        return True
+
+    def update(self, table: Optional[RecordTable] = None, stop: Optional[int] = None,
+               progress: Optional[Callable[[int, int], None]] = None, cancel: Optional[Callable[[], bool]] = None,
+               workers: Optional[int] = None, batch_rows: int = 20000) -> int:
+        if table is None:
+            table = read_mt_table(self.log_path)
+        self.check(table)
+        stop = len(table) if stop is None else stop
+        start = self.indexed_records
+        if start > stop:
+            self.reset()
+            start = 0
+        if start == stop:
+            return 0
+        wanted = set(SEARCH_TYPES)
+        type_ids = table.type_ids
+        ids = [i for i in range(start, stop) if type_ids[i] in wanted]
+        players, player_idx = table.players, table.player_idx
+        rows: List[Tuple] = []
+        insert = "INSERT INTO docs (kind, record, type_id, entry, text, author) VALUES (?, ?, ?, ?, ?, ?)"
+        done = 0
+        try:
+            for rid, doc in iter_decoded_parallel(self.log_path, table, ids, workers=workers):
+                rows.extend(_doc_rows(rid, type_ids[rid], players[player_idx[rid]], doc))
+                done += 1
+                if len(rows) >= batch_rows:
+                    self.db.executemany(insert, rows)
+                    rows.clear()
+                    if progress:
+                        progress(done, len(ids))
+                    if cancel and cancel():
+                        # Nothing is marked as indexed, so the next update redoes this range.
+                        self.db.rollback()
+                        return 0
+            self.db.executemany(insert, rows)
+            self._set_meta(records=stop, last_record=_fingerprint_text(table, stop - 1))
+            self.db.commit()
+        except BaseException:
+            self.db.rollback()
+            raise
+        if progress:
+            progress(len(ids), len(ids))
+        return stop - start
+
+    def _match_query(self, query: str) -> Tuple[str, List[str], List[str]]:
+        match: List[str] = []
+        likes: List[str] = []
+        for term in query.split():
+            quoted = '"' + term.replace('"', '""') + '"'
+            if self.tokenizer != "trigram":
+                match.append(quoted + "*")
+            elif len(term) >= 3:
+                match.append(quoted)
+            else:
+                # Trigram MATCH needs 3+ characters; short terms become a LIKE over the rows.
+                likes.append("%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        return " AND ".join(match), likes, match
+
+    def search(self, query: str, kinds: Optional[Iterable[str]] = None, limit: int = 1000) -> List[SearchHit]:
+        match, likes, terms = self._match_query(query)
+        if not terms and not likes:
+            return []
+        where: List[str] = []
+        args: List[Any] = []
+        if match:
+            where.append("docs MATCH ?")
+            args.append(match)
+        for pat in likes:
+            where.append("(text LIKE ? ESCAPE '\\' OR author LIKE ? ESCAPE '\\')")
+            args += [pat, pat]
+        if kinds:
+            kinds = list(kinds)
+            where.append(f"kind IN ({','.join('?' * len(kinds))})")
+            args += kinds
+        sql = f"SELECT record, kind, entry, text, author FROM docs WHERE {' AND '.join(where)} ORDER BY rowid LIMIT ?"
+        args.append(limit)
+        # Rows are inserted in record order, so rowid order is record order and LIMIT can stop early.
+        return [SearchHit(int(r), k, int(e), t, a) for r, k, e, t, a in self.db.execute(sql, args)]
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+def search_log(log_path: str, query: str, kinds: Optional[Iterable[str]] = None, limit: int = 1000,
+               workers: Optional[int] = None) -> List[SearchHit]:
+    with SearchIndex(log_path) as ix:
+        ix.update(workers=workers)
+        return ix.search(query, kinds, limit)
@@ -0,0 +1,302 @@
+from __future__ import annotations
+import argparse
+import heapq
+import json
+import math
+import os
+import struct
+import sys
+from array import array
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+from mtlog_decode import read_mt_table
+from mtlog_parallel import iter_decoded_parallel
+from mtlog_table import Fingerprint, RecordTable, to_little_endian
+
+# Uniform-grid index over every block and item in Place/Delete/SetSkin payloads. Blocks are
+# placed by their integer coord_nat3, items by their float pos, so each kind has its own grid
+# and cell size. Entries are columnar and persisted next to the log like the other sidecars;
+# update() only decodes records appended since the last call.
+SPATIAL_SUFFIX = ".mtsidx"
+SPATIAL_MAGIC = b"MTSI"
+SPATIAL_VERSION = 2
+# magic, version, pad, n_records, entries, names, fingerprint of record n_records - 1
+_HEADER = struct.Struct("<4sHHQQIQIIQ")
+_COLUMNS = (("rids", "I"), ("entries", "I"), ("kinds", "B"), ("name_idx", "I"), ("xs", "d"), ("ys", "d"), ("zs", "d"))
+
+SPATIAL_TYPES = (1, 2, 4)
+BLOCK, ITEM = 0, 1
+KIND_NAMES = {"block": BLOCK, "item": ITEM}
+CELL_SIZES = {BLOCK: 8.0, ITEM: 256.0}
+
+Point = Tuple[float, float, float]
+
+def spatial_path_for(log_path: str) -> str:
+    return log_path + SPATIAL_SUFFIX
+
+class SpatialIndex:
+    def __init__(self, log_path: Optional[str] = None, table: Optional[RecordTable] = None):
+        self.log_path = log_path
+        self.index_path = spatial_path_for(log_path) if log_path else None
+        self.table = table
+        self.reset()
+
+    def reset(self):
+        for name, code in _COLUMNS:
+            setattr(self, name, array(code))
+        self.names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        self.grid: Dict[Tuple[int, int, int, int], array] = {}
+        self.n_records = 0
+        self.last_record: Optional[Fingerprint] = None
+
+    def __len__(self) -> int:
+        return len(self.rids)
+
+    def _cell(self, kind: int, x: float, y: float, z: float) -> Tuple[int, int, int, int]:
+        c = CELL_SIZES[kind]
+        return (kind, math.floor(x / c), math.floor(y / c), math.floor(z / c))
+
+    def _add(self, rid: int, entry: int, kind: int, name: str, x: float, y: float, z: float):
+        nid = self._name_ids.get(name)
+        if nid is None:
+            nid = self._name_ids[name] = len(self.names)
+            self.names.append(name)
+        pos = len(self.rids)
+        self.rids.append(rid); self.entries.append(entry); self.kinds.append(kind); self.name_idx.append(nid)
+        self.xs.append(x); self.ys.append(y); self.zs.append(z)
+        key = self._cell(kind, x, y, z)
+        cell = self.grid.get(key)
+        if cell is None:
+            cell = self.grid[key] = array("I")
+        cell.append(pos)
+
+    def add_doc(self, rid: int, doc: Dict[str, Any]):
+        for k, e in enumerate(doc.get("blocks", {}).get("entries", ())):
+            if "name" in e:
+                c = e["coord_nat3"]
+                self._add(rid, k, BLOCK, e["name"], c["x"], c["y"], c["z"])
+        for k, e in enumerate(doc.get("items", {}).get("entries", ())):
+            pos = e.get("pos")
+            if pos and "name" in e:
+                self._add(rid, k, ITEM, e["name"], pos["x"], pos["y"], pos["z"])
+
+    def _rebuild_grid(self):
+        self.grid = {}
+        cell_of = self._cell
+        for pos, (kind, x, y, z) in enumerate(zip(self.kinds, self.xs, self.ys, self.zs)):
+            key = cell_of(kind, x, y, z)
+            cell = self.grid.get(key)
+            if cell is None:
+                cell = self.grid[key] = array("I")
+            cell.append(pos)
+
+    def update(self, stop: Optional[int] = None, workers: Optional[int] = None,
+               progress: Optional[Callable[[int, int], None]] = None) -> int:
+        if self.table is None:
+            self.table = read_mt_table(self.log_path)
+        stop = len(self.table) if stop is None else stop
+        n = self.n_records
+        # Entries of a replaced log: its last indexed record is not in the table any more.
+        if n > stop or (n and self.table.fingerprint(n - 1) != self.last_record):
+            self.reset()
+        start = self.n_records
+        if stop <= start:
+            return 0
+        type_ids = self.table.type_ids
+        wanted = set(SPATIAL_TYPES)
+        ids = [i for i in range(start, stop) if type_ids[i] in wanted]
+        before = len(self.rids)
+        for rid, doc in iter_decoded_parallel(self.log_path, self.table, ids, workers=workers, progress=progress):
+            self.add_doc(rid, doc)
+        self.n_records = stop
+        self.last_record = self.table.fingerprint(stop - 1)
+        return len(self.rids) - before
+
+    def entry(self, pos: int) -> Dict[str, Any]:
+        rid = self.rids[pos]
+        doc = {"record": rid, "entry": self.entries[pos], "kind": "block" if self.kinds[pos] == BLOCK else "item",
+               "name": self.names[self.name_idx[pos]], "x": self.xs[pos], "y": self.ys[pos], "z": self.zs[pos]}
+        if self.table is not None and rid < len(self.table):
+            t = self.table
+            doc.update(type_id=t.type_ids[rid], player=t.players[t.player_idx[rid]], timestamp_ms=t.timestamps[rid])
+        return doc
+
+    def query_box(self, lo: Point, hi: Point, kind: int = BLOCK) -> array:
+        # Entry positions (in log order) with lo <= (x, y, z) <= hi, inclusive on both ends.
+        k0 = self._cell(kind, *lo)
+        k1 = self._cell(kind, *hi)
+        n_cells = (k1[1] - k0[1] + 1) * (k1[2] - k0[2] + 1) * (k1[3] - k0[3] + 1)
+        if n_cells > len(self.grid):
+            # Box spans more cells than are occupied: walk the occupied ones instead.
+            cells = [c for key, c in self.grid.items() if key[0] == kind
+                     and k0[1] <= key[1] <= k1[1] and k0[2] <= key[2] <= k1[2] and k0[3] <= key[3] <= k1[3]]
+        else:
+            get = self.grid.get
+            cells = [c for c in (get((kind, cx, cy, cz)) for cx in range(k0[1], k1[1] + 1)
+                                 for cy in range(k0[2], k1[2] + 1) for cz in range(k0[3], k1[3] + 1)) if c]
+        xs, ys, zs = self.xs, self.ys, self.zs
+        (x0, y0, z0), (x1, y1, z1) = lo, hi
+        out = [p for c in cells for p in c if x0 <= xs[p] <= x1 and y0 <= ys[p] <= y1 and z0 <= zs[p] <= z1]
+        out.sort()
+        return array("I", out)
+
+    def records_in_box(self, lo: Point, hi: Point, kind: int = BLOCK) -> array:
+        rids = self.rids
+        return array("I", sorted({rids[p] for p in self.query_box(lo, hi, kind)}))
+
+    def nearest(self, point: Point, k: int = 10, kind: int = BLOCK,
+                max_distance: float = math.inf) -> List[Tuple[float, int]]:
+        # (distance, entry position) of the k closest entries, searched in growing shells of cells
+        # around the point's cell; stops once no unvisited cell can hold anything closer.
+        if k <= 0:
+            return []
+        size = CELL_SIZES[kind]
+        _, cx, cy, cz = self._cell(kind, *point)
+        keys = [key for key in self.grid if key[0] == kind]
+        if not keys:
+            return []
+        reach = max(max(abs(key[1] - cx), abs(key[2] - cy), abs(key[3] - cz)) for key in keys)
+        px, py, pz = point
+        xs, ys, zs = self.xs, self.ys, self.zs
+        best: List[Tuple[float, int]] = []  # max-heap of (-distance, pos)
+
+        def visit(cell: array):
+            for p in cell:
+                d = math.sqrt((xs[p] - px) ** 2 + (ys[p] - py) ** 2 + (zs[p] - pz) ** 2)
+                if d > max_distance:
+                    continue
+                if len(best) < k:
+                    heapq.heappush(best, (-d, p))
+                elif d < -best[0][0]:
+                    heapq.heapreplace(best, (-d, p))
+
+        get = self.grid.get
+        for r in range(reach + 1):
+            if (2 * r + 1) ** 3 - (2 * r - 1) ** 3 > len(keys):
+                # The shell is bigger than the occupied grid: finish with the cells left outside the cube.
+                for key in keys:
+                    if max(abs(key[1] - cx), abs(key[2] - cy), abs(key[3] - cz)) >= r:
+                        visit(self.grid[key])
+                break
+            for dx in range(-r, r + 1):
+                for dy in range(-r, r + 1):
+                    edge = abs(dx) == r or abs(dy) == r
+                    for dz in (range(-r, r + 1) if edge else (-r, r)):
+                        cell = get((kind, cx + dx, cy + dy, cz + dz))
+                        if cell:
+                            visit(cell)
+            if len(best) == k and -best[0][0] <= r * size:
+                break
+            if r * size > max_distance:
+                break
+        return sorted((-d, p) for d, p in best)
+
+    def load(self) -> bool:
+        if not self.index_path:
+            return False
+        try:
+            with open(self.index_path, "rb") as f:
+                blob = f.read()
+        except OSError:
+            return False
+        if len(blob) < _HEADER.size:
+            return False
+        magic, version, _, n_records, count, n_names, *last_record = _HEADER.unpack_from(blob, 0)
+        if magic != SPATIAL_MAGIC or version != SPATIAL_VERSION:
+            return False
+        self.reset()
+        view = memoryview(blob)
+        o = _HEADER.size
+        try:
+            for name, code in _COLUMNS:
+                col = array(code)
+                n = count * col.itemsize
+                col.frombytes(view[o:o+n])
+                o += n
+                if len(col) != count:
+                    self.reset()
+                    return False
+                setattr(self, name, to_little_endian(col))
+            for _ in range(n_names):
+                ln = struct.unpack_from("<H", blob, o)[0]; o += 2
+                self.names.append(str(blob[o:o+ln], "utf-8", "replace")); o += ln
+        except struct.error:
+            self.reset()
+            return False
+        self._name_ids = {name: i for i, name in enumerate(self.names)}
+        self._rebuild_grid()
+        self.n_records = n_records
+        self.last_record = tuple(last_record) if n_records else None
+        return True
+
+    def save(self) -> bool:
+        if not self.index_path:
+            return False
+        tmp = self.index_path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(_HEADER.pack(SPATIAL_MAGIC, SPATIAL_VERSION, 0, self.n_records, len(self.rids),
+                                     len(self.names), *(self.last_record or (0, 0, 0, 0))))
+                for name, _ in _COLUMNS:
+                    to_little_endian(getattr(self, name)).tofile(f)
+                for name in self.names:
+                    b = name.encode("utf-8")[:0xFFFF]
+                    f.write(struct.pack("<H", len(b)) + b)
+            os.replace(tmp, self.index_path)
+            return True
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return False
+
+    def open(self, persist: bool = True, workers: Optional[int] = None,
+             progress: Optional[Callable[[int, int], None]] = None) -> "SpatialIndex":
+        loaded = self.load()
+        before = (self.n_records, self.last_record)
+        self.update(workers=workers, progress=progress)
+        if persist and (not loaded or (self.n_records, self.last_record) != before):
+            self.save()
+        return self
+
+def open_spatial_index(log_path: str, persist: bool = True, workers: Optional[int] = None) -> SpatialIndex:
+    return SpatialIndex(log_path).open(persist, workers)
+
+def normalize_box(values) -> Tuple[Point, Point]:
+    # Six numbers, two opposite corners in any order -> (lo, hi).
+    a, b = tuple(values[:3]), tuple(values[3:6])
+    return tuple(map(min, a, b)), tuple(map(max, a, b))
+
+def parse_kind(kind: str) -> int:
+    try:
+        return KIND_NAMES[kind.strip().lower().rstrip("s")]
+    except KeyError:
+        raise ValueError(f"unknown kind {kind!r}; use block or item")
+
+def main():
+    ap = argparse.ArgumentParser(description="Region and nearest-neighbour queries over placed blocks and items.")
+    ap.add_argument("log")
+    ap.add_argument("-k", "--kind", choices=tuple(KIND_NAMES), default="block")
+    g = ap.add_mutually_exclusive_group(required=True)
+    g.add_argument("--box", nargs=6, type=float, metavar=("X0", "Y0", "Z0", "X1", "Y1", "Z1"))
+    g.add_argument("--near", nargs=3, type=float, metavar=("X", "Y", "Z"))
+    ap.add_argument("-n", "--limit", type=int, default=10, help="neighbours for --near")
+    ap.add_argument("-j", "--workers", type=int, default=None)
+    args = ap.parse_args()
+    ix = open_spatial_index(args.log, workers=args.workers)
+    kind = KIND_NAMES[args.kind]
+    if args.box:
+        hits: List[Tuple[Optional[float], int]] = [(None, p) for p in ix.query_box(*normalize_box(args.box), kind)]
+    else:
+        hits = ix.nearest(tuple(args.near), args.limit, kind)
+    for d, p in hits:
+        doc = ix.entry(p)
+        if d is not None:
+            doc["distance"] = round(d, 3)
+        sys.stdout.write(json.dumps(doc, ensure_ascii=False, separators=(",", ":")))
+        sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
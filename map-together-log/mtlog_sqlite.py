@@ -0,0 +1,223 @@
+from __future__ import annotations
+import argparse
+import re
+import sqlite3
+import sys
+import time
+from typing import Optional, Dict, Any, Iterator, List, Tuple, Callable
+
+from mtlog_decode import MT_TYPES, read_mt_table
+from mtlog_parallel import iter_decoded_parallel
+from mtlog_table import RecordTable
+
+# Relational copy of a log for ad-hoc SQL: one row per record plus the decoded blocks, items
+# and chat messages. Record ids are the log's record indexes, so they line up with the viewer,
+# the .mtidx sidecar and `mtlog filter`.
+SQLITE_SUFFIX = ".sqlite"
+SQLITE_VERSION = 1
+DECODED_TYPES = (1, 2, 4, 20)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE IF NOT EXISTS types (type_id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS players (player_idx INTEGER PRIMARY KEY, player TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY, type_id INTEGER NOT NULL, record_off INTEGER NOT NULL, payload_len INTEGER NOT NULL,
+    meta_len INTEGER NOT NULL, player_idx INTEGER NOT NULL, timestamp_ms INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS blocks (
+    record INTEGER NOT NULL, entry INTEGER NOT NULL, type_id INTEGER NOT NULL, name TEXT, collection INTEGER,
+    author TEXT, x INTEGER, y INTEGER, z INTEGER, dir INTEGER,
+    pos_x REAL, pos_y REAL, pos_z REAL, pitch REAL, yaw REAL, roll REAL);
+CREATE TABLE IF NOT EXISTS items (
+    record INTEGER NOT NULL, entry INTEGER NOT NULL, type_id INTEGER NOT NULL, name TEXT, author TEXT, dir INTEGER,
+    pos_x REAL, pos_y REAL, pos_z REAL, pitch REAL, yaw REAL, roll REAL);
+CREATE TABLE IF NOT EXISTS chat (record INTEGER PRIMARY KEY, msg_type INTEGER, message TEXT);
+CREATE VIEW IF NOT EXISTS records_view AS
+    SELECT r.id, r.type_id, t.name AS type, r.record_off, r.payload_len, r.meta_len, p.player, r.timestamp_ms,
+           strftime('%Y-%m-%d %H:%M:%f', r.timestamp_ms / 1000.0, 'unixepoch') AS time
+    FROM records r JOIN types t USING (type_id) JOIN players p USING (player_idx);
+"""
+
+# Created after the bulk load: filling indexed tables row by row is several times slower.
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS records_type ON records (type_id, id);
+CREATE INDEX IF NOT EXISTS records_player ON records (player_idx, id);
+CREATE INDEX IF NOT EXISTS records_time ON records (timestamp_ms);
+CREATE INDEX IF NOT EXISTS blocks_record ON blocks (record);
+CREATE INDEX IF NOT EXISTS blocks_name ON blocks (name);
+CREATE INDEX IF NOT EXISTS blocks_xyz ON blocks (x, z, y);
+CREATE INDEX IF NOT EXISTS items_record ON items (record);
+CREATE INDEX IF NOT EXISTS items_name ON items (name);
+"""
+_INDEX_NAMES = frozenset(re.findall(r"CREATE INDEX IF NOT EXISTS (\w+)", _INDEXES))
+
+_TABLES = ("records", "blocks", "items", "chat", "players", "types", "meta")
+
+def sqlite_path_for(log_path: str) -> str:
+    return log_path + SQLITE_SUFFIX
+
+def _xyz(d: Optional[Dict[str, float]]) -> Tuple:
+    return (d["x"], d["y"], d["z"]) if d else (None, None, None)
+
+def _block_rows(rid: int, type_id: int, entries: List[Dict[str, Any]]) -> Iterator[Tuple]:
+    for k, e in enumerate(entries):
+        if "name" not in e:
+            continue
+        c = e["coord_nat3"]
+        yield ((rid, k, type_id, e["name"], e["collection_idx"], e["author"], c["x"], c["y"], c["z"], e["dir"])
+               + _xyz(e["pos"]) + _xyz(e["pyr"]))
+
+def _item_rows(rid: int, type_id: int, entries: List[Dict[str, Any]]) -> Iterator[Tuple]:
+    for k, e in enumerate(entries):
+        if "name" not in e:
+            continue
+        yield (rid, k, type_id, e["name"], e["author"], e.get("dir")) + _xyz(e.get("pos")) + _xyz(e.get("pyr"))
+
+def _fingerprint_text(table: RecordTable, i: int) -> str:
+    return ":".join(map(str, table.fingerprint(i)))
+
+class SQLiteImporter:
+    def __init__(self, log_path: str, db_path: Optional[str] = None):
+        self.log_path = log_path
+        self.db_path = db_path or sqlite_path_for(log_path)
+        self.db = sqlite3.connect(self.db_path)
+        # Bulk-load settings: a crash mid-import can lose the last batch, never the committed ones.
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA cache_size=-65536")
+        self.db.execute("PRAGMA temp_store=MEMORY")
+        self.db.executescript(_SCHEMA)
+        if self._meta("version", SQLITE_VERSION) != SQLITE_VERSION:
+            self.reset()
+
+    def __enter__(self) -> "SQLiteImporter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _meta(self, key: str, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, **values):
+        self.db.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", values.items())
+
+    @property
+    def imported_records(self) -> int:
+        return self._meta("records", 0)
+
+    def _has_indexes(self) -> bool:
+        names = {row[0] for row in self.db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        return _INDEX_NAMES <= names
+
+    def reset(self):
+        for name in _TABLES:
+            self.db.execute(f"DROP TABLE IF EXISTS {name}")
+        self.db.execute("DROP VIEW IF EXISTS records_view")
+        self.db.executescript(_SCHEMA)
+        self.db.commit()
+
+    def _insert_records(self, table: RecordTable, start: int, stop: int):
+        t = table
+        self.db.executemany(
+            "INSERT INTO records (id, type_id, record_off, payload_len, meta_len, player_idx, timestamp_ms) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            zip(range(start, stop), t.type_ids[start:stop], t.offsets[start:stop], t.payload_lens[start:stop],
+                t.meta_lens[start:stop], t.player_idx[start:stop], t.timestamps[start:stop]))
+
+    def import_log(self, table: Optional[RecordTable] = None, workers: Optional[int] = None,
+                   commit_records: int = 200000, progress: Optional[Callable[[int, int], None]] = None) -> int:
+        if table is None:
+            table = read_mt_table(self.log_path)
+        start, stop = self.imported_records, len(table)
+        if start > stop or (start and self._meta("last_record") != _fingerprint_text(table, start - 1)):
+            self.reset()
+            start = 0
+        if start == stop:
+            self._build_indexes()
+            return 0
+        db = self.db
+        db.executemany("INSERT OR REPLACE INTO types (type_id, name) VALUES (?, ?)", MT_TYPES.items())
+        db.executemany("INSERT OR IGNORE INTO players (player_idx, player) VALUES (?, ?)", enumerate(table.players))
+        wanted = set(DECODED_TYPES)
+        type_ids = table.type_ids
+        ids = [i for i in range(start, stop) if type_ids[i] in wanted]
+        blocks: List[Tuple] = []
+        items: List[Tuple] = []
+        chat: List[Tuple] = []
+        done = start
+
+        def flush(upto: int):
+            nonlocal done
+            self._insert_records(table, done, upto)
+            db.executemany("INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", blocks)
+            db.executemany("INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", items)
+            db.executemany("INSERT INTO chat (record, msg_type, message) VALUES (?, ?, ?)", chat)
+            blocks.clear(); items.clear(); chat.clear()
+            # The record count moves with the rows in one transaction, so a rerun resumes cleanly.
+            self._set_meta(version=SQLITE_VERSION, records=upto, last_record=_fingerprint_text(table, upto - 1))
+            db.commit()
+            done = upto
+            if progress:
+                progress(upto - start, stop - start)
+
+        try:
+            for rid, doc in iter_decoded_parallel(self.log_path, table, ids, workers=workers):
+                while rid >= done + commit_records:
+                    flush(done + commit_records)
+                tid = type_ids[rid]
+                if tid == 20:
+                    if "message" in doc:
+                        chat.append((rid, doc["msg_type"], doc["message"]))
+                    continue
+                if "blocks" in doc:
+                    blocks.extend(_block_rows(rid, tid, doc["blocks"]["entries"]))
+                if "items" in doc:
+                    items.extend(_item_rows(rid, tid, doc["items"]["entries"]))
+            flush(stop)
+        except BaseException:
+            db.rollback()
+            raise
+        self._build_indexes()
+        return stop - start
+
+    def _build_indexes(self):
+        # Also after a resumed import: a first run interrupted after a commit never got this far.
+        if self._has_indexes():
+            return
+        self.db.executescript(_INDEXES)
+        self.db.execute("ANALYZE")
+        self.db.commit()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+def import_sqlite(log_path: str, db_path: Optional[str] = None, workers: Optional[int] = None,
+                  progress: Optional[Callable[[int, int], None]] = None) -> int:
+    with SQLiteImporter(log_path, db_path) as imp:
+        return imp.import_log(workers=workers, progress=progress)
+
+def main():
+    ap = argparse.ArgumentParser(description="Import a .map_together_log into an indexed SQLite database.")
+    ap.add_argument("log")
+    ap.add_argument("-o", "--out", help=f"database path (default: <log>{SQLITE_SUFFIX})")
+    ap.add_argument("-j", "--workers", type=int, default=None)
+    ap.add_argument("--rebuild", action="store_true", help="drop existing tables instead of appending")
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    with SQLiteImporter(args.log, args.out) as imp:
+        if args.rebuild:
+            imp.reset()
+        n = imp.import_log(workers=args.workers,
+                           progress=lambda done, total: print(f"\r{done}/{total} records", end="", file=sys.stderr))
+        dt = time.perf_counter() - t0
+        counts = {name: imp.db.execute(f"SELECT count(*) FROM {name}").fetchone()[0]
+                  for name in ("records", "blocks", "items", "chat")}
+    print(file=sys.stderr)
+    print(f"Imported {n} new records into {imp.db_path} in {dt:.2f}s ({n / max(dt, 1e-9):,.0f} rec/s); totals {counts}")
+
+if __name__ == "__main__":
+    main()
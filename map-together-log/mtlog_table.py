@@ -0,0 +1,201 @@
+from __future__ import annotations
+import sys
+from array import array
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+
+from mtlog_decode import MT_TYPES, MTRecord, HeaderBatch, build_mt_records, format_time_utc
+
+# One parallel array per header field; ~32 bytes per record plus the player table.
+TABLE_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("offsets", "Q"),
+    ("timestamps", "Q"),
+    ("type_ids", "I"),
+    ("payload_lens", "I"),
+    ("meta_lens", "I"),
+    ("player_idx", "I"),
+)
+
+# (record_off, type_id, payload_len, timestamp_ms) of one row. Sidecars that extend themselves
+# with appended records keep the one of the last record they cover and start over when the
+# table no longer has it (the log was replaced or rewritten).
+Fingerprint = Tuple[int, int, int, int]
+
+def to_little_endian(arr: array) -> array:
+    # Sidecar columns are stored little-endian; a byteswapped copy on big-endian hosts.
+    if sys.byteorder == "little":
+        return arr
+    arr = array(arr.typecode, arr)
+    arr.byteswap()
+    return arr
+
+class RecordRow:
+    __slots__ = ("table", "index")
+
+    def __init__(self, table: "RecordTable", index: int):
+        self.table = table
+        self.index = index
+
+    @property
+    def type_id(self) -> int:
+        return self.table.type_ids[self.index]
+
+    @property
+    def type_name(self) -> str:
+        tid = self.table.type_ids[self.index]
+        return MT_TYPES.get(tid, f"Unknown({tid})")
+
+    @property
+    def record_off(self) -> int:
+        return self.table.offsets[self.index]
+
+    @property
+    def payload_off(self) -> int:
+        return self.table.offsets[self.index] + 8
+
+    @property
+    def payload_len(self) -> int:
+        return self.table.payload_lens[self.index]
+
+    @property
+    def meta_off(self) -> int:
+        return self.payload_off + self.payload_len + 4
+
+    @property
+    def meta_len(self) -> int:
+        return self.table.meta_lens[self.index]
+
+    @property
+    def record_len(self) -> int:
+        return 8 + self.payload_len + 4 + self.meta_len
+
+    @property
+    def player_id(self) -> str:
+        return self.table.players[self.table.player_idx[self.index]]
+
+    @property
+    def timestamp_ms(self) -> int:
+        return self.table.timestamps[self.index]
+
+    @property
+    def file_path(self) -> Optional[str]:
+        return self.table.file_path
+
+    @property
+    def time_iso(self) -> str:
+        return format_time_utc(self.timestamp_ms)
+
+    def header_dict(self) -> Dict[str, Any]:
+        return self.to_mtrecord().header_dict()
+
+    def to_mtrecord(self) -> MTRecord:
+        return MTRecord(
+            index=self.index,
+            type_id=self.type_id,
+            type_name=self.type_name,
+            record_off=self.record_off,
+            payload_off=self.payload_off,
+            payload_len=self.payload_len,
+            meta_off=self.meta_off,
+            meta_len=self.meta_len,
+            player_id=self.player_id,
+            timestamp_ms=self.timestamp_ms,
+            file_path=self.file_path,
+        )
+
+    def __repr__(self) -> str:
+        return f"RecordRow(index={self.index}, type={self.type_name}, off=0x{self.record_off:x})"
+
+class RecordTable:
+    def __init__(self, file_path: Optional[str] = None):
+        self.file_path = file_path
+        self.clear()
+
+    def clear(self):
+        for name, code in TABLE_COLUMNS:
+            setattr(self, name, array(code))
+        self.players: List[str] = []
+        self._player_raw: List[bytes] = []
+        self._player_ids: Dict[bytes, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, i: int) -> RecordRow:
+        n = len(self.offsets)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(i)
+        return RecordRow(self, i)
+
+    def __iter__(self) -> Iterator[RecordRow]:
+        for i in range(len(self.offsets)):
+            yield RecordRow(self, i)
+
+    def iter_mtrecords(self, start: int = 0, stop: Optional[int] = None, chunk: int = 65536) -> Iterator[MTRecord]:
+        # MTRecords for rows [start, stop), built a chunk of columns at a time rather than per RecordRow.
+        stop = len(self.offsets) if stop is None else min(stop, len(self.offsets))
+        players = self.players
+        for lo in range(start, stop, chunk):
+            hi = min(stop, lo + chunk)
+            yield from build_mt_records(lo, self.offsets[lo:hi], self.type_ids[lo:hi], self.payload_lens[lo:hi],
+                                        self.meta_lens[lo:hi], [players[p] for p in self.player_idx[lo:hi]],
+                                        self.timestamps[lo:hi], self.file_path)
+
+    def columns(self) -> Iterator[Tuple[str, array]]:
+        for name, _ in TABLE_COLUMNS:
+            yield name, getattr(self, name)
+
+    def intern_player(self, raw: bytes) -> int:
+        pid = self._player_ids.get(raw)
+        if pid is None:
+            pid = len(self._player_raw)
+            self._player_ids[raw] = pid
+            self._player_raw.append(raw)
+            self.players.append(raw.decode("utf-8", errors="replace"))
+        return pid
+
+    def player_raw(self) -> List[bytes]:
+        return self._player_raw
+
+    def append(self, offset: int, type_id: int, payload_len: int, meta_len: int, player_raw: bytes, timestamp_ms: int) -> int:
+        i = len(self.offsets)
+        self.offsets.append(offset)
+        self.timestamps.append(timestamp_ms)
+        self.type_ids.append(type_id)
+        self.payload_lens.append(payload_len)
+        self.meta_lens.append(meta_len)
+        self.player_idx.append(self.intern_player(player_raw))
+        return i
+
+    def extend_headers(self, batch: HeaderBatch, buf, base: int = 0) -> None:
+        # `buf` holds the player id bytes; `base` is its file offset when it is not the whole log.
+        if not batch:
+            return
+        offs, type_ids, payload_lens, meta_lens, pid_offs, pid_lens, timestamps = zip(*batch)
+        self.offsets.extend(offs if not base else [o + base for o in offs])
+        self.timestamps.extend(timestamps)
+        self.type_ids.extend(type_ids)
+        self.payload_lens.extend(payload_lens)
+        self.meta_lens.extend(meta_lens)
+        ids = self._player_ids
+        raws = [bytes(buf[o:o+n]) for o, n in zip(pid_offs, pid_lens)]
+        pids = [ids.get(raw) for raw in raws]
+        if None in pids:
+            pids = [self.intern_player(raw) for raw in raws]
+        self.player_idx.extend(pids)
+
+    def truncate(self, n: int) -> None:
+        for _, col in self.columns():
+            del col[n:]
+
+    def fingerprint(self, i: int) -> Fingerprint:
+        return (self.offsets[i], self.type_ids[i], self.payload_lens[i], self.timestamps[i])
+
+    def end_offset(self) -> int:
+        if not len(self.offsets):
+            return 0
+        return self.offsets[-1] + 8 + self.payload_lens[-1] + 4 + self.meta_lens[-1]
+
+    def nbytes(self) -> int:
+        return sum(len(col) * col.itemsize for _, col in self.columns())
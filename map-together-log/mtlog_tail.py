@@ -0,0 +1,160 @@
+from __future__ import annotations
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Optional, Tuple, List
+
+from mtlog_decode import MT_TYPES, HeaderBatch, scan_mt_header_batches
+from mtlog_recover import MAX_PAYLOAD, MAX_PLAYER_ID, DamagedRange, find_next_record
+
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+# Longest record the recovery scan accepts; more unparsed bytes than this cannot be one record
+# still being written.
+MAX_RECORD_BYTES = 8 + MAX_PAYLOAD + 4 + 6 + MAX_PLAYER_ID + 8
+_HDR = struct.Struct("<II")
+_META_HEAD = struct.Struct("<IH")
+
+def _inotify_watch(path: str) -> Optional[int]:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(path), _IN_MODIFY | _IN_CLOSE_WRITE) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except Exception:
+        return None
+
+class LogTailer:
+    # Follows a growing log: wakes on inotify (or a short stat poll elsewhere), reads all new
+    # bytes in one read and returns the complete records; a partially written trailing
+    # record is kept in `pending` until the rest of it arrives. Bytes that cannot be a record
+    # (a torn or garbage write) stop the tailer at `stalled_at`, or with recover=True are
+    # skipped up to the next plausible record and listed in `damaged`.
+    def __init__(self, path: str, offset: int = 0, poll_interval: float = 0.05, recover: bool = False):
+        self.path = path
+        self.offset = offset
+        self.poll_interval = poll_interval
+        self.recover = recover
+        self.pending = b""
+        self.stalled_at: Optional[int] = None
+        self.damaged: List[DamagedRange] = []
+        self.fh = open(path, "rb", buffering=0)
+        self._inotify_fd = _inotify_watch(path)
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._inotify_fd is not None
+
+    def _read_pos(self) -> int:
+        return self.offset + len(self.pending)
+
+    def has_new_data(self) -> bool:
+        if self.stalled_at is not None:
+            return False
+        try:
+            return os.fstat(self.fh.fileno()).st_size > self._read_pos()
+        except OSError:
+            return False
+
+    def wait(self, timeout: float) -> bool:
+        if self.has_new_data():
+            return True
+        deadline = time.monotonic() + timeout
+        if self._inotify_fd is not None:
+            while True:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                ready, _, _ = select.select([self._inotify_fd], [], [], left)
+                if ready:
+                    try:
+                        os.read(self._inotify_fd, 4096)
+                    except BlockingIOError:
+                        pass
+                    if self.has_new_data():
+                        return True
+        while time.monotonic() < deadline:
+            time.sleep(min(self.poll_interval, max(0.0, deadline - time.monotonic())))
+            if self.has_new_data():
+                return True
+        return False
+
+    def _skip(self, start: int, end: int):
+        last = self.damaged[-1] if self.damaged else None
+        if last is not None and last.end == start:
+            last.end = end
+        else:
+            self.damaged.append(DamagedRange(start, end))
+
+    @staticmethod
+    def _cannot_be_record(buf: bytes, off: int) -> bool:
+        # The scanner stopped at `off`: True if the bytes there are not just an incomplete record.
+        rest = len(buf) - off
+        if rest > MAX_RECORD_BYTES:
+            return True
+        if rest < 8:
+            return False
+        type_id, payload_len = _HDR.unpack_from(buf, off)
+        if type_id not in MT_TYPES or payload_len >= MAX_PAYLOAD:
+            return True
+        moff = off + 8 + payload_len
+        if moff + 6 > len(buf):
+            return False
+        meta_flag, name_len = _META_HEAD.unpack_from(buf, moff)
+        meta_len = meta_flag & 0x7FFF_FFFF
+        return meta_len < 10 or name_len + 8 > meta_len or name_len > MAX_PLAYER_ID
+
+    def read_records(self) -> Tuple[HeaderBatch, bytes, int]:
+        # Returns (headers, buf, base): header offsets index into `buf`, which starts at file offset `base`.
+        self.fh.seek(self._read_pos())
+        data = self.fh.read()
+        buf = self.pending + data if self.pending else data
+        base = self.offset
+        headers: HeaderBatch = []
+        consumed = 0
+        while True:
+            for batch in scan_mt_header_batches(buf, consumed, len(buf), batch_records=1 << 30):
+                headers += batch
+                off, _, payload_len, meta_len, _, _, _ = batch[-1]
+                consumed = off + 8 + payload_len + 4 + meta_len
+            if not self._cannot_be_record(buf, consumed):
+                break
+            if not self.recover:
+                self.stalled_at = base + consumed
+                break
+            nxt = find_next_record(buf, consumed + 1)
+            if nxt < 0:
+                # No complete record after the junk yet: keep the last MAX_RECORD_BYTES, where one
+                # may still be arriving, and search again when more data comes.
+                nxt = len(buf) - MAX_RECORD_BYTES
+                if nxt <= consumed:
+                    break
+            self._skip(base + consumed, base + nxt)
+            consumed = nxt
+        self.pending = buf[consumed:]
+        self.offset = base + consumed
+        return headers, buf, base
+
+    def close(self):
+        if self._inotify_fd is not None:
+            try:
+                os.close(self._inotify_fd)
+            except OSError:
+                pass
+            self._inotify_fd = None
+        if self.fh:
+            self.fh.close()
+            self.fh = None
@@ -0,0 +1,223 @@
+from __future__ import annotations
+import struct
+from array import array
+from bisect import bisect_left
+from typing import Optional, Iterator, Callable, Tuple
+
+from mtlog_archive import open_log_view
+from mtlog_decode import MT_TYPES, MTRecord, HeaderBatch, decode_player_id, scan_mt_header_batches
+from mtlog_index import LogSidecar, ProgressFn
+from mtlog_table import Fingerprint, RecordTable, to_little_endian
+
+# Sparse time index: one checkpoint per block of records (every N records or K bytes,
+# whichever comes first) holding the block's file offset, first record index and
+# min/max timestamp. A few KB covers a multi-GB log, so it works where a full
+# RecordTable would not fit in memory.
+TIME_INDEX_SUFFIX = ".mttidx"
+TIME_INDEX_MAGIC = b"MTTI"
+TIME_INDEX_VERSION = 2
+_COLUMNS = (("offsets", "Q"), ("indexes", "Q"), ("ts_min", "Q"), ("ts_max", "Q"))
+
+MAX_TIME = (1 << 64) - 1
+
+def time_index_path_for(log_path: str) -> str:
+    return log_path + TIME_INDEX_SUFFIX
+
+class TimeIndex(LogSidecar):
+    MAGIC = TIME_INDEX_MAGIC
+    VERSION = TIME_INDEX_VERSION
+    # LogSidecar header + n_records, checkpoint count, block limits and the last record's fingerprint.
+    HEADER = struct.Struct("<4sHHQqQQQIIQIIQ")
+
+    def __init__(self, log_path: Optional[str] = None, every_records: int = 4096, every_bytes: int = 1 << 20):
+        super().__init__(log_path, time_index_path_for(log_path) if log_path else None)
+        self.every_records = every_records
+        self.every_bytes = every_bytes
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        for name, code in _COLUMNS:
+            setattr(self, name, array(code))
+        self._n_records = 0
+        self._last_record: Optional[Fingerprint] = None
+        self._high: Optional[array] = None
+
+    @property
+    def n_records(self) -> int:
+        return self._n_records
+
+    @property
+    def last_record(self) -> Optional[Fingerprint]:
+        return self._last_record
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def _add(self, off: int, index: int, ts: int):
+        if self.offsets and index - self.indexes[-1] < self.every_records and off - self.offsets[-1] < self.every_bytes:
+            if ts < self.ts_min[-1]:
+                self.ts_min[-1] = ts
+            elif ts > self.ts_max[-1]:
+                self.ts_max[-1] = ts
+            return
+        self.offsets.append(off)
+        self.indexes.append(index)
+        self.ts_min.append(ts)
+        self.ts_max.append(ts)
+
+    def add_batch(self, batch: HeaderBatch, base: int = 0):
+        if not batch:
+            return
+        add = self._add
+        i = self._n_records
+        for off, _, _, _, _, _, ts in batch:
+            add(off + base, i, ts)
+            i += 1
+        self._n_records = i
+        off, type_id, payload_len, meta_len, _, _, ts = batch[-1]
+        self.scanned_end = base + off + 8 + payload_len + 4 + meta_len
+        self._last_record = (base + off, type_id, payload_len, ts)
+        self._high = None
+
+    def _add_batch(self, batch: HeaderBatch, buf, base: int = 0):
+        self.add_batch(batch, base)
+
+    def add_table_rows(self, table: RecordTable, stop: Optional[int] = None):
+        # Extends the index with the rows appended to `table` since the last call, up to `stop`
+        # when another thread may still be appending past it.
+        start, stop = self._n_records, len(table) if stop is None else min(stop, len(table))
+        if stop <= start:
+            return
+        add = self._add
+        for i, off, ts in zip(range(start, stop), table.offsets[start:stop], table.timestamps[start:stop]):
+            add(off, i, ts)
+        last = table[stop - 1]
+        self._n_records = stop
+        self.scanned_end = last.record_off + last.record_len
+        self._last_record = table.fingerprint(stop - 1)
+        self._high = None
+
+    @classmethod
+    def from_table(cls, table: RecordTable, every_records: int = 4096, every_bytes: int = 1 << 20) -> "TimeIndex":
+        ti = cls(table.file_path, every_records, every_bytes)
+        ti.add_table_rows(table)
+        return ti
+
+    def _high_water(self) -> array:
+        # Running max of ts_max, so bisect stays valid when a few records arrive out of order.
+        if self._high is None:
+            high = array("Q")
+            m = 0
+            for t in self.ts_max:
+                m = t if t > m else m
+                high.append(m)
+            self._high = high
+        return self._high
+
+    def block_for(self, t: int) -> int:
+        # First block that can hold a record at or after `t`; every earlier block ends before it.
+        return bisect_left(self._high_water(), t)
+
+    def block_span(self, j: int) -> Tuple[int, int, int, int]:
+        # (start_offset, end_offset, first_index, end_index) of block j.
+        if j + 1 < len(self.offsets):
+            return self.offsets[j], self.offsets[j + 1], self.indexes[j], self.indexes[j + 1]
+        return self.offsets[j], self.scanned_end, self.indexes[j], self.n_records
+
+    def blocks_between(self, t0: int, t1: int) -> Iterator[int]:
+        for j in range(self.block_for(t0), len(self.offsets)):
+            if self.ts_min[j] > t1:
+                # Logs are appended in time order: a block entirely after t1 ends the range.
+                return
+            if self.ts_max[j] >= t0:
+                yield j
+
+    def _iter_block(self, view, j: int, players: dict) -> Iterator[MTRecord]:
+        start, end, index, _ = self.block_span(j)
+        buf = view[start:end]
+        for batch in scan_mt_header_batches(buf):
+            for off, type_id, payload_len, meta_len, pid_off, pid_len, ts in batch:
+                off += start
+                raw = bytes(buf[pid_off:pid_off+pid_len])
+                player = players.get(raw)
+                if player is None:
+                    player = players[raw] = decode_player_id(raw, 0, len(raw))
+                yield MTRecord(
+                    index=index,
+                    type_id=type_id,
+                    type_name=MT_TYPES.get(type_id, f"Unknown({type_id})"),
+                    record_off=off,
+                    payload_off=off + 8,
+                    payload_len=payload_len,
+                    meta_off=off + 8 + payload_len + 4,
+                    meta_len=meta_len,
+                    player_id=player,
+                    timestamp_ms=ts,
+                    file_path=self.log_path,
+                )
+                index += 1
+
+    def records_between(self, t0: int = 0, t1: int = MAX_TIME) -> Iterator[MTRecord]:
+        # Only the blocks overlapping [t0, t1] are parsed, starting at their checkpoint offsets.
+        blocks = list(self.blocks_between(t0, t1))
+        if not blocks or not self.log_path:
+            return
+        players: dict = {}
+        with open_log_view(self.log_path) as view:
+            for j in blocks:
+                for rec in self._iter_block(view, j, players):
+                    if t0 <= rec.timestamp_ms <= t1:
+                        yield rec
+
+    def seek(self, t: int) -> Optional[MTRecord]:
+        # First record (in file order) with a timestamp at or after `t`.
+        for rec in self.records_between(t, MAX_TIME):
+            return rec
+        return None
+
+    def position_in(self, timestamps: array, t: int) -> int:
+        # Same lookup against an in-memory timestamp column: bisect the checkpoints, then
+        # bisect inside the block (time-ordered within a block), scanning on if it ends before t.
+        j = self.block_for(t)
+        while j < len(self.offsets):
+            _, _, lo, hi = self.block_span(j)
+            hi = min(hi, len(timestamps))
+            if self.ts_max[j] >= t:
+                k = bisect_left(timestamps, t, lo, hi)
+                if k < hi:
+                    return k
+            j += 1
+        return len(timestamps)
+
+    def _header_fields(self) -> Tuple:
+        return ((self._n_records, len(self.offsets), self.every_records, self.every_bytes)
+                + (self._last_record or (0, 0, 0, 0)))
+
+    def _load_body(self, view: memoryview, o: int, fields: Tuple) -> bool:
+        n_records, count, every_records, every_bytes = fields[:4]
+        if (every_records, every_bytes) != (self.every_records, self.every_bytes):
+            return False
+        for name, code in _COLUMNS:
+            col = array(code)
+            n = count * col.itemsize
+            col.frombytes(view[o:o+n])
+            o += n
+            if len(col) != count:
+                return False
+            setattr(self, name, to_little_endian(col))
+        self._n_records = n_records
+        self._last_record = tuple(fields[4:]) if n_records else None
+        return True
+
+    def _write_body(self, f):
+        for name, _ in _COLUMNS:
+            to_little_endian(getattr(self, name)).tofile(f)
+
+def open_time_index(log_path: str, persist: bool = True, progress: Optional[ProgressFn] = None,
+                    cancel: Optional[Callable[[], bool]] = None, every_records: int = 4096,
+                    every_bytes: int = 1 << 20) -> TimeIndex:
+    return TimeIndex(log_path, every_records, every_bytes).open(persist, progress, cancel)
+
+def records_between(log_path: str, t0: int = 0, t1: int = MAX_TIME) -> Iterator[MTRecord]:
+    return open_time_index(log_path).records_between(t0, t1)
@@ -0,0 +1,131 @@
+from __future__ import annotations
+import argparse
+import csv
+import json
+import sys
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, Iterable, Iterator, Tuple
+
+from mtlog_archive import open_log_view
+from mtlog_decode import MT_TYPES, format_time_utc, read_mt_table
+from mtlog_payload import POSITION_LAYOUTS
+from mtlog_table import RecordTable, to_little_endian
+
+# Bulk trajectories for PlayerCamCursor (14) and VehiclePos (15): instead of one dict per record,
+# the position bytes of every matching record are sliced out of the mmap, joined per player and
+# turned into typed arrays with a single frombytes() call.
+TRAJECTORY_TYPES = (14, 15)
+
+@dataclass
+class Trajectory:
+    player: str
+    type_id: int
+    record_ids: array = field(default_factory=lambda: array("I"))
+    timestamps: array = field(default_factory=lambda: array("Q"))
+    xyz: array = field(default_factory=lambda: array("f"))  # interleaved x, y, z
+
+    def __len__(self) -> int:
+        return len(self.record_ids)
+
+    @property
+    def xs(self) -> array:
+        return self.xyz[0::3]
+
+    @property
+    def ys(self) -> array:
+        return self.xyz[1::3]
+
+    @property
+    def zs(self) -> array:
+        return self.xyz[2::3]
+
+    def samples(self) -> Iterator[Tuple[int, int, float, float, float]]:
+        xyz = self.xyz
+        for k, (rid, ts) in enumerate(zip(self.record_ids, self.timestamps)):
+            yield rid, ts, xyz[3*k], xyz[3*k+1], xyz[3*k+2]
+
+    def summary(self) -> Dict[str, Any]:
+        doc: Dict[str, Any] = {"player": self.player, "type": MT_TYPES.get(self.type_id, str(self.type_id)),
+                               "samples": len(self)}
+        if len(self):
+            doc["first_time"] = format_time_utc(self.timestamps[0])
+            doc["last_time"] = format_time_utc(self.timestamps[-1])
+            doc["bounds"] = {axis: [min(col), max(col)] for axis, col in zip("xyz", (self.xs, self.ys, self.zs))}
+        return doc
+
+def read_trajectories(path: str, type_id: int = 15, table: Optional[RecordTable] = None,
+                      ids: Optional[Iterable[int]] = None, players: Optional[Iterable[str]] = None,
+                      layout: Optional[Tuple[int, str]] = None) -> Dict[str, Trajectory]:
+    # Per-player trajectories of one record type; records too short for the layout are skipped.
+    if table is None:
+        table = read_mt_table(path)
+    off, code = layout or POSITION_LAYOUTS[type_id]
+    need = off + 3 * array(code).itemsize
+    type_ids, offsets, lens, pidx, ts = table.type_ids, table.offsets, table.payload_lens, table.player_idx, table.timestamps
+    if ids is None:
+        ids = [i for i, t in enumerate(type_ids) if t == type_id]
+    if players is not None:
+        players = set(players)
+    wanted = None if players is None else {i for i, name in enumerate(table.players) if name in players}
+    # Group record ids by player first, then gather each player's bytes in one comprehension.
+    by_player: Dict[int, array] = {}
+    for i in ids:
+        if lens[i] >= need and (wanted is None or pidx[i] in wanted):
+            r = by_player.get(pidx[i])
+            if r is None:
+                r = by_player[pidx[i]] = array("I")
+            r.append(i)
+    out: Dict[str, Trajectory] = {}
+    n = need - off
+    with open_log_view(path) as view:
+        for p, r in by_player.items():
+            xyz = array(code)
+            xyz.frombytes(b"".join([view[s:s+n] for s in [offsets[i] + 8 + off for i in r]]))
+            name = table.players[p]
+            out[name] = Trajectory(name, type_id, r, array("Q", [ts[i] for i in r]), to_little_endian(xyz))
+    return out
+
+def write_csv(trajectories: Iterable[Trajectory], out) -> int:
+    w = csv.writer(out)
+    w.writerow(("player", "type_id", "record", "timestamp_ms", "x", "y", "z"))
+    n = 0
+    for tr in trajectories:
+        for rid, ts, x, y, z in tr.samples():
+            w.writerow((tr.player, tr.type_id, rid, ts, x, y, z))
+            n += 1
+    return n
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-player position trajectories from VehiclePos/PlayerCamCursor records.")
+    ap.add_argument("log")
+    ap.add_argument("-t", "--type", type=int, choices=TRAJECTORY_TYPES, default=15)
+    ap.add_argument("-p", "--player", action="append", help="only these players, repeatable")
+    ap.add_argument("-o", "--out", help="write samples as CSV (- for stdout); default prints a summary")
+    ap.add_argument("--offset", type=int, help="byte offset of x in the payload (default from POSITION_LAYOUTS)")
+    ap.add_argument("--double", action="store_true", help="positions are float64 instead of float32")
+    args = ap.parse_args()
+    layout = None
+    if args.offset is not None or args.double:
+        default_off, default_code = POSITION_LAYOUTS[args.type]
+        layout = (default_off if args.offset is None else args.offset, "d" if args.double else default_code)
+    table = read_mt_table(args.log)
+    t0 = time.perf_counter()
+    trajectories = read_trajectories(args.log, args.type, table, players=args.player, layout=layout)
+    dt = time.perf_counter() - t0
+    n = sum(len(tr) for tr in trajectories.values())
+    if args.out:
+        out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8", newline="")
+        try:
+            write_csv(trajectories.values(), out)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    else:
+        json.dump([tr.summary() for tr in trajectories.values()], sys.stdout, indent=2, ensure_ascii=False)
+        sys.stdout.write("\n")
+    print(f"{n} samples from {len(trajectories)} players in {dt:.3f}s ({n / max(dt, 1e-9):,.0f} samples/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
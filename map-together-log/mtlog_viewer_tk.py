@@ -2,11 +2,13 @@ import os
 import sys
 import time
 import json
-import math
 import struct
-from dataclasses import dataclass, field
+import queue
+import threading
+from array import array
+from bisect import bisect_left
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any, Callable, Sequence
 
 try:
     import tkinter as tk
@@ -15,392 +17,81 @@ except Exception as e:
     print("Tkinter is required (bundled with Python). Error:", e)
     sys.exit(1)
 
-MT_NAMES: Dict[int, str] = {
-    0: "Unknown",
-    1: "Place",
-    2: "Delete",
-    3: "Resync",
-    4: "SetSkin",
-    5: "SetWaypoint",
-    6: "SetMapName",
-    7: "PlayerJoin",
-    8: "PlayerLeave",
-    9: "Admin_PromoteMod",
-    10: "Admin_DemoteMod",
-    11: "Admin_KickPlayer",
-    12: "Admin_BanPlayer",
-    13: "Admin_ChangeAdmin",
-    14: "PlayerCamCursor",
-    15: "VehiclePos",
-    16: "Admin_SetActionLimit",
-    17: "Admin_SetVariable",
-    18: "Admin_SetRoomPlayerLimit",
-    19: "Admin_AlertStatusToAll",
-    20: "ChatMsg",
-    21: "Ping",
-    22: "ServerStats",
-}
+from mtlog_archive import is_archive
+from mtlog_cache import DECODE_CACHE
+from mtlog_decode import MT_TYPES, ASCII_GUTTER, MTRecord, MTLogFile, scan_mt_header_batches
+from mtlog_index import MTLogIndex
+from mtlog_tail import LogTailer
+from mtlog_timeindex import TimeIndex
+from mtlog_export import export_records
+from mtlog_filter import RecordIndexes, parse_type_list
+from mtlog_search import SearchIndex
+from mtlog_spatial import KIND_NAMES, SpatialIndex, normalize_box, parse_kind
+from mtlog_table import RecordTable, RecordRow
+from mtlog_payload import safe_decode
+from mtlog_recover import DamagedRange, find_next_record
 
 def type_name(tid: int) -> str:
-    return MT_NAMES.get(tid, f"Unknown({tid})")
-
-def collection_name(idx: int) -> str:
-    return "Nadeo" if idx == 26 else f"#{idx}"
-
-@dataclass
-class Record:
-    index: int
-    file_offset: int
-    type_id: int
-    payload_len: int
-    meta_len: int
-    player_id: str
-    timestamp_ms: int
-    _decoded: Optional[Dict[str, Any]] = field(default=None, repr=False)
-
-    @property
-    def type_name(self) -> str:
-        return type_name(self.type_id)
-
-    def iso_time(self) -> str:
-        try:
-            return datetime.fromtimestamp(self.timestamp_ms / 1000.0).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-        except Exception:
-            return str(self.timestamp_ms)
-
-    def record_len_total(self) -> int:
-        return 8 + self.payload_len + 4 + self.meta_len
+    return MT_TYPES.get(tid, f"Unknown({tid})")
 
-def safe_decode(bs: bytes) -> str:
-    return bs.decode("utf-8", errors="replace")
-
-def hex_dump(chunk: bytes, base_off: int = 0, width: int = 16) -> str:
-    lines = []
-    for i in range(0, len(chunk), width):
-        row = chunk[i:i+width]
-        hexes = " ".join(f"{b:02x}" for b in row)
-        ascii_ = "".join(chr(b) if 32 <= b < 127 else "." for b in row)
-        lines.append(f"{base_off + i:08x}  {hexes:<{width*3}}  {ascii_}")
-    return "\n".join(lines)
-
-def rd_u16_le(b: bytes, o: int) -> int:
-    return int.from_bytes(b[o:o+2], "little")
-
-def rd_u32_le(b: bytes, o: int) -> int:
-    return int.from_bytes(b[o:o+4], "little")
-
-def rd_f32_le(b: bytes, o: int) -> float:
-    return struct.unpack_from("<f", b, o)[0]
-
-def is_ascii_printable(bs: bytes) -> bool:
-    for ch in bs:
-        if ch in (9, 10, 13):
-            continue
-        if ch < 32 or ch >= 127:
-            return False
-    return True
-
-def roundf(x: float, n: int = 6) -> float:
+def local_time_str(timestamp_ms: int) -> str:
     try:
-        if math.isfinite(x):
-            return float(f"{x:.{n}f}")
+        return datetime.fromtimestamp(timestamp_ms / 1000.0).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
     except Exception:
-        pass
-    return x
-
-MAGIC_BLKS = b"BLKs"  # 0x734b4c42
-MAGIC_SKNs = b"SKNs"  # 0x734e4b53
-MAGIC_ITMs = b"ITMs"  # 0x734d5449
-
-def find_sections(payload: bytes) -> Dict[str, Dict[str, int]]:
-    out = {}
-    for tag, key in ((MAGIC_BLKS, "BLKs"), (MAGIC_SKNs, "SKNs"), (MAGIC_ITMs, "ITMs")):
-        i = payload.find(tag)
-        if i < 0:
-            out[key] = {"offset": -1, "count": 0}
-            continue
-        cnt_off = i + 4
-        cnt = rd_u16_le(payload, cnt_off) if cnt_off + 2 <= len(payload) else 0
-        out[key] = {"offset": i, "count": cnt, "count_offset": cnt_off}
-    return out
-
-def next_block_like_start(payload: bytes, search_from: int, hard_limit: int) -> Optional[int]:
-    i = max(0, search_from)
-    while i + 2 < hard_limit:
-        if i + 2 > len(payload):
-            return None
-        nlen = rd_u16_le(payload, i)
-        if 1 <= nlen <= 96 and i + 2 + nlen + 6 <= hard_limit:
-            name_b = payload[i+2:i+2+nlen]
-            if is_ascii_printable(name_b):
-                j = i + 2 + nlen
-                coll = rd_u32_le(payload, j)
-                if 0 <= coll <= 500:
-                    a_len_off = j + 4
-                    a_len = rd_u16_le(payload, a_len_off)
-                    if 0 <= a_len <= 128 and a_len_off + 2 + a_len <= hard_limit:
-                        author_b = payload[a_len_off+2:a_len_off+2+a_len]
-                        if is_ascii_printable(author_b):
-                            return i
-        i += 1
-    return None
-
-def parse_blocks(payload: bytes, blks_off: int, blks_count: int, section_end: int) -> Dict[str, Any]:
-    result = {"count": blks_count, "entries": []}
-    if blks_off < 0 or blks_count == 0:
-        return result
-    p = blks_off + 4 + 2
-    for bi in range(blks_count):
-        entry = {}
-        start_here = p
-        try:
-            name_len = rd_u16_le(payload, p); p += 2
-            name_off = p
-            name = safe_decode(payload[p:p+name_len]); p += name_len
-
-            coll_off = p
-            coll_idx = rd_u32_le(payload, p); p += 4
-
-            a_len = rd_u16_le(payload, p); p += 2
-            author_off = p
-            author = safe_decode(payload[p:p+a_len]); p += a_len
-
-            coord_off = p
-            x = rd_u32_le(payload, p); y = rd_u32_le(payload, p+4); z = rd_u32_le(payload, p+8); p += 12
+        return str(timestamp_ms)
 
-            dir_off = p
-            dir_val = rd_u16_le(payload, p); p += 2
-
-            pos_off = p
-            px = rd_f32_le(payload, p); py = rd_f32_le(payload, p+4); pz = rd_f32_le(payload, p+8); p += 12
-
-            pyr_off = p
-            prx = rd_f32_le(payload, p); pry = rd_f32_le(payload, p+4); prz = rd_f32_le(payload, p+8); p += 12
-
-            if bi < blks_count - 1:
-                nxt = next_block_like_start(payload, p, section_end)
-                end_this = nxt if nxt is not None else section_end
-            else:
-                end_this = section_end
-
-            tail = payload[p:end_this] if end_this > p else b""
-            p = end_this
-
-            entry = {
-                "name": name,
-                "name_offset": name_off,
-                "collection_idx": coll_idx,
-                "collection_name": collection_name(coll_idx),
-                "collection_offset": coll_off,
-                "author": author,
-                "author_offset": author_off,
-                "coord_nat3": {"x": x, "y": y, "z": z},
-                "coord_nat3_offset": coord_off,
-                "dir": dir_val,
-                "dir_offset": dir_off,
-                "dir_degrees": int(dir_val % 8) * 45 if dir_val >= 4 else int(dir_val) * 90,
-                "pos": {"x": roundf(px), "y": roundf(py), "z": roundf(pz)},
-                "pos_offset": pos_off,
-                "pyr": {"x": roundf(prx), "y": roundf(pry), "z": roundf(prz)},
-                "pyr_degrees": {"x": roundf(math.degrees(prx)), "y": roundf(math.degrees(pry)), "z": roundf(math.degrees(prz))},
-                "pyr_offset": pyr_off,
-            }
-            if tail:
-                entry["tail_raw"] = {
-                    "offset": end_this - len(tail),
-                    "length": len(tail),
-                    "hex": payload[end_this-len(tail):end_this].hex()
-                }
-        except Exception as ex:
-            entry["error"] = f"block parse error at {start_here}: {ex}"
-            nxt = next_block_like_start(payload, p, section_end)
-            p = nxt if nxt is not None else section_end
-        result["entries"].append(entry)
-    return result
-
-def next_item_like_start(payload: bytes, search_from: int, hard_limit: int) -> Optional[int]:
-    return next_block_like_start(payload, search_from, hard_limit)
-
-def find_dir_pos_pyr_after(payload: bytes, from_off: int, end_off: int) -> Optional[Dict[str, Any]]:
-    i = from_off
-    while i + 2 + 12 + 12 <= end_off:
-        d = rd_u16_le(payload, i)
+def parse_local_time(spec: str, ref_ms: int) -> Optional[int]:
+    # Epoch ms, a local "YYYY-MM-DD HH:MM[:SS]", or a bare "HH:MM[:SS[.fff]]" on the day of `ref_ms`.
+    spec = spec.strip()
+    if spec.isdigit():
+        return int(spec)
+    try:
+        return int(datetime.fromisoformat(spec).timestamp() * 1000)
+    except ValueError:
+        pass
+    for fmt in ("%H:%M:%S.%f", "%H:%M:%S", "%H:%M"):
         try:
-            px = rd_f32_le(payload, i+2); py = rd_f32_le(payload, i+6); pz = rd_f32_le(payload, i+10)
-            rx = rd_f32_le(payload, i+14); ry = rd_f32_le(payload, i+18); rz = rd_f32_le(payload, i+22)
-            if all(math.isfinite(v) for v in (px,py,pz,rx,ry,rz)):
-                if (abs(px) < 1e7 and abs(py) < 1e7 and abs(pz) < 1e7
-                    and abs(rx) < 20 and abs(ry) < 20 and abs(rz) < 20):
-                    return {
-                        "dir": d, "dir_offset": i,
-                        "pos": {"x": roundf(px), "y": roundf(py), "z": roundf(pz)},
-                        "pos_offset": i+2,
-                        "pyr": {"x": roundf(rx), "y": roundf(ry), "z": roundf(rz)},
-                        "pyr_degrees": {"x": roundf(math.degrees(rx)), "y": roundf(math.degrees(ry)), "z": roundf(math.degrees(rz))},
-                        "pyr_offset": i+14,
-                    }
-        except Exception:
-            pass
-        i += 2
+            t = datetime.strptime(spec, fmt).time()
+        except ValueError:
+            continue
+        day = datetime.fromtimestamp(ref_ms / 1000.0).date()
+        return int(datetime.combine(day, t).timestamp() * 1000)
     return None
 
-def parse_items(payload: bytes, itms_off: int, itms_count: int, section_end: int) -> Dict[str, Any]:
-    result = {"count": itms_count, "entries": []}
-    if itms_off < 0 or itms_count == 0:
-        return result
-    p = itms_off + 4 + 2
-    for ii in range(itms_count):
-        entry = {}
-        start_here = p
-        try:
-            nlen = rd_u16_le(payload, p); p += 2
-            name_off = p
-            name = safe_decode(payload[p:p+nlen]); p += nlen
-
-            u32_after_name_off = p
-            u32_after_name = rd_u32_le(payload, p); p += 4
-
-            alen = rd_u16_le(payload, p); p += 2
-            author_off = p
-            author = safe_decode(payload[p:p+alen]); p += alen
-
-            if ii < itms_count - 1:
-                nxt = next_item_like_start(payload, p, section_end)
-                end_this = nxt if nxt is not None else section_end
-            else:
-                end_this = section_end
-
-            trio = find_dir_pos_pyr_after(payload, p, end_this)
-            if trio:
-                p = end_this
-                entry = {
-                    "name": name,
-                    "name_offset": name_off,
-                    "u32_after_name": u32_after_name,
-                    "u32_after_name_offset": u32_after_name_off,
-                    "author": author,
-                    "author_offset": author_off,
-                    "dir": trio["dir"],
-                    "dir_offset": trio["dir_offset"],
-                    "dir_degrees": int(trio["dir"] % 8) * 45 if trio["dir"] >= 4 else int(trio["dir"]) * 90,
-                    "pos": trio["pos"],
-                    "pos_offset": trio["pos_offset"],
-                    "pyr": trio["pyr"],
-                    "pyr_degrees": trio["pyr_degrees"],
-                    "pyr_offset": trio["pyr_offset"],
-                }
-                tstart = trio["pyr_offset"] + 12
-                if end_this > tstart:
-                    entry["tail_raw"] = {
-                        "offset": tstart,
-                        "length": end_this - tstart,
-                        "hex": payload[tstart:end_this].hex()
-                    }
-            else:
-                entry = {
-                    "name": name, "name_offset": name_off,
-                    "u32_after_name": u32_after_name, "u32_after_name_offset": u32_after_name_off,
-                    "author": author, "author_offset": author_off,
-                    "note": "dir/pos/pyr not located within item body"
-                }
-                if end_this > p:
-                    entry["raw_after_author"] = {
-                        "offset": p,
-                        "length": end_this - p,
-                        "hex": payload[p:end_this].hex()
-                    }
-                p = end_this
-        except Exception as ex:
-            entry["error"] = f"item parse error at {start_here}: {ex}"
-            nxt = next_item_like_start(payload, p, section_end)
-            p = nxt if nxt is not None else section_end
-        result["entries"].append(entry)
-    return result
-
-def decode_chat(payload: bytes) -> Dict[str, Any]:
-    info: Dict[str, Any] = {}
-    if len(payload) < 3:
-        info["warning"] = "payload too short for chat"
-        return info
-    msg_ty = payload[0]
-    ln = int.from_bytes(payload[1:3], "little")
-    if 3 + ln <= len(payload):
-        msg = safe_decode(payload[3:3+ln])
-    else:
-        msg = safe_decode(payload[3:])
-        info["warning"] = "truncated chat payload"
-    info["msg_type"] = int(msg_ty)
-    info["message"] = msg
-    return info
-
-def decode_admin_set_action_limit(payload: bytes) -> Dict[str, Any]:
-    info: Dict[str, Any] = {}
-    if len(payload) < 4:
-        info["warning"] = "payload too short"
-        return info
-    limit = int.from_bytes(payload[0:4], "little")
-    info["limit_hz"] = limit
-    return info
-
-def decode_place_delete_setskin(payload: bytes, type_id: int) -> Dict[str, Any]:
-    doc: Dict[str, Any] = {}
-    secs = find_sections(payload)
-    doc["sections"] = {
-        k: {"offset": v.get("offset", -1), "count": v.get("count", 0)}
-        for k,v in secs.items()
-    }
-    notes: List[str] = []
-
-    blks_off = secs.get("BLKs", {}).get("offset", -1)
-    blks_cnt = secs.get("BLKs", {}).get("count", 0)
-    skns_off = secs.get("SKNs", {}).get("offset", -1)
-    itms_off = secs.get("ITMs", {}).get("offset", -1)
-
-    end_blks = skns_off if (blks_off >= 0 and skns_off >= 0) else (len(payload))
-    end_skns = itms_off if (skns_off >= 0 and itms_off >= 0) else (len(payload))
-    end_itms = len(payload)
-
-    if blks_off >= 0:
-        doc["blocks"] = parse_blocks(payload, blks_off, blks_cnt, end_blks)
-        if doc["blocks"]["count"] == 0:
-            notes.append("BLKs present but count=0.")
-    else:
-        notes.append("No BLKs section found.")
-
-    if skns_off >= 0:
-        cnt = secs["SKNs"]["count"]
-        start = skns_off + 6
-        doc["skins"] = {"count": cnt, "raw_offset": start, "raw_length": max(0, end_skns - start)}
-    else:
-        notes.append("No SKNs section found.")
-
-    if itms_off >= 0:
-        itms_cnt = secs["ITMs"]["count"]
-        doc["items"] = parse_items(payload, itms_off, itms_cnt, end_itms)
-    else:
-        notes.append("No ITMs section found.")
-
-    if notes:
-        doc["notes"] = notes
-    return doc
+def hex_dump(chunk: bytes, base_off: int = 0, width: int = 16) -> str:
+    hx = chunk.hex(" ")
+    text = bytes(chunk).translate(ASCII_GUTTER).decode("ascii")
+    step = width * 3
+    return "\n".join(f"{base_off + i:08x}  {hx[i*3:i*3+step-1]:<{step}}  {text[i:i+width]}"
+                     for i in range(0, len(chunk), width))
 
 class MTLogParser:
-    def __init__(self, path: str):
+    # With recover=True, read_next_meta_only() skips past damaged records instead of returning
+    # them; the skipped spans are collected in `damaged`.
+    def __init__(self, path: str, recover: bool = False):
         self.path = path
         self.fh = None
+        self.log: Optional[MTLogFile] = None
         self.offset = 0
         self.index = 0
+        self.recover = recover
+        self.damaged: List[DamagedRange] = []
 
     def open(self):
         self.close()
         self.fh = open(self.path, "rb", buffering=1024*1024)
+        self.log = MTLogFile(self.path)
         self.offset = 0
         self.index = 0
+        self.damaged = []
 
     def close(self):
         if self.fh:
             self.fh.close()
         self.fh = None
+        if self.log:
+            self.log.close()
+        self.log = None
 
     def file_size(self) -> int:
         cur = self.fh.tell()
@@ -409,9 +100,33 @@ class MTLogParser:
         self.fh.seek(cur, os.SEEK_SET)
         return size
 
-    def read_next_meta_only(self) -> Optional[Record]:
+    def _resync(self) -> bool:
+        # Moves offset from a header the scanner would stop at to the next plausible record;
+        # False at the end of the file or if there is no such record.
+        size = len(self.log)
+        if self.offset >= size:
+            return False
+        buf = self.log.view(0, size)
+        try:
+            batches = scan_mt_header_batches(buf, self.offset, size, 1)
+            ok = next(batches, None) is not None
+            batches.close()
+            if ok:
+                return True
+            nxt = find_next_record(buf, self.offset + 1, size)
+        finally:
+            buf.release()
+        self.damaged.append(DamagedRange(self.offset, size if nxt < 0 else nxt))
+        if nxt < 0:
+            return False
+        self.offset = nxt
+        return True
+
+    def read_next_meta_only(self) -> Optional[MTRecord]:
         if not self.fh:
             return None
+        if self.recover and not self._resync():
+            return None
         self.fh.seek(self.offset, os.SEEK_SET)
         head = self.fh.read(8)
         if len(head) < 8:
@@ -439,26 +154,283 @@ class MTLogParser:
         except Exception:
             pass
 
-        rec = Record(
+        rec = MTRecord(
             index=self.index,
-            file_offset=self.offset,
             type_id=type_id,
+            type_name=type_name(type_id),
+            record_off=self.offset,
+            payload_off=self.offset + 8,
             payload_len=payload_len,
+            meta_off=self.offset + 8 + payload_len + 4,
             meta_len=meta_len,
             player_id=player_id,
             timestamp_ms=ts_ms,
+            file_path=self.path,
         )
         self.index += 1
         self.offset += 8 + payload_len + 4 + meta_len
         return rec
 
-    def read_payload(self, rec: Record) -> bytes:
-        self.fh.seek(rec.file_offset + 8, os.SEEK_SET)
-        return self.fh.read(rec.payload_len)
+    def read_payload(self, rec: RecordRow) -> memoryview:
+        return self.log.payload(rec)
+
+    def read_full_record_bytes(self, rec: RecordRow) -> memoryview:
+        return self.log.record_bytes(rec)
+
+class VirtualTree:
+    # Treeview that only holds the visible window of rows (+ overscan); row values
+    # are pulled from `row_values(record_index)` whenever the window moves.
+    OVERSCAN = 4
+
+    def __init__(self, parent, columns: Tuple[str, ...], widths: Tuple[int, ...],
+                 row_values: Callable[[int], Tuple[Any, ...]], on_select: Callable[[int], None]):
+        self.tree = ttk.Treeview(parent, columns=columns, show="headings", selectmode="browse")
+        for c, w in zip(columns, widths):
+            self.tree.heading(c, text=c.title())
+            self.tree.column(c, width=w, stretch=False)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.sb = ttk.Scrollbar(parent, orient="vertical", command=self._on_scrollbar)
+        self.sb.pack(side="left", fill="y")
+
+        self.row_values = row_values
+        self.on_select = on_select
+        self.ids: Sequence[int] = range(0)
+        self.top = 0
+        self.selected: Optional[int] = None
+        self._shown: Tuple[int, int] = (0, 0)
+        self._refresh_pending = False
+
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<Configure>", lambda e: self.schedule_refresh())
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Up>", lambda e: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self.move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self.move_selection(-self.page_rows()))
+        self.tree.bind("<Next>", lambda e: self.move_selection(self.page_rows()))
+        self.tree.bind("<Home>", lambda e: self.move_selection(-len(self.ids)))
+        self.tree.bind("<End>", lambda e: self.move_selection(len(self.ids)))
+
+    def page_rows(self) -> int:
+        try:
+            row_h = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        except Exception:
+            row_h = 20
+        return max(1, self.tree.winfo_height() // max(1, row_h) - 1)
+
+    def set_ids(self, ids: Sequence[int]):
+        self.ids = ids
+        self.top = min(self.top, max(0, len(ids) - 1))
+        self.refresh()
+
+    def ids_changed(self):
+        # Rows were appended to `ids`; only touch Tk if the visible window can change.
+        lo, hi = self._shown
+        if hi - lo < self.page_rows() + self.OVERSCAN or hi >= len(self.ids) - 1:
+            self.schedule_refresh()
+        else:
+            self._update_scrollbar()
+
+    def schedule_refresh(self):
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.tree.after_idle(self.refresh)
+
+    def refresh(self):
+        self._refresh_pending = False
+        n = len(self.ids)
+        page = self.page_rows()
+        self.top = max(0, min(self.top, n - page))
+        lo, hi = self.top, min(n, self.top + page + self.OVERSCAN)
+        tree = self.tree
+        children = tree.get_children()
+        if children:
+            tree.delete(*children)
+        for pos in range(lo, hi):
+            rid = self.ids[pos]
+            tree.insert("", "end", iid=str(rid), values=self.row_values(rid))
+        self._shown = (lo, hi)
+        if self.selected is not None and tree.exists(str(self.selected)):
+            tree.selection_set(str(self.selected))
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        n = len(self.ids)
+        if n == 0:
+            self.sb.set(0.0, 1.0)
+            return
+        self.sb.set(self.top / n, min(1.0, (self.top + self.page_rows()) / n))
+
+    def _on_scrollbar(self, *args):
+        n = len(self.ids)
+        if not args or n == 0:
+            return
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * n)
+        elif args[0] == "scroll":
+            step = int(args[1])
+            self.top += step * (self.page_rows() if args[2] == "pages" else 1)
+        self.refresh()
+
+    def _on_wheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def scroll(self, rows: int):
+        self.top += rows
+        self.refresh()
+        return "break"
+
+    def position_of(self, record_index: int) -> int:
+        pos = bisect_left(self.ids, record_index)
+        if pos < len(self.ids) and self.ids[pos] == record_index:
+            return pos
+        return -1
+
+    def see(self, pos: int):
+        page = self.page_rows()
+        if pos < self.top:
+            self.top = pos
+        elif pos >= self.top + page:
+            self.top = pos - page + 1
+
+    def select_position(self, pos: int):
+        if not len(self.ids):
+            return
+        pos = max(0, min(pos, len(self.ids) - 1))
+        self.see(pos)
+        self.selected = self.ids[pos]
+        self.refresh()
+        self.tree.focus(str(self.selected))
+        self.on_select(self.selected)
+
+    def move_selection(self, delta: int):
+        pos = self.position_of(self.selected) if self.selected is not None else -1
+        self.select_position(self.top if pos < 0 else pos + delta)
+        return "break"
+
+    def _on_tree_select(self, _event):
+        sel = self.tree.selection()
+        if not sel:
+            return
+        rid = int(sel[0])
+        if rid != self.selected:
+            self.selected = rid
+            self.on_select(rid)
+
+class HexView:
+    # Text widget that only holds the visible lines of a (possibly multi-MB) buffer; lines
+    # are formatted with hex_dump() whenever the window moves, like VirtualTree does for rows.
+    WIDTH = 16
+    OVERSCAN = 2
+
+    def __init__(self, parent):
+        bar = ttk.Frame(parent)
+        bar.pack(side="top", fill="x")
+        ttk.Label(bar, text="Go to offset (hex)").pack(side="left", padx=(6, 2))
+        self.goto_var = tk.StringVar(value="")
+        entry = ttk.Entry(bar, textvariable=self.goto_var, width=14)
+        entry.pack(side="left")
+        entry.bind("<Return>", lambda e: self.goto_text(self.goto_var.get()))
+        ttk.Button(bar, text="Go", command=lambda: self.goto_text(self.goto_var.get())).pack(side="left", padx=4)
+        self.info = ttk.Label(bar, text="")
+        self.info.pack(side="right", padx=6)
+
+        self.text = tk.Text(parent, height=18, wrap="none", font=("Courier New", 10), state="disabled")
+        self.text.pack(side="left", fill="both", expand=True, padx=6, pady=6)
+        self.text.tag_configure("mark", background="#ffe08a")
+        self.sb = ttk.Scrollbar(parent, orient="vertical", command=self._on_scrollbar)
+        self.sb.pack(side="left", fill="y")
+
+        self.data = memoryview(b"")
+        self.base_off = 0
+        self.top = 0
+        self.mark: Optional[int] = None
+        self._line_px: Optional[int] = None
+
+        self.text.bind("<Configure>", lambda e: self.refresh())
+        self.text.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.text.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.text.bind("<Button-5>", lambda e: self.scroll(3))
+        self.text.bind("<Prior>", lambda e: self.scroll(-self.page_lines()))
+        self.text.bind("<Next>", lambda e: self.scroll(self.page_lines()))
+        self.text.bind("<Home>", lambda e: self.scroll(-self.n_lines()))
+        self.text.bind("<End>", lambda e: self.scroll(self.n_lines()))
+
+    def n_lines(self) -> int:
+        return (len(self.data) + self.WIDTH - 1) // self.WIDTH
+
+    def page_lines(self) -> int:
+        if self._line_px is None:
+            try:
+                from tkinter import font as tkfont
+                self._line_px = tkfont.Font(font=self.text.cget("font")).metrics("linespace") or 16
+            except Exception:
+                self._line_px = 16
+        return max(1, self.text.winfo_height() // self._line_px)
+
+    def set_data(self, data, base_off: int = 0):
+        self.data = memoryview(data)
+        self.base_off = base_off
+        self.top = 0
+        self.mark = None
+        self.refresh()
+
+    def refresh(self):
+        n = self.n_lines()
+        page = self.page_lines()
+        self.top = max(0, min(self.top, n - page))
+        lo, hi = self.top, min(n, self.top + page + self.OVERSCAN)
+        w = self.WIDTH
+        text = self.text
+        text.config(state="normal")
+        text.delete("1.0", "end")
+        text.insert("1.0", hex_dump(self.data[lo*w:hi*w], self.base_off + lo*w, w))
+        if self.mark is not None and lo <= self.mark < hi:
+            line = self.mark - lo + 1
+            text.tag_add("mark", f"{line}.0", f"{line}.end")
+        text.config(state="disabled")
+        if n:
+            self.sb.set(lo / n, min(1.0, (lo + page) / n))
+            self.info.configure(text=f"{len(self.data)} bytes, lines {lo + 1}-{hi} of {n}")
+        else:
+            self.sb.set(0.0, 1.0)
+            self.info.configure(text="")
+
+    def scroll(self, lines: int):
+        self.top += lines
+        self.refresh()
+        return "break"
+
+    def _on_scrollbar(self, *args):
+        n = self.n_lines()
+        if not args or n == 0:
+            return
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * n)
+        elif args[0] == "scroll":
+            self.top += int(args[1]) * (self.page_lines() if args[2] == "pages" else 1)
+        self.refresh()
+
+    def goto(self, off: int):
+        # Accepts the file offsets shown in the dump, or an offset relative to the buffer start.
+        rel = off - self.base_off if off >= self.base_off else off
+        if not len(self.data):
+            return
+        rel = max(0, min(rel, len(self.data) - 1))
+        self.mark = rel // self.WIDTH
+        self.top = max(0, self.mark - self.page_lines() // 3)
+        self.refresh()
 
-    def read_full_record_bytes(self, rec: Record) -> bytes:
-        self.fh.seek(rec.file_offset, os.SEEK_SET)
-        return self.fh.read(rec.record_len_total())
+    def goto_text(self, spec: str):
+        spec = spec.strip().lower()
+        try:
+            off = int(spec[2:] if spec.startswith("0x") else spec, 16)
+        except ValueError:
+            self.info.configure(text=f"Bad offset {spec!r}")
+            return
+        self.goto(off)
 
 class App(ttk.Frame):
     def __init__(self, master):
@@ -466,12 +438,33 @@ class App(ttk.Frame):
         self.master.title("Map Together Log Inspector")
         self.pack(fill="both", expand=True)
 
-        self.records: List[Record] = []
+        self.records = RecordTable()
+        self.indexes = RecordIndexes(self.records)
+        self.decode_cache = DECODE_CACHE
         self.parser: Optional[MTLogParser] = None
         self.follow = tk.BooleanVar(value=False)
+        self.recover = tk.BooleanVar(value=False)
         self.decode_rows = tk.BooleanVar(value=True)
+        self._job: Optional[Dict[str, Any]] = None
+        self._tail: Optional[Dict[str, Any]] = None
+        self._time_index: Optional[TimeIndex] = None
+        self.jump_time = tk.StringVar(value="")
+        self.filter_types = tk.StringVar(value="")
+        self.filter_player = tk.StringVar(value="")
+        self.filter_region = tk.StringVar(value="")
+        self.filter_region_kind = tk.StringVar(value="block")
+        self.tab_filter: Optional[Dict[str, Any]] = None
+        # (types, players, ((lo, hi), kind) or None)
+        self._filter: Optional[Tuple[Optional[set], Optional[set], Optional[Tuple]]] = None
+        self.spatial: Optional[SpatialIndex] = None
+        self._spatial_job: Optional[Dict[str, Any]] = None
+        self.search_text = tk.StringVar(value="")
+        self.tab_search: Optional[Dict[str, Any]] = None
+        self._search_job: Optional[Dict[str, Any]] = None
+        self._search_hits: Dict[int, Any] = {}
 
         self._build_toolbar()
+        self._build_filter_bar()
         self._build_tabs()
 
         self.master.geometry("1280x860")
@@ -483,9 +476,51 @@ class App(ttk.Frame):
         ttk.Button(bar, text="Open .map_together_log", command=self._choose_file).pack(side="left", padx=6, pady=6)
         ttk.Button(bar, text="Export current tab to JSON", command=self._export_current_tab).pack(side="left", padx=6)
         ttk.Checkbutton(bar, text="Follow file (tail)", variable=self.follow, command=self._toggle_follow).pack(side="left", padx=6)
-        ttk.Checkbutton(bar, text="Decode table rows (Chat/Admin)", variable=self.decode_rows).pack(side="left", padx=6)
+        ttk.Checkbutton(bar, text="Skip damaged records", variable=self.recover).pack(side="left", padx=6)
+        ttk.Checkbutton(bar, text="Decode table rows (Chat/Admin/positions)", variable=self.decode_rows).pack(side="left", padx=6)
+        ttk.Label(bar, text="Jump to time").pack(side="left", padx=(12, 2))
+        jump = ttk.Entry(bar, textvariable=self.jump_time, width=22)
+        jump.pack(side="left")
+        jump.bind("<Return>", lambda e: self._jump_to_time())
+        ttk.Button(bar, text="Go", command=self._jump_to_time).pack(side="left", padx=4)
+        self.cache_status = ttk.Label(bar, text="")
+        self.cache_status.pack(side="right", padx=6)
         self.status = ttk.Label(bar, text="Ready")
         self.status.pack(side="right", padx=6)
+        self.cancel_btn = ttk.Button(bar, text="Cancel", command=self._cancel_load, state="disabled")
+        self.cancel_btn.pack(side="right", padx=6)
+        self.progress = ttk.Progressbar(bar, orient="horizontal", length=200, mode="determinate", maximum=1.0)
+        self.progress.pack(side="right", padx=6)
+
+    def _build_filter_bar(self):
+        bar = ttk.Frame(self)
+        bar.pack(side="top", fill="x")
+        ttk.Label(bar, text="Filter types").pack(side="left", padx=(6, 2))
+        types = ttk.Entry(bar, textvariable=self.filter_types, width=28)
+        types.pack(side="left")
+        types.bind("<Return>", lambda e: self._apply_filter())
+        ttk.Label(bar, text="Player").pack(side="left", padx=(12, 2))
+        self.player_box = ttk.Combobox(bar, textvariable=self.filter_player, width=40, values=())
+        self.player_box.pack(side="left")
+        self.player_box.bind("<Return>", lambda e: self._apply_filter())
+        self.player_box.bind("<<ComboboxSelected>>", lambda e: self._apply_filter())
+        ttk.Label(bar, text="Region").pack(side="left", padx=(12, 2))
+        region = ttk.Entry(bar, textvariable=self.filter_region, width=24)
+        region.pack(side="left")
+        region.bind("<Return>", lambda e: self._apply_filter())
+        ttk.Combobox(bar, textvariable=self.filter_region_kind, width=6, values=tuple(KIND_NAMES),
+                     state="readonly").pack(side="left", padx=(2, 0))
+        ttk.Button(bar, text="Apply", command=self._apply_filter).pack(side="left", padx=4)
+        ttk.Button(bar, text="Clear", command=self._clear_filter).pack(side="left")
+        self.filter_status = ttk.Label(bar, text="")
+        self.filter_status.pack(side="left", padx=8)
+        self.search_status = ttk.Label(bar, text="")
+        self.search_status.pack(side="right", padx=6)
+        ttk.Button(bar, text="Search", command=self._search).pack(side="right", padx=4)
+        search = ttk.Entry(bar, textvariable=self.search_text, width=28)
+        search.pack(side="right")
+        search.bind("<Return>", lambda e: self._search())
+        ttk.Label(bar, text="Text").pack(side="right", padx=(12, 2))
 
     def _build_tabs(self):
         self.nb = ttk.Notebook(self)
@@ -494,21 +529,15 @@ class App(ttk.Frame):
         self._build_all_tab()
         self.tabs: Dict[int, Dict[str, Any]] = {}
 
-    def _make_tab_shell(self, title: str, columns: Tuple[str, ...], widths: Tuple[int, ...]) -> Dict[str, Any]:
+    def _make_tab_shell(self, title: str, columns: Tuple[str, ...], widths: Tuple[int, ...],
+                        row_values: Callable[[int], Tuple[Any, ...]], on_select: Callable[[int], None]) -> Dict[str, Any]:
         f = ttk.Frame(self.nb)
 
         hsplit = ttk.PanedWindow(f, orient="horizontal")
         hsplit.pack(fill="both", expand=True)
 
         left = ttk.Frame(hsplit)
-        tree = ttk.Treeview(left, columns=columns, show="headings", selectmode="browse")
-        for c, w in zip(columns, widths):
-            tree.heading(c, text=c.title())
-            tree.column(c, width=w, stretch=False)
-        tree.pack(side="left", fill="both", expand=True)
-        sb = ttk.Scrollbar(left, orient="vertical", command=tree.yview)
-        tree.configure(yscroll=sb.set)
-        sb.pack(side="left", fill="y")
+        vt = VirtualTree(left, columns, widths, row_values, on_select)
         hsplit.add(left, weight=1)
 
         right = ttk.Frame(hsplit)
@@ -521,24 +550,224 @@ class App(ttk.Frame):
         vsplit.add(details_box, weight=1)
 
         hex_box = ttk.LabelFrame(vsplit, text="Record (full) hex")
-        hex_text = tk.Text(hex_box, height=18, wrap="none", font=("Courier New", 10))
-        hex_text.pack(side="left", fill="both", expand=True, padx=6, pady=6)
-        hex_sb = ttk.Scrollbar(hex_box, orient="vertical", command=hex_text.yview)
-        hex_text.configure(yscroll=hex_sb.set)
-        hex_sb.pack(side="left", fill="y")
+        hex_view = HexView(hex_box)
         vsplit.add(hex_box, weight=1)
 
         hsplit.add(right, weight=1)
         self.nb.add(f, text=title)
 
-        return {"frame": f, "tree": tree, "details_text": details_text, "hex_text": hex_text}
+        return {"frame": f, "vt": vt, "details_text": details_text, "hex": hex_view}
+
+    def _ensure_filter_tab(self) -> Dict[str, Any]:
+        if self.tab_filter is None:
+            cols = ("index","offset","type","payload_len","player","time")
+            widths = (80,120,200,120,240,220)
+            self.tab_filter = self._make_tab_shell("Filter", cols, widths, self._all_row_values,
+                                                   lambda rid: self._on_select_in_tab("filter"))
+            self.tab_filter["ids"] = array("I")
+        return self.tab_filter
+
+    def _apply_filter(self):
+        try:
+            types = parse_type_list(self.filter_types.get()) or None
+        except ValueError as e:
+            self.filter_status.configure(text=str(e))
+            return
+        player = self.filter_player.get().strip()
+        players = {player} if player else None
+        region = None
+        spec = self.filter_region.get().strip()
+        if spec:
+            try:
+                values = [float(v) for v in spec.replace(",", " ").split()]
+                if len(values) != 6:
+                    raise ValueError
+                region = (normalize_box(values), parse_kind(self.filter_region_kind.get()))
+            except ValueError:
+                self.filter_status.configure(text="Region needs six numbers: x0 y0 z0 x1 y1 z1")
+                return
+        if types is None and players is None and region is None:
+            self._clear_filter()
+            return
+        if region is not None and (self.spatial is None or self.spatial.n_records < self.indexes.n):
+            # Blocks/items of the rows not indexed yet are decoded on a thread; Apply reruns afterwards.
+            self._build_spatial()
+            return
+        self._filter = (types, players, region)
+        t0 = time.perf_counter()
+        ids = self.indexes.query(types, players)
+        if region is not None:
+            inside = set(self.spatial.records_in_box(*region[0], region[1]))
+            ids = array("I", (i for i in ids if i in inside))
+        dt = time.perf_counter() - t0
+        ui = self._ensure_filter_tab()
+        ui["ids"] = ids
+        ui["vt"].selected = None
+        ui["vt"].set_ids(ids)
+        self.nb.select(ui["frame"])
+        self.filter_status.configure(text=f"{len(ids)} records in {dt * 1000:.1f} ms")
+
+    REGION_SYNC_RECORDS = 5000
+
+    def _extend_filter(self, start: int, stop: int):
+        # New rows from loading/follow: test just those against the filter's columns.
+        types, players, region = self._filter
+        pkeys = self.indexes.player_keys(players) if players is not None else None
+        tcol, pcol = self.records.type_ids, self.records.player_idx
+        new = [i for i in range(start, stop) if (types is None or tcol[i] in types) and (pkeys is None or pcol[i] in pkeys)]
+        note = ""
+        if region is not None:
+            if (self._spatial_job is None and self.spatial is not None
+                    and stop - self.spatial.n_records <= self.REGION_SYNC_RECORDS):
+                # A follow batch is small enough to decode here.
+                self.spatial.update(stop, workers=1)
+                inside = set(self.spatial.records_in_box(*region[0], region[1]))
+                new = [i for i in new if i in inside]
+            else:
+                new = []
+                note = " (region not checked for newer rows; Apply to refresh)"
+        self.tab_filter["ids"].extend(new)
+        self.filter_status.configure(text=f"{len(self.tab_filter['ids'])} records{note}")
+
+    def _build_spatial(self):
+        if self._spatial_job is not None or not self.parser:
+            return
+        job = {"path": self.parser.path, "table": self.records, "stop": self.indexes.n, "index": self.spatial,
+               "done": 0, "total": 0, "error": None}
+
+        def run():
+            try:
+                ix = job["index"]
+                if ix is None:
+                    # A sidecar from an earlier session covers its rows already; update() drops it
+                    # if the log was replaced since.
+                    ix = SpatialIndex(job["path"], job["table"])
+                    ix.load()
+                before = (ix.n_records, ix.last_record)
+                ix.update(job["stop"], workers=1, progress=lambda done, total: job.update(done=done, total=total))
+                if (ix.n_records, ix.last_record) != before:
+                    ix.save()
+                job["index"] = ix
+            except Exception as e:
+                job["error"] = e
+
+        job["thread"] = threading.Thread(target=run, daemon=True)
+        self._spatial_job = job
+        job["thread"].start()
+        self.after(100, self._poll_spatial, job)
+
+    def _poll_spatial(self, job: Dict[str, Any]):
+        if job is not self._spatial_job:
+            return
+        if job["thread"].is_alive():
+            self.filter_status.configure(text=f"Indexing block/item positions {job['done']}/{job['total'] or '?'} records…")
+            self.after(100, self._poll_spatial, job)
+            return
+        self._spatial_job = None
+        if job["error"] is not None:
+            self.filter_status.configure(text=f"Spatial index failed: {job['error']}")
+            return
+        self.spatial = job["index"]
+        self._apply_filter()
+
+    def _clear_filter(self):
+        self._filter = None
+        self.filter_types.set("")
+        self.filter_player.set("")
+        self.filter_region.set("")
+        self.filter_status.configure(text="")
+        if self.tab_filter:
+            self.tab_filter["ids"] = array("I")
+            self.tab_filter["vt"].selected = None
+            self.tab_filter["vt"].set_ids(self.tab_filter["ids"])
+
+    SEARCH_LIMIT = 10000
+
+    def _ensure_search_tab(self) -> Dict[str, Any]:
+        if self.tab_search is None:
+            cols = ("index","type","player","time","kind","match")
+            widths = (80,160,240,220,80,400)
+            self.tab_search = self._make_tab_shell("Search", cols, widths, self._search_row_values,
+                                                   lambda rid: self._on_select_in_tab("search"))
+            self.tab_search["ids"] = array("I")
+        return self.tab_search
+
+    def _search(self):
+        query = self.search_text.get().strip()
+        if not query or not self.parser:
+            return
+        job = self._search_job
+        if job is not None:
+            # An index build is running; search for the latest text once it finishes.
+            job["query"] = query
+            return
+        stop = self.indexes.n
+        with SearchIndex(self.parser.path) as ix:
+            if ix.check(self.records) and ix.indexed_records >= stop:
+                self._show_search(query, ix)
+                return
+        # Decode the rows not indexed yet on a thread; one process, since forking a Tk app is unsafe.
+        job = {"query": query, "path": self.parser.path, "table": self.records, "stop": stop,
+               "done": 0, "total": 0, "error": None, "cancel": threading.Event()}
+
+        def run():
+            try:
+                with SearchIndex(job["path"]) as ix:
+                    ix.update(job["table"], job["stop"], progress=lambda done, total: job.update(done=done, total=total),
+                              cancel=job["cancel"].is_set, workers=1)
+            except Exception as e:
+                job["error"] = e
+
+        job["thread"] = threading.Thread(target=run, daemon=True)
+        self._search_job = job
+        job["thread"].start()
+        self.after(100, self._poll_search, job)
+
+    def _poll_search(self, job: Dict[str, Any]):
+        if job is not self._search_job:
+            return
+        if job["thread"].is_alive():
+            self.search_status.configure(text=f"Indexing text {job['done']}/{job['total'] or '?'} records…")
+            self.after(100, self._poll_search, job)
+            return
+        self._search_job = None
+        if job["error"] is not None:
+            self.search_status.configure(text=f"Search index failed: {job['error']}")
+            return
+        with SearchIndex(job["path"]) as ix:
+            self._show_search(job["query"], ix)
+
+    def _show_search(self, query: str, ix: SearchIndex):
+        t0 = time.perf_counter()
+        hits = ix.search(query, limit=self.SEARCH_LIMIT)
+        dt = time.perf_counter() - t0
+        n = len(self.records)
+        self._search_hits = {}
+        for h in hits:
+            if h.record < n:
+                self._search_hits.setdefault(h.record, h)
+        ids = array("I", sorted(self._search_hits))
+        ui = self._ensure_search_tab()
+        ui["ids"] = ids
+        ui["vt"].selected = None
+        ui["vt"].set_ids(ids)
+        self.nb.select(ui["frame"])
+        more = "+" if len(hits) >= self.SEARCH_LIMIT else ""
+        self.search_status.configure(text=f"{len(hits)}{more} matches in {len(ids)} records ({dt * 1000:.1f} ms)")
+
+    def _search_row_values(self, rid: int) -> Tuple[Any, ...]:
+        rec = self.records[rid]
+        h = self._search_hits.get(rid)
+        match = "" if h is None else h.text if h.kind == "chat" else f"{h.text}  by {h.author}"
+        return (rec.index, f"{rec.type_name} ({rec.type_id})", rec.player_id, local_time_str(rec.timestamp_ms),
+                h.kind if h else "", match)
 
     def _build_all_tab(self):
         cols = ("index","offset","type","payload_len","player","time")
         widths = (80,120,200,120,240,220)
-        ui = self._make_tab_shell("All Records", cols, widths)
+        ui = self._make_tab_shell("All Records", cols, widths, self._all_row_values,
+                                  lambda rid: self._on_select_in_tab(None))
         self.tab_all = ui
-        ui["tree"].bind("<<TreeviewSelect>>", lambda e: self._on_select_in_tab(None))
 
     def _ensure_type_tab(self, type_id: int):
         if type_id in self.tabs:
@@ -548,228 +777,489 @@ class App(ttk.Frame):
             cols = ("index","player","time","msg_type","message")
             widths = (80,240,220,100,500)
         elif type_id == 16:
-            cols = ("index","player","time","limit")
-            widths = (80,240,220,120)
+            cols = ("index","player","time","limit_ms","limit_hz")
+            widths = (80,240,220,120,120)
+        elif type_id in (14, 15):
+            cols = ("index","player","time","x","y","z")
+            widths = (80,240,220,120,120,120)
         else:
             cols = ("index","offset","player","time","payload_len")
             widths = (80,120,240,220,120)
 
-        ui = self._make_tab_shell(name, cols, widths)
-        ui["tree"].bind("<<TreeviewSelect>>", lambda e, tid=type_id: self._on_select_in_tab(tid))
+        ui = self._make_tab_shell(name, cols, widths, lambda rid, tid=type_id: self._type_row_values(tid, rid),
+                                  lambda rid, tid=type_id: self._on_select_in_tab(tid))
+        # The tab shows the type's posting list directly; it grows as the indexes are updated.
+        ui["ids"] = self.indexes.by_type.setdefault(type_id, array("I"))
+        ui["vt"].set_ids(ui["ids"])
         self.tabs[type_id] = ui
 
     def _choose_file(self):
         path = filedialog.askopenfilename(
             title="Open Map Together Log",
-            filetypes=[("MapTogether logs","*.map_together_log"), ("All files","*.*")]
+            filetypes=[("MapTogether logs","*.map_together_log"), ("Compressed logs","*.mtlz"), ("All files","*.*")]
         )
         if not path:
             return
         self._load(path)
 
+    LOAD_DRAIN_MS = 30
+    LOAD_SLICE_RECORDS = 20000
+
     def _load(self, path: str):
         try:
+            self._cancel_load()
+            self._stop_follow()
+            self.decode_cache.invalidate(path)
+            self._time_index = None
+            self.tab_all["vt"].selected = None
+            self.tab_all["vt"].set_ids(range(0))
+            self.tab_all["hex"].set_data(b"")
+            for ui in self.tabs.values():
+                ui["vt"].selected = None
+                ui["hex"].set_data(b"")
+            for ui in (self.tab_filter, self.tab_search):
+                if ui:
+                    ui["ids"] = array("I")
+                    ui["vt"].selected = None
+                    ui["vt"].set_ids(ui["ids"])
+                    ui["hex"].set_data(b"")
+            if self._search_job:
+                self._search_job["cancel"].set()
+                self._search_job = None
+            self.spatial = None
+            self._spatial_job = None
+            self._search_hits = {}
+            self.search_status.configure(text="")
+            # Drop the hex views' memoryviews first so the old mapping can really be closed.
             if self.parser:
                 self.parser.close()
-            self.records.clear()
-            self.tab_all["tree"].delete(*self.tab_all["tree"].get_children())
-            for ui in self.tabs.values():
-                ui["tree"].delete(*ui["tree"].get_children())
 
-            self.parser = MTLogParser(path)
+            self.parser = MTLogParser(path, self.recover.get())
             self.parser.open()
 
-            t0 = time.time()
-            added = 0
-            while True:
-                rec = self.parser.read_next_meta_only()
-                if rec is None:
-                    break
-                self.records.append(rec)
-                self._append_record_to_tabs(rec)
-                added += 1
-            dt = time.time() - t0
-            size_mb = self.parser.file_size() / (1024*1024)
-            self.status.configure(text=f"Loaded {added} records from {os.path.basename(path)} ({size_mb:.2f} MB) in {dt:.2f}s")
-
-            if self.follow.get():
-                self.after(500, self._poll_follow)
+            index = MTLogIndex(path, recover=self.recover.get())
+            self.records = index.table
+            self.indexes = RecordIndexes(self.records)
+            for type_id, ui in self.tabs.items():
+                ui["ids"] = self.indexes.by_type.setdefault(type_id, array("I"))
+                ui["vt"].set_ids(ui["ids"])
+            self.player_box.configure(values=())
+            job = {
+                "path": path,
+                "index": index,
+                "queue": queue.Queue(),
+                "cancel": threading.Event(),
+                "t0": time.time(),
+                "shown": 0,
+                "available": 0,
+                "total": max(1, self.parser.file_size()),
+                "bytes": 0,
+                "finished": False,
+            }
+            job["thread"] = threading.Thread(target=self._load_worker, args=(job,), daemon=True)
+            self._job = job
+            self.progress.configure(value=0.0)
+            self.cancel_btn.configure(state="normal")
+            job["thread"].start()
+            self.after(self.LOAD_DRAIN_MS, self._drain_load_queue, job)
         except Exception as e:
             messagebox.showerror("Open failed", str(e))
 
-    def _poll_follow(self):
-        if not self.parser or not self.follow.get():
+    @staticmethod
+    def _load_worker(job: Dict[str, Any]):
+        q = job["queue"]
+        try:
+            job["index"].open(progress=lambda done, total, n: q.put(("progress", done, total, n)),
+                              cancel=job["cancel"].is_set)
+            q.put(("done", len(job["index"].table)))
+        except Exception as e:
+            q.put(("error", str(e)))
+
+    def _drain_load_queue(self, job: Dict[str, Any]):
+        if job is not self._job:
+            return
+        deadline = time.perf_counter() + self.LOAD_DRAIN_MS / 1000.0
+        q = job["queue"]
+        while not job["finished"] and time.perf_counter() < deadline:
+            try:
+                msg = q.get_nowait()
+            except queue.Empty:
+                break
+            # Only counts reported by the worker are read, since it may be mid-way through extending the columns.
+            if msg[0] == "progress":
+                job["bytes"], job["total"], job["available"] = msg[1], max(1, msg[2]), msg[3]
+            elif msg[0] == "done":
+                job["finished"] = True
+                job["available"] = msg[1]
+                job["bytes"] = job["total"]
+            elif msg[0] == "error":
+                self._finish_load(job)
+                messagebox.showerror("Open failed", msg[1])
+                return
+
+        # Publish newly indexed rows in slices so one drain never blocks the UI for long.
+        available = job["available"]
+        while job["shown"] < available and time.perf_counter() < deadline:
+            stop = min(available, job["shown"] + self.LOAD_SLICE_RECORDS)
+            self._add_records(job["shown"], stop)
+            job["shown"] = stop
+
+        dt = max(1e-6, time.time() - job["t0"])
+        name = os.path.basename(job["path"])
+        self.progress.configure(value=job["bytes"] / job["total"])
+        if job["finished"] and job["shown"] >= available:
+            self._finish_load(job)
+            self.progress.configure(value=1.0)
+            size_mb = job["total"] / (1024*1024)
+            self.status.configure(text=f"Loaded {job['shown']} records from {name} ({size_mb:.2f} MB) in {dt:.2f}s"
+                                       + self._damage_note(job))
+            if self.follow.get():
+                self._start_follow()
+            return
+        mb = job["bytes"] / (1024*1024)
+        self.status.configure(text=f"Loading {name}: {mb:.1f} / {job['total'] / (1024*1024):.1f} MB "
+                                   f"({mb / dt:.1f} MB/s), {job['shown']} records")
+        self.after(self.LOAD_DRAIN_MS, self._drain_load_queue, job)
+
+    def _damage_note(self, job: Dict[str, Any]) -> str:
+        index = job["index"]
+        if index.damaged:
+            skipped = sum(len(d) for d in index.damaged)
+            return f"; skipped {len(index.damaged)} damaged ranges ({skipped} bytes)"
+        end = index.scanned_end
+        if not is_archive(job["path"]) and end < index.log_size:
+            return f"; stopped at a bad record at 0x{end:x}, {index.log_size - end} bytes unread"
+        return ""
+
+    def _finish_load(self, job: Dict[str, Any]):
+        index = job["index"]
+        self.parser.offset = index.table.end_offset() if len(index.table) else 0
+        self.parser.index = job["shown"]
+        self.cancel_btn.configure(state="disabled")
+        self._job = None
+        self._update_cache_status()
+
+    def _cancel_load(self):
+        job = self._job
+        if not job:
+            return
+        job["cancel"].set()
+        if "index" not in job:
+            # An export: _poll_export reports it once the worker has stopped.
+            self.cancel_btn.configure(state="disabled")
+            return
+        job["thread"].join()
+        # Keep what was already shown; records past that point are dropped from the table.
+        self.records.truncate(job["shown"])
+        self._time_index = None
+        self._finish_load(job)
+        self.status.configure(text=f"Cancelled loading {os.path.basename(job['path'])} after {job['shown']} records")
+
+    FOLLOW_DRAIN_MS = 40
+
+    def _start_follow(self):
+        if self._tail or not self.parser or self._job:
+            return
+        # Archives are written once; there is nothing to tail.
+        if is_archive(self.parser.path):
+            self.follow.set(False)
+            return
+        tail = {
+            "tailer": LogTailer(self.parser.path, self.parser.offset, recover=self.recover.get()),
+            "queue": queue.Queue(),
+            "stop": threading.Event(),
+        }
+        tail["thread"] = threading.Thread(target=self._tail_worker, args=(tail,), daemon=True)
+        self._tail = tail
+        tail["thread"].start()
+        self.after(self.FOLLOW_DRAIN_MS, self._drain_follow_queue, tail)
+
+    def _stop_follow(self):
+        tail = self._tail
+        if not tail:
             return
+        self._tail = None
+        tail["stop"].set()
+        tail["thread"].join(timeout=1.0)
+
+    @staticmethod
+    def _tail_worker(tail: Dict[str, Any]):
+        tailer = tail["tailer"]
         try:
-            added = 0
-            while True:
-                rec = self.parser.read_next_meta_only()
-                if rec is None:
-                    break
-                self.records.append(rec)
-                self._append_record_to_tabs(rec)
-                added += 1
-            if added:
-                self.status.configure(text=f"Appended {added} new records… total {len(self.records)}")
+            while not tail["stop"].is_set():
+                if tailer.wait(0.25):
+                    headers, buf, base = tailer.read_records()
+                    if headers:
+                        tail["queue"].put((headers, buf, base))
         finally:
-            if self.follow.get():
-                self.after(500, self._poll_follow)
+            tailer.close()
 
-    def _toggle_follow(self):
-        if self.follow.get() and self.parser:
-            self.after(500, self._poll_follow)
+    def _drain_follow_queue(self, tail: Dict[str, Any]):
+        if tail is not self._tail:
+            return
+        start = len(self.records)
+        while True:
+            try:
+                headers, buf, base = tail["queue"].get_nowait()
+            except queue.Empty:
+                break
+            self.records.extend_headers(headers, buf, base)
+        if len(self.records) > start:
+            self._add_records(start, len(self.records))
+            self.parser.offset = self.records.end_offset()
+            self.parser.index = len(self.records)
+            self.status.configure(text=f"Appended {len(self.records) - start} new records… total {len(self.records)}"
+                                       + self._follow_note(tail["tailer"]))
+        elif tail["tailer"].stalled_at is not None and not tail.get("stall_shown"):
+            # The tailer stops reading at the bad record; say so once instead of going quiet.
+            tail["stall_shown"] = True
+            self.status.configure(text=f"Follow stopped at a bad record at 0x{tail['tailer'].stalled_at:x}; "
+                                       "reopen with \"Skip damaged records\" to read past it")
+        self.after(self.FOLLOW_DRAIN_MS, self._drain_follow_queue, tail)
+
+    @staticmethod
+    def _follow_note(tailer: LogTailer) -> str:
+        if tailer.stalled_at is not None:
+            return f"; stopped at a bad record at 0x{tailer.stalled_at:x}"
+        if tailer.damaged:
+            return f"; skipped {len(tailer.damaged)} damaged ranges ({sum(len(d) for d in tailer.damaged)} bytes)"
+        return ""
 
-    def _append_record_to_tabs(self, rec: Record):
-        all_tree = self.tab_all["tree"]
-        all_tree.insert("", "end", iid=str(rec.index), values=(
+    def _toggle_follow(self):
+        if self.follow.get():
+            self._start_follow()
+        else:
+            self._stop_follow()
+
+    def _add_records(self, start: int, stop: int):
+        n_players = len(self.indexes.by_player)
+        first_new = self.indexes.n
+        self.indexes.update(stop)
+        for tid in self.indexes.by_type:
+            self._ensure_type_tab(tid)
+        if len(self.indexes.by_player) != n_players:
+            self.player_box.configure(values=sorted(self.records.players[:len(self.indexes.by_player)]))
+        if self._filter is not None and self.tab_filter:
+            self._extend_filter(first_new, stop)
+        self.tab_all["vt"].ids = range(stop)
+        self.tab_all["vt"].ids_changed()
+        for ui in self.tabs.values():
+            ui["vt"].ids_changed()
+        if self.tab_filter:
+            self.tab_filter["vt"].ids_changed()
+
+    def _all_row_values(self, rid: int) -> Tuple[Any, ...]:
+        rec = self.records[rid]
+        return (
             rec.index,
-            f"0x{rec.file_offset:x}",
+            f"0x{rec.record_off:x}",
             f"{rec.type_name} ({rec.type_id})",
             rec.payload_len,
             rec.player_id,
-            rec.iso_time(),
-        ))
-
-        self._ensure_type_tab(rec.type_id)
-        ui = self.tabs[rec.type_id]
-        tree = ui["tree"]
-
-        if rec.type_id == 20 and self.decode_rows.get():
-            payload = self.parser.read_payload(rec)
-            d = decode_chat(payload)
-            tree.insert("", "end", iid=str(rec.index), values=(
-                rec.index, rec.player_id, rec.iso_time(), d.get("msg_type",""), d.get("message","")
-            ))
-        elif rec.type_id == 16 and self.decode_rows.get():
-            payload = self.parser.read_payload(rec)
-            d = decode_admin_set_action_limit(payload)
-            tree.insert("", "end", iid=str(rec.index), values=(
-                rec.index, rec.player_id, rec.iso_time(), d.get("limit_hz","")
-            ))
-        else:
-            tree.insert("", "end", iid=str(rec.index), values=(
-                rec.index, f"0x{rec.file_offset:x}", rec.player_id, rec.iso_time(), rec.payload_len
-            ))
+            local_time_str(rec.timestamp_ms),
+        )
 
-    def _get_selected_record(self, tab_type_id: Optional[int]) -> Optional[Record]:
-        if tab_type_id is None:
-            tree = self.tab_all["tree"]
-        else:
-            ui = self.tabs.get(tab_type_id)
-            if not ui:
-                return None
-            tree = ui["tree"]
-        sel = tree.selection()
-        if not sel:
+    def _type_row_values(self, type_id: int, rid: int) -> Tuple[Any, ...]:
+        rec = self.records[rid]
+        when = local_time_str(rec.timestamp_ms)
+        if type_id in (14, 15, 16, 20) and not self.decode_rows.get():
+            # These tabs have decoded columns; undecoded rows leave them empty.
+            return (rec.index, rec.player_id, when) + ("",) * (3 if type_id in (14, 15) else 2)
+        if type_id == 20 and self.decode_rows.get():
+            d = self._decode(rec)
+            return (rec.index, rec.player_id, when, d.get("msg_type",""), d.get("message",""))
+        if type_id == 16 and self.decode_rows.get():
+            d = self._decode(rec)
+            hz = d.get("limit_hz")
+            return (rec.index, rec.player_id, when, d.get("limit_per_action_ms",""), "" if hz is None else f"{hz:g}")
+        if type_id in (14, 15) and self.decode_rows.get():
+            pos = self._decode(rec).get("pos", {})
+            return (rec.index, rec.player_id, when, pos.get("x",""), pos.get("y",""), pos.get("z",""))
+        return (rec.index, f"0x{rec.record_off:x}", rec.player_id, when, rec.payload_len)
+
+    def _tab_ui(self, tab_key) -> Optional[Dict[str, Any]]:
+        # None is the All tab, "filter"/"search" the result tabs, an int a per-type tab.
+        if tab_key is None:
+            return self.tab_all
+        if tab_key == "filter":
+            return self.tab_filter
+        if tab_key == "search":
+            return self.tab_search
+        return self.tabs.get(tab_key)
+
+    def _get_selected_record(self, tab_type_id) -> Optional[RecordRow]:
+        ui = self._tab_ui(tab_type_id)
+        if not ui:
             return None
-        idx = int(sel[0])
-        if 0 <= idx < len(self.records):
+        idx = ui["vt"].selected
+        if idx is not None and 0 <= idx < len(self.records):
             return self.records[idx]
         return None
 
-    def _on_select_in_tab(self, tab_type_id: Optional[int]):
+    def _on_select_in_tab(self, tab_type_id):
         rec = self._get_selected_record(tab_type_id)
         if not rec:
             return
 
-        if rec._decoded is None:
-            payload = self.parser.read_payload(rec)
-            if rec.type_id == 20:
-                rec._decoded = decode_chat(payload)
-            elif rec.type_id == 16:
-                rec._decoded = decode_admin_set_action_limit(payload)
-            elif rec.type_id in (1,2,4):
-                rec._decoded = decode_place_delete_setskin(payload, rec.type_id)
-            else:
-                rec._decoded = {}
-
         header = {
             "index": rec.index,
             "type_id": rec.type_id,
             "type": rec.type_name,
-            "file_offset_hex": f"0x{rec.file_offset:x}",
-            "payload_offset_hex": f"0x{rec.file_offset + 8:x}",
+            "file_offset_hex": f"0x{rec.record_off:x}",
+            "payload_offset_hex": f"0x{rec.payload_off:x}",
             "payload_len": rec.payload_len,
             "meta_len": rec.meta_len,
             "player": rec.player_id,
             "timestamp_ms": rec.timestamp_ms,
-            "time": rec.iso_time(),
+            "time": local_time_str(rec.timestamp_ms),
         }
-        doc = {"header": header, "decoded": rec._decoded}
+        doc = {"header": header, "decoded": self._decode(rec)}
+        self._update_cache_status()
 
-        if tab_type_id is None:
-            details_text = self.tab_all["details_text"]
-            hex_text = self.tab_all["hex_text"]
-        else:
-            ui = self.tabs[tab_type_id]
-            details_text = ui["details_text"]
-            hex_text = ui["hex_text"]
+        ui = self._tab_ui(tab_type_id)
+        details_text = ui["details_text"]
 
         details_text.config(state="normal")
         details_text.delete("1.0", "end")
         details_text.insert("1.0", json.dumps(doc, indent=2, ensure_ascii=False))
         details_text.config(state="disabled")
 
-        full = self.parser.read_full_record_bytes(rec)
-        hex_text.config(state="normal")
-        hex_text.delete("1.0", "end")
-        hex_text.insert("1.0", hex_dump(full, base_off=rec.file_offset))
-        hex_text.config(state="disabled")
+        ui["hex"].set_data(self.parser.read_full_record_bytes(rec), rec.record_off)
 
     def _export_current_tab(self):
+        if self._job or not self.parser:
+            return
         current = self.nb.select()
         title = self.nb.tab(current, "text")
         if title == "All Records":
-            data = [self._record_to_json(r) for r in self.records]
-            fname = "all_records.json"
+            ids = None
+            decode = False
+            fname = "all_records.ndjson"
+        elif title == "Filter" and self.tab_filter:
+            ids = array("I", self.tab_filter["ids"])
+            decode = True
+            fname = "filtered_records.ndjson"
+        elif title == "Search" and self.tab_search:
+            ids = array("I", self.tab_search["ids"])
+            decode = True
+            fname = "search_results.ndjson"
         else:
             type_id = None
-            for k,v in MT_NAMES.items():
+            for k,v in MT_TYPES.items():
                 if v == title:
                     type_id = k
                     break
             if type_id is None:
                 return
-            subset = [r for r in self.records if r.type_id == type_id]
-            data = [self._record_to_json(r, ensure_decoded=True) for r in subset]
-            fname = f"{title.replace(' ','_').lower()}.json"
+            ui = self.tabs.get(type_id)
+            ids = array("I", ui["ids"]) if ui else array("I")
+            decode = True
+            fname = f"{title.replace(' ','_').lower()}.ndjson"
 
         path = filedialog.asksaveasfilename(
             title="Export JSON",
-            defaultextension=".json",
-            filetypes=[("JSON","*.json")],
+            defaultextension=".ndjson",
+            filetypes=[("NDJSON","*.ndjson"), ("JSON","*.json")],
             initialfile=fname
         )
         if not path:
             return
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        messagebox.showinfo("Export", f"Saved {len(data)} records to {os.path.basename(path)}")
-
-    def _record_to_json(self, r: Record, ensure_decoded: bool = False) -> Dict[str, Any]:
-        if ensure_decoded and r._decoded is None:
-            payload = self.parser.read_payload(r)
-            if r.type_id == 20:
-                r._decoded = decode_chat(payload)
-            elif r.type_id == 16:
-                r._decoded = decode_admin_set_action_limit(payload)
-            elif r.type_id in (1,2,4):
-                r._decoded = decode_place_delete_setskin(payload, r.type_id)
-            else:
-                r._decoded = {}
-
-        return {
-            "index": r.index,
-            "file_offset": r.file_offset,
-            "type_id": r.type_id,
-            "type_name": r.type_name,
-            "payload_len": r.payload_len,
-            "meta_len": r.meta_len,
-            "player_id": r.player_id,
-            "timestamp_ms": r.timestamp_ms,
-            "time": r.iso_time(),
-            "decoded": (r._decoded or {}),
-        }
+        fmt = "json" if path.lower().endswith(".json") else "ndjson"
+        job = {"done": 0, "total": len(self.records) if ids is None else len(ids), "result": None,
+               "cancel": threading.Event(), "path": path}
+
+        # Decoded on this thread like the search job; forking a Tk app is unsafe.
+        def run():
+            try:
+                with open(path, "w", encoding="utf-8", newline="\n") as f:
+                    job["result"] = export_records(
+                        self.parser.path, f, self.records, ids, fmt, decode,
+                        progress=lambda done, total: job.update(done=done),
+                        time_fmt=local_time_str, cancel=job["cancel"].is_set, workers=1)
+            except Exception as e:
+                job["result"] = e
+
+        job["thread"] = threading.Thread(target=run, daemon=True)
+        self._job = job
+        self.cancel_btn.configure(state="normal")
+        job["thread"].start()
+        self.after(100, self._poll_export, job)
+
+    def _poll_export(self, job: Dict[str, Any]):
+        cancelled = job["cancel"].is_set()
+        if job["thread"].is_alive():
+            # After a cancel the bar and status may belong to a load started since.
+            if not cancelled:
+                self.progress.configure(value=job["done"] / max(1, job["total"]))
+                self.status.configure(text=f"Exporting {job['done']}/{job['total']} records…")
+            self.after(100, self._poll_export, job)
+            return
+        if self._job is job:
+            self._job = None
+            self.cancel_btn.configure(state="disabled")
+        res = job["result"]
+        if isinstance(res, Exception):
+            messagebox.showerror("Export failed", str(res))
+        elif cancelled and res < job["total"]:
+            # The file only holds the records written before the cancel.
+            try:
+                os.remove(job["path"])
+            except OSError:
+                pass
+            if self._job is None:
+                self.status.configure(text=f"Export cancelled after {res} records")
+        else:
+            self.progress.configure(value=1.0)
+            self.status.configure(text=f"Exported {res} records")
+            messagebox.showinfo("Export", f"Saved {res} records to {os.path.basename(job['path'])}")
+
+    def _current_tab(self) -> Tuple[Any, Dict[str, Any]]:
+        current = str(self.nb.select())
+        if self.tab_filter and str(self.tab_filter["frame"]) == current:
+            return "filter", self.tab_filter
+        if self.tab_search and str(self.tab_search["frame"]) == current:
+            return "search", self.tab_search
+        for type_id, ui in self.tabs.items():
+            if str(ui["frame"]) == current:
+                return type_id, ui
+        return None, self.tab_all
+
+    def _jump_to_time(self):
+        if not len(self.records):
+            return
+        t = parse_local_time(self.jump_time.get(), self.records.timestamps[0])
+        if t is None:
+            self.status.configure(text=f"Cannot parse time {self.jump_time.get()!r}")
+            return
+        # Sparse checkpoints over the rows shown so far, extended as loading/follow publishes more;
+        # the loader thread may already be appending past them.
+        n = self.indexes.n
+        if self._time_index is None:
+            self._time_index = TimeIndex(self.records.file_path)
+        self._time_index.add_table_rows(self.records, n)
+        rid = self._time_index.position_in(self.records.timestamps, t)
+        if rid >= n:
+            self.status.configure(text=f"No records at or after {local_time_str(t)}")
+            return
+        _, ui = self._current_tab()
+        vt = ui["vt"]
+        pos = bisect_left(vt.ids, rid)
+        if pos >= len(vt.ids):
+            self.status.configure(text=f"No records in this tab at or after {local_time_str(t)}")
+            return
+        vt.select_position(pos)
+        self.status.configure(text=f"Jumped to record {vt.ids[pos]} at {local_time_str(self.records.timestamps[vt.ids[pos]])}")
+
+    def _decode(self, r: RecordRow) -> Dict[str, Any]:
+        return self.parser.log.decode(r)
+
+    def _update_cache_status(self):
+        st = self.decode_cache.stats()
+        looked_up = st["hits"] + st["misses"]
+        rate = 100.0 * st["hits"] / looked_up if looked_up else 0.0
+        self.cache_status.configure(text=f"Decode cache: {st['entries']} items, {st['bytes'] / (1024*1024):.1f}/"
+                                         f"{st['max_bytes'] / (1024*1024):.0f} MB, {st['hits']} hits / "
+                                         f"{st['misses']} misses ({rate:.0f}%)")
 
 def main():
     root = tk.Tk()
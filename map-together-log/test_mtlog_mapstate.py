@@ -0,0 +1,40 @@
+from __future__ import annotations
+import os
+import tempfile
+import unittest
+
+from mtlog_gen import macroblock_payload, record_bytes, synth_block
+from mtlog_mapstate import DELETE_TYPE, PLACE_TYPE, RESYNC_TYPE, MapReplay, decode_resync
+
+PLAYER = b"00000000-0000-0000-0000-000000000001"
+T0 = 1_700_000_000_000
+
+class MapReplayTest(unittest.TestCase):
+    def replay(self, records) -> MapReplay:
+        fd, path = tempfile.mkstemp(suffix=".map_together_log")
+        with os.fdopen(fd, "wb") as f:
+            for i, (type_id, payload) in enumerate(records):
+                f.write(record_bytes(type_id, payload, PLAYER, T0 + i))
+        self.addCleanup(os.remove, path)
+        replay = MapReplay(path, snapshot_every=2)
+        replay.update(workers=1)
+        return replay
+
+    def test_opaque_resync_keeps_map(self):
+        place = macroblock_payload([synth_block(i) for i in range(5)], [])
+        self.assertIsNone(decode_resync(b"\x01\x02\x03\x04"))
+        replay = self.replay([(PLACE_TYPE, place), (RESYNC_TYPE, b"\x01\x02\x03\x04")])
+        self.assertEqual(len(replay.live.blocks), 5)
+        self.assertEqual(len(replay.state_after(1).blocks), 5)
+        self.assertEqual(len(replay.snapshots), 1)
+
+    def test_resync_with_sections_replaces_map(self):
+        replay = self.replay([(PLACE_TYPE, macroblock_payload([synth_block(i) for i in range(5)], [])),
+                              (RESYNC_TYPE, macroblock_payload([synth_block(7)], [])),
+                              (DELETE_TYPE, macroblock_payload([synth_block(7)], []))])
+        self.assertEqual(len(replay.state_after(0).blocks), 5)
+        self.assertEqual(len(replay.state_after(1).blocks), 1)
+        self.assertEqual(len(replay.live.blocks), 0)
+
+if __name__ == "__main__":
+    unittest.main()